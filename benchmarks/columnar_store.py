@@ -0,0 +1,88 @@
+"""
+Memory and ranking benchmark of the in-memory and columnar event stores.
+
+Both stores are filled with the same synthetic events. The memory kept by each store
+(including the events it references) is measured with tracemalloc in a first pass,
+and the ingestion and query times in a second pass, without tracing.
+
+Usage:
+    PYTHONPATH=src python benchmarks/columnar_store.py
+    PYTHONPATH=src python benchmarks/columnar_store.py --events 1000000
+"""
+
+import argparse
+import gc
+import statistics
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+from snapshot_restore import generate_events
+
+from newsfeed.config.loader import load_keywords_config
+from newsfeed.ingestion.columnar_store import ColumnarEventStore
+from newsfeed.ingestion.store import EventStore
+from newsfeed.processing.filter import keyword_based_filter
+
+STORES = {"EventStore": EventStore, "ColumnarEventStore": ColumnarEventStore}
+
+
+def measure_memory(store_class, count: int, keywords: list[str]) -> tuple[int, object]:
+    """Return the memory kept by a store filled with `count` events (in bytes), and the store."""
+    gc.collect()
+    tracemalloc.start()
+    events = generate_events(count, keywords)
+    store = store_class()
+    store.add_events(keyword_based_filter(events, keywords))
+    del events
+    gc.collect()
+    kept_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return kept_bytes, store
+
+
+def median_ms(function, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=200_000, help="Number of stored events")
+    args = parser.parse_args()
+
+    keywords_config = load_keywords_config()
+    all_keywords = (keywords_config['high_priority_keywords'] + keywords_config['medium_priority_keywords']
+                    + keywords_config['low_priority_keywords'])
+    filtered_events_with_counts = keyword_based_filter(generate_events(args.events, all_keywords), all_keywords)
+    now = datetime(2025, 1, 31, tzinfo=timezone.utc) # the synthetic events are published in January 2025
+    queries = {
+        "top 10": lambda store: store.get_top_events(10, now=now),
+        "all, sorted": lambda store: store.get_sorted_events(now=now),
+        "keyword, sorted": lambda store: store.get_sorted_events(keywords=[all_keywords[0]], now=now),
+        "last day, sorted": lambda store: store.get_sorted_events(since=now - timedelta(days=1), now=now),
+    }
+
+    for name, store_class in STORES.items():
+        kept_bytes, store = measure_memory(store_class, args.events, all_keywords)
+        del store
+        store = store_class()
+        start = time.perf_counter()
+        store.add_events(filtered_events_with_counts)
+        ingest_s = time.perf_counter() - start
+
+        print(f"\n{name}: {store.get_event_count()} events")
+        print(f"• memory:  {kept_bytes / 1e6:.0f} MB ({kept_bytes / store.get_event_count():.0f} bytes per event)")
+        print(f"• ingest:  {ingest_s:.2f} s")
+        for query_name, query in queries.items():
+            print(f"• {query_name + ':':<17} {median_ms(lambda: query(store)):.1f} ms")
+        del store
+        gc.collect()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+"""
+Load test of the API server, with a local farm of stub RSS and Reddit feeds.
+
+The tool starts the API (in this process, or as a separate uvicorn process with
+one or more workers, or uses an already running server), and a stub HTTP server
+publishing synthetic RSS feeds and Reddit listings (new items appear over time).
+Then it sends requests at a target rate, from a pool of concurrent clients,
+picking each request from a configurable mix of operations:
+    - ingest:   POST /ingest with a batch of synthetic events
+    - retrieve: GET /retrieve
+    - fetch:    fetch a stub feed with the RSS or Reddit fetcher, then POST /ingest the events
+
+Requests are scheduled at fixed intervals (open loop), and latencies are measured
+from the time a request was scheduled, so queueing is included when the server
+(or the client pool) saturates. The report gives the throughput and latency
+percentiles of each operation, and the contention of the store lock for each
+endpoint (from the /stats endpoint).
+
+Usage:
+    PYTHONPATH=src python benchmarks/loadtest.py
+    PYTHONPATH=src python benchmarks/loadtest.py --rate 200 --duration 30 --concurrency 64 \\
+        --mix ingest=0.2,retrieve=0.7,fetch=0.1 --server uvicorn --workers 1
+    PYTHONPATH=src python benchmarks/loadtest.py --url http://127.0.0.1:8000
+"""
+
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import logging
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.sax.saxutils import escape
+
+import httpx
+from pydantic import TypeAdapter
+
+from newsfeed.ingestion.event import Event
+
+WORDS = ["server", "users", "network", "team", "cloud", "report", "service", "customers", "update", "today"]
+KEYWORDS = ["outage", "ransomware", "breach", "patch", "vulnerability", "critical", "maintenance", "release"]
+EVENTS_ADAPTER = TypeAdapter(list[Event])
+
+# One log line per request would drown the report
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+def random_title(rng: random.Random) -> str:
+    return " ".join(rng.sample(WORDS, 4) + rng.sample(KEYWORDS, rng.randrange(3)))
+
+
+class StubFeedHandler(BaseHTTPRequestHandler):
+    """
+    Serve synthetic feeds: a new item is published every `item_interval` seconds
+    in every feed, and each response has the `items_per_feed` latest items.
+        - GET /rss/<feed>: RSS 2.0 feed
+        - GET /r/<subreddit>/new: Reddit listing (JSON), for praw
+        - POST /api/v1/access_token: Reddit OAuth token, for praw
+    """
+    started_at = time.time()
+    item_interval = 1.0
+    items_per_feed = 20
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, body: str, content_type: str):
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def latest_items(self, feed: str):
+        """Yield (item id, title, body, published_at) of the latest items of a feed."""
+        latest_index = int((time.time() - self.started_at) / self.item_interval)
+        for index in range(latest_index, max(latest_index - self.items_per_feed, -1), -1):
+            rng = random.Random(f"{feed}-{index}")
+            published_at = datetime.fromtimestamp(self.started_at + index * self.item_interval, timezone.utc)
+            body = " ".join(rng.choices(WORDS + KEYWORDS, k=40))
+            yield f"{feed}-{index}", random_title(rng), body, published_at
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_body(json.dumps({"access_token": "stub", "token_type": "bearer",
+                                   "expires_in": 3600, "scope": "*"}), "application/json")
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path.startswith("/rss/"):
+            feed = path[len("/rss/"):]
+            items = "".join(
+                f"<item><guid>{item_id}</guid><title>{escape(title)}</title>"
+                f"<description>{escape(body[:100])}</description>"
+                f"<content:encoded><![CDATA[<p>{body}</p>]]></content:encoded>"
+                f"<pubDate>{format_datetime(published_at)}</pubDate></item>"
+                for item_id, title, body, published_at in self.latest_items(feed)
+            )
+            self.send_body(
+                '<?xml version="1.0" encoding="UTF-8"?>'
+                '<rss version="2.0" xmlns:content="http://purl.org/rss/1.0/modules/content/">'
+                f"<channel><title>{feed}</title>{items}</channel></rss>",
+                "application/rss+xml",
+            )
+        elif path.startswith("/r/"):
+            subreddit = path.split("/")[2]
+            children = [
+                {"kind": "t3", "data": {"id": item_id, "name": f"t3_{item_id}", "title": title, "selftext": body,
+                                        "created_utc": published_at.timestamp(), "subreddit": subreddit}}
+                for item_id, title, body, published_at in self.latest_items(subreddit)
+            ]
+            self.send_body(json.dumps({"kind": "Listing", "data": {"after": None, "before": None,
+                                                                   "children": children}}), "application/json")
+        else:
+            self.send_error(404)
+
+
+def start_stub_feed_server() -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubFeedHandler)
+    threading.Thread(target=server.serve_forever, name="stub-feeds", daemon=True).start()
+    return server
+
+
+def get_free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_until_ready(base_url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            httpx.get(base_url, timeout=1)
+            return
+        except httpx.TransportError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+@contextlib.contextmanager
+def running_api(mode: str, workers: int):
+    """Start the API server (in this process, or with uvicorn), and yield its base URL."""
+    port = get_free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    if mode == "inprocess":
+        import uvicorn
+        server = uvicorn.Server(uvicorn.Config("newsfeed.api.server:app", port=port, log_level="warning"))
+        thread = threading.Thread(target=server.run, name="api-server", daemon=True)
+        # The API prints every accepted event, don't mix that with the report
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            thread.start()
+            try:
+                wait_until_ready(base_url)
+                yield base_url
+            finally:
+                server.should_exit = True
+                thread.join()
+    else:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "newsfeed.api.server:app", "--port", str(port),
+             "--workers", str(workers), "--log-level", "warning"],
+            stdout=subprocess.DEVNULL,
+        )
+        try:
+            wait_until_ready(base_url)
+            yield base_url
+        finally:
+            process.terminate()
+            process.wait()
+
+
+class LoadGenerator:
+    """Send a mix of operations to the API at a target rate, and collect their latencies."""
+    def __init__(self, base_url: str, stub_url: str, batch_size: int, seed: int = 42):
+        self.base_url = base_url
+        self.stub_url = stub_url
+        self.batch_size = batch_size
+        self.rng = random.Random(seed)
+        self.event_ids = itertools.count()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.reddit_client = None
+
+    async def ingest(self, client: httpx.AsyncClient):
+        now = datetime.now(timezone.utc)
+        events = [
+            {"id": f"load-{next(self.event_ids)}", "source": self.rng.choice(["reddit", "Ars Technica"]),
+             "title": random_title(self.rng), "body": " ".join(self.rng.choices(WORDS + KEYWORDS, k=40)),
+             "published_at": (now - timedelta(minutes=self.rng.randrange(600))).isoformat()}
+            for _ in range(self.batch_size)
+        ]
+        response = await client.post("/ingest", json=events)
+        response.raise_for_status()
+
+    async def retrieve(self, client: httpx.AsyncClient):
+        response = await client.get("/retrieve")
+        response.raise_for_status()
+
+    async def fetch(self, client: httpx.AsyncClient):
+        events = await asyncio.to_thread(self.fetch_stub_feed, self.rng.randrange(8))
+        response = await client.post("/ingest", json=EVENTS_ADAPTER.dump_python(events, mode="json"))
+        response.raise_for_status()
+
+    def fetch_stub_feed(self, feed_number: int) -> list[Event]:
+        """Fetch one of the stub feeds with the fetchers of the application (RSS for even numbers, Reddit for odd ones)."""
+        from newsfeed.ingestion import reddit, rss
+        if feed_number % 2 == 0:
+            return rss.fetch({"name": f"Stub RSS {feed_number}", "url": f"{self.stub_url}/rss/feed{feed_number}", "limit": 20})
+        if reddit.reddit is None:
+            import praw
+            reddit.reddit = praw.Reddit(client_id="stub", client_secret="stub", user_agent="newsfeed-loadtest",
+                                        oauth_url=self.stub_url, reddit_url=self.stub_url)
+        return reddit.fetch({"name": f"Stub Reddit {feed_number}", "subreddit_name": f"sub{feed_number}", "limit": 20})
+
+    async def run(self, rate: float, duration: float, concurrency: int, mix: dict[str, float]):
+        operations = {"ingest": self.ingest, "retrieve": self.retrieve, "fetch": self.fetch}
+        names, weights = list(mix), list(mix.values())
+        semaphore = asyncio.Semaphore(concurrency)
+        loop = asyncio.get_running_loop()
+
+        async def run_operation(client: httpx.AsyncClient, name: str, scheduled_at: float):
+            async with semaphore:
+                try:
+                    await operations[name](client)
+                except Exception:
+                    self.errors[name] += 1
+                    return
+            self.latencies[name].append(loop.time() - scheduled_at)
+
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(base_url=self.base_url, timeout=60, limits=limits) as client:
+            tasks = []
+            start = loop.time()
+            for i in range(int(rate * duration)):
+                scheduled_at = start + i / rate
+                await asyncio.sleep(max(0.0, scheduled_at - loop.time()))
+                name = self.rng.choices(names, weights)[0]
+                tasks.append(asyncio.create_task(run_operation(client, name, scheduled_at)))
+            await asyncio.gather(*tasks)
+            return loop.time() - start
+
+
+def parse_mix(mix: str) -> dict[str, float]:
+    weights = {}
+    for part in mix.split(","):
+        name, weight = part.split("=")
+        if name not in {"ingest", "retrieve", "fetch"}:
+            raise argparse.ArgumentTypeError(f"Unknown operation: {name}")
+        weights[name] = float(weight)
+    return weights
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    return statistics.quantiles(sorted_values, n=100, method="inclusive")[int(p) - 1]
+
+
+def print_report(generator: LoadGenerator, elapsed_s: float, stats: dict):
+    print(f"\nOperations ({elapsed_s:.1f} s)")
+    print(f"{'operation':<10} {'ok':>7} {'errors':>7} {'req/s':>8} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for name in sorted(set(generator.latencies) | set(generator.errors)):
+        latencies = sorted(generator.latencies[name])
+        row = f"{name:<10} {len(latencies):>7} {generator.errors[name]:>7} {len(latencies) / elapsed_s:>8.1f}"
+        if latencies:
+            row += "".join(f" {percentile(latencies, p) * 1000:>8.1f}" for p in (50, 90, 99))
+            row += f" {latencies[-1] * 1000:>8.1f}"
+        print(row)
+
+    print(f"\nStore lock contention per endpoint ({stats['event_count']} stored events)")
+    lock_stats = stats["locks"].get("store")
+    if not lock_stats:
+        print("• no lock stats (the sqlite store backend has no store lock)")
+        return
+    print(f"{'endpoint':<10} {'acquired':>9} {'waited':>7} {'wait ms':>9} {'max wait':>9} {'held ms':>9}")
+    for endpoint, s in sorted(lock_stats.items()):
+        print(f"{endpoint:<10} {s['acquisitions']:>9} {s['contended']:>7} {s['total_wait_ms']:>9.1f} "
+              f"{s['max_wait_ms']:>9.1f} {s['total_hold_ms']:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=float, default=50, help="Target number of requests per second")
+    parser.add_argument("--duration", type=float, default=10, help="Duration of the test, in seconds")
+    parser.add_argument("--concurrency", type=int, default=32, help="Maximum number of requests in flight (clients)")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("ingest=0.3,retrieve=0.6,fetch=0.1"),
+                        help="Weights of the operations, e.g. ingest=0.3,retrieve=0.6,fetch=0.1")
+    parser.add_argument("--batch-size", type=int, default=10, help="Number of events per ingest request")
+    parser.add_argument("--server", choices=["inprocess", "uvicorn"], default="inprocess",
+                        help="Run the API in this process, or in a separate uvicorn process")
+    parser.add_argument("--workers", type=int, default=1, help="Number of uvicorn workers (with --server uvicorn)")
+    parser.add_argument("--url", help="Base URL of an already running API server (instead of starting one)")
+    args = parser.parse_args()
+
+    stub_server = start_stub_feed_server()
+    stub_url = f"http://127.0.0.1:{stub_server.server_address[1]}"
+    api = contextlib.nullcontext(args.url) if args.url else running_api(args.server, args.workers)
+    with api as base_url:
+        httpx.get(f"{base_url}/stats", params={"reset": True}).raise_for_status()
+        generator = LoadGenerator(base_url, stub_url, args.batch_size)
+        # The fetchers print each fetch from the worker threads: silence the whole run at once, as
+        # redirecting sys.stdout in each thread could leave it redirected when they interleave
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            elapsed_s = asyncio.run(generator.run(args.rate, args.duration, args.concurrency, args.mix))
+        stats = httpx.get(f"{base_url}/stats").json()
+    stub_server.shutdown()
+    print_report(generator, elapsed_s, stats)
+
+
+if __name__ == "__main__":
+    main()
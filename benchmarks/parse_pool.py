@@ -0,0 +1,72 @@
+"""
+Feed parsing benchmark: inline parsing versus the parse pool.
+
+Synthetic RSS feeds are parsed concurrently by threads, like the scheduler does
+once they are downloaded, first inline (NEWSFEED_PARSE_WORKERS=0) and then with
+the parse pool.
+
+Usage:
+    PYTHONPATH=src python benchmarks/parse_pool.py
+    PYTHONPATH=src python benchmarks/parse_pool.py --feeds 200 --items 100
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from xml.sax.saxutils import escape
+
+from newsfeed.ingestion import parse_pool, rss
+from newsfeed.ingestion.parse_pool import ParsePool
+
+WORDS = ["server", "network", "outage", "patch", "users", "cloud", "breach", "service", "data", "today"]
+
+
+def generate_feed(feed_number: int, items: int) -> bytes:
+    """Return a RSS feed of `items` items with HTML bodies (about 1 KB per item)."""
+    published_at = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    entries = "".join(
+        f"<item><guid>feed{feed_number}-{i}</guid><title>{escape(' '.join(WORDS[i % 7:i % 7 + 3]))}</title>"
+        f"<description>{escape(' '.join(WORDS) * 2)}</description>"
+        f"<content:encoded><![CDATA[<p>{' '.join(WORDS * 8)}</p>]]></content:encoded>"
+        f"<pubDate>{format_datetime(published_at + timedelta(minutes=i))}</pubDate></item>"
+        for i in range(items)
+    )
+    return ('<?xml version="1.0" encoding="UTF-8"?>'
+            '<rss version="2.0" xmlns:content="http://purl.org/rss/1.0/modules/content/">'
+            f"<channel><title>Feed {feed_number}</title>{entries}</channel></rss>").encode("utf-8")
+
+
+def parse_all(feeds: list[bytes], threads: int) -> float:
+    """Parse all the feeds from `threads` threads, and return the elapsed time in seconds."""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(lambda feed: rss.parse(feed, {"name": "bench"}), feeds))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--feeds", type=int, default=64, help="Number of feeds")
+    parser.add_argument("--items", type=int, default=50, help="Number of items per feed")
+    parser.add_argument("--threads", type=int, default=8, help="Number of fetching threads (as in the scheduler)")
+    args = parser.parse_args()
+
+    feeds = [generate_feed(i, args.items) for i in range(args.feeds)]
+    print(f"{args.feeds} feeds of {len(feeds[0]) // 1024} KB, {os.cpu_count()} CPUs")
+
+    rss.parse_entries(feeds[0])  # import feedparser
+    for name, workers in (("inline", 0), ("parse pool", os.cpu_count() or 1)):
+        # Replace the shared pool (see get_parse_pool)
+        pool = parse_pool.parse_pool = ParsePool(workers, min_bytes=0)
+        if workers:
+            pool.parse(rss.parse_entries, feeds[0])  # start the workers
+        elapsed = parse_all(feeds, args.threads)
+        print(f"• {name + ':':<12} {elapsed:.2f} s ({args.feeds / elapsed:.0f} feeds/s)")
+        pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
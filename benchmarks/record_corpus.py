@@ -0,0 +1,39 @@
+"""
+Record the events currently published by the configured sources as a corpus.
+
+The corpus is saved as a JSON array of events in the /ingest format, in
+tests/data/corpora/, where the ranking equivalence tests pick it up to check
+every ranking engine against the reference implementation on real data.
+
+Usage:
+    PYTHONPATH=src python benchmarks/record_corpus.py
+    PYTHONPATH=src python benchmarks/record_corpus.py --name sysadmin-2025-07-23
+"""
+
+import argparse
+from datetime import datetime, timezone
+from pathlib import Path
+
+from pydantic import TypeAdapter
+
+from newsfeed.config.loader import load_sources_config
+from newsfeed.ingestion.event import Event
+from newsfeed.processing.aggregate import fetch_and_aggregate_events
+
+CORPORA_DIR = Path(__file__).resolve().parents[1] / "tests" / "data" / "corpora"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--name", default=f"recorded-{datetime.now(timezone.utc):%Y%m%d-%H%M%S}",
+                        help="Name of the corpus file (without extension)")
+    args = parser.parse_args()
+
+    events = fetch_and_aggregate_events(load_sources_config())
+    corpus_path = CORPORA_DIR / f"{args.name}.json"
+    corpus_path.write_bytes(TypeAdapter(list[Event]).dump_json(events, indent=2))
+    print(f"Recorded {len(events)} events to {corpus_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Snapshot and warm-restore benchmark for the in-memory event store.
+
+A store is filled with synthetic events (already filtered, with keyword counts),
+snapshotted to a file, and restored into an empty store. The time to write and
+restore the snapshot is compared with re-ingesting the same raw events (keyword
+filtering + adding them to the store), which is what a restart costs without
+snapshots.
+
+Usage:
+    PYTHONPATH=src python benchmarks/snapshot_restore.py
+    PYTHONPATH=src python benchmarks/snapshot_restore.py --events 1000000
+"""
+
+import argparse
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from newsfeed.config.loader import load_keywords_config
+from newsfeed.ingestion.event import Event
+from newsfeed.ingestion.store import EventStore
+from newsfeed.processing.filter import keyword_based_filter
+
+WORDS = ["server", "network", "users", "team", "report", "cloud", "service", "data", "customers", "today"]
+
+
+def generate_events(count: int, keywords: list[str], seed: int = 42) -> list[Event]:
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    return [
+        Event(
+            id=f"event-{i}",
+            source=rng.choice(["reddit", "Ars Technica", "Tom's Hardware"]),
+            title=" ".join(rng.sample(WORDS, 4) + rng.sample(keywords, 2)),
+            published_at=start + timedelta(seconds=rng.randrange(30 * 24 * 3600)),
+            body=" ".join(rng.choices(WORDS, k=60) + rng.sample(keywords, 3)),
+        )
+        for i in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=100_000, help="Number of stored events")
+    args = parser.parse_args()
+
+    keywords_config = load_keywords_config()
+    all_keywords = (keywords_config['high_priority_keywords'] + keywords_config['medium_priority_keywords']
+                    + keywords_config['low_priority_keywords'])
+    events = generate_events(args.events, all_keywords)
+
+    start = time.perf_counter()
+    store = EventStore()
+    store.add_events(keyword_based_filter(events, all_keywords))
+    reingest_s = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        snapshot_path = Path(tmp_dir) / "store.snapshot"
+        start = time.perf_counter()
+        store.snapshot(snapshot_path)
+        snapshot_s = time.perf_counter() - start
+
+        restored_store = EventStore()
+        start = time.perf_counter()
+        restored_count = restored_store.restore(snapshot_path)
+        restore_s = time.perf_counter() - start
+        size_mb = snapshot_path.stat().st_size / 1e6
+
+    print(f"\n{args.events} events ({restored_count} stored after filtering)")
+    print(f"• re-ingest (filter + add): {reingest_s:.2f} s")
+    print(f"• snapshot write:           {snapshot_s:.2f} s ({size_mb:.1f} MB)")
+    print(f"• snapshot restore:         {restore_s:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
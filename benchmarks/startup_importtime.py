@@ -0,0 +1,77 @@
+"""
+Startup (cold import) benchmark for the API server and the CLI.
+
+Each module is imported in a fresh interpreter with `python -X importtime`, and
+the cumulative import time reported for the module is collected over several
+runs. The slowest imports (by cumulative time) of the last run are listed too,
+to show where the remaining startup cost comes from.
+
+Usage:
+    PYTHONPATH=src python benchmarks/startup_importtime.py
+    PYTHONPATH=src python benchmarks/startup_importtime.py --runs 20 newsfeed.cli
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+DEFAULT_MODULES = ["newsfeed.api.server", "newsfeed.cli"]
+
+
+def measure_import(module_name: str) -> tuple[int, list[tuple[int, str]]]:
+    """
+    Import a module in a fresh interpreter and parse the `-X importtime` report.
+
+    Args:
+        module_name (str): The module to import.
+
+    Returns:
+        tuple[int, list[tuple[int, str]]]: The cumulative import time of the module
+            (in microseconds), and the (cumulative time, name) of every import.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module_name}"],
+        capture_output=True,
+        text=True,
+        env=os.environ.copy(),
+        check=True,
+    )
+
+    # Report lines look like: "import time:       318 |     424231 |   fastapi"
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        imports.append((int(cumulative_us), name.strip()))
+
+    total_us = next(cumulative for cumulative, name in imports if name == module_name)
+    return total_us, imports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES, help="Modules to benchmark")
+    parser.add_argument("--runs", type=int, default=10, help="Number of cold imports per module")
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest imports to list")
+    args = parser.parse_args()
+
+    for module_name in args.modules:
+        timings_ms = []
+        for _ in range(args.runs):
+            total_us, imports = measure_import(module_name)
+            timings_ms.append(total_us / 1000)
+
+        print(f"\n{module_name} ({args.runs} runs)")
+        print(f"• median: {statistics.median(timings_ms):.1f} ms")
+        print(f"• min:    {min(timings_ms):.1f} ms")
+        print(f"• max:    {max(timings_ms):.1f} ms")
+        print(f"Slowest imports (cumulative, last run):")
+        for cumulative_us, name in sorted(imports, reverse=True)[:args.top]:
+            print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Ingestion throughput benchmark with the write-ahead log (WAL) on and off.
+
+Several threads ingest batches of already filtered events, like concurrent
+/ingest calls: each batch is added to the store and, when the WAL is on,
+appended to the log (the call returns once the batch is synced to disk).
+Thanks to group commit, the batches appended while the log is being synced
+are written together, with a single fsync.
+
+Usage:
+    PYTHONPATH=src python benchmarks/wal_ingest.py
+    PYTHONPATH=src python benchmarks/wal_ingest.py --events 50000 --batch-size 10 --threads 1 8 32
+"""
+
+import argparse
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from newsfeed.ingestion.event import Event
+from newsfeed.ingestion.store import EventStore
+from newsfeed.ingestion.wal import WriteAheadLog
+from newsfeed.processing.filter import keyword_based_filter
+
+KEYWORDS = ["outage", "ransomware", "patch", "update"]
+
+
+def generate_batches(event_count: int, batch_size: int) -> list[list[dict]]:
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    events = [
+        Event(f"event-{i}", "reddit", f"Critical outage {i}", start + timedelta(minutes=i),
+              "Patch the servers now, an update is available.")
+        for i in range(event_count)
+    ]
+    filtered_events_with_counts = keyword_based_filter(events, KEYWORDS)
+    return [filtered_events_with_counts[i:i + batch_size] for i in range(0, event_count, batch_size)]
+
+
+def measure(batches: list[list[dict]], threads: int, wal: WriteAheadLog | None) -> float:
+    """Ingest the batches with the given number of threads, and return the throughput in events/s."""
+    store = EventStore()
+
+    def ingest(batch: list[dict]):
+        # Like /ingest: log the batch, then add it to the store
+        if wal is not None:
+            wal.append(batch, store.add_events)
+        else:
+            store.add_events(batch)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(ingest, batches))
+    elapsed_s = time.perf_counter() - start
+    return sum(len(batch) for batch in batches) / elapsed_s
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=20_000, help="Number of ingested events")
+    parser.add_argument("--batch-size", type=int, default=10, help="Number of events per ingestion")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 8, 32], help="Numbers of concurrent ingestions")
+    args = parser.parse_args()
+
+    batches = generate_batches(args.events, args.batch_size)
+    print(f"\n{args.events} events, batches of {args.batch_size}")
+    for threads in args.threads:
+        print(f"{threads} concurrent ingestion(s):")
+        print(f"• WAL off: {measure(batches, threads, None):10.0f} events/s")
+        with tempfile.TemporaryDirectory() as wal_dir:
+            wal = WriteAheadLog(wal_dir)
+            try:
+                print(f"• WAL on:  {measure(batches, threads, wal):10.0f} events/s")
+            finally:
+                wal.close()
+
+
+if __name__ == "__main__":
+    main()
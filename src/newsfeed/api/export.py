@@ -0,0 +1,147 @@
+# Streaming export of the ranked events (NDJSON or Arrow IPC)
+
+import importlib.util
+import io
+import json
+
+from pydantic import TypeAdapter
+
+from newsfeed.ingestion.event import Event
+from newsfeed.utils.helpers import convert_dt_to_us
+
+# Number of events built (with their full bodies) and serialized at a time
+DEFAULT_CHUNK_SIZE = 1000
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+# Serializes events exactly like the /retrieve response
+EVENTS_ADAPTER = TypeAdapter(list[Event])
+
+SCORE_FIELDS = ("total_score", "importance_score", "recency_score", "age_hours")
+
+
+def arrow_available() -> bool:
+    """Return True if pyarrow (an optional dependency, needed for the Arrow export) is installed."""
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def explained_event_records(events_with_score: list[dict], full_events: list[Event], aliases: list[list[dict]],
+                            first_rank: int = 1) -> list[dict]:
+    """
+    Return the JSON records of ranked events: their rank, the event (in the /retrieve format),
+    the scores, age and keyword counts computed when they were ranked (see score_events), and
+    the near-duplicates collapsed into the event (see get_aliases).
+
+    Args:
+        events_with_score (list[dict]): The ranked events (see get_sorted_events).
+        full_events (list[Event]): The same events, with their full bodies (see get_full_events).
+        aliases (list[list[dict]]): The aliases ({"id": ..., "source": ...} dicts) of each event.
+        first_rank (int): The rank of the first event.
+
+    Returns:
+        list[dict]: The records, ready to be serialized to JSON.
+    """
+    records = []
+    for rank, (event_with_score, event, event_aliases) in enumerate(
+            zip(events_with_score, EVENTS_ADAPTER.dump_python(full_events, mode="json"), aliases), start=first_rank):
+        record = {"rank": rank, **event}
+        for field in SCORE_FIELDS:
+            record[field] = event_with_score[field]
+        record["kw_counts_in_title"] = dict(event_with_score['kw_counts_in_title'])
+        record["kw_counts_in_body"] = dict(event_with_score['kw_counts_in_body'])
+        record["aliases"] = event_aliases
+        records.append(record)
+    return records
+
+
+def iter_chunks(store, sorted_event_chunks):
+    """
+    Yield the chunks of ranked events with their full events (bodies may be kept compressed
+    or on disk, so they are only loaded one chunk at a time) and their aliases.
+
+    Yields:
+        tuple[list[dict], list[Event], list[list[dict]]]: The ranked events of the chunk, their full events,
+            and their aliases.
+    """
+    for chunk in sorted_event_chunks:
+        if chunk:
+            full_events = store.get_full_events([event_with_score['event'] for event_with_score in chunk])
+            yield chunk, full_events, [store.get_aliases(event.id) for event in full_events]
+
+
+def export_ndjson(store, sorted_event_chunks):
+    """
+    Yield the ranked events as newline-delimited JSON, one chunk of lines at a time.
+
+    Each line holds the rank, the event, its scores, its age, its keyword counts and its aliases
+    (see explained_event_records).
+
+    Args:
+        store (EventStore): The store the events are ranked by.
+        sorted_event_chunks (Iterable[list[dict]]): The chunks of ranked events (see iter_sorted_events).
+
+    Yields:
+        bytes: The lines of the next chunk of events.
+    """
+    rank = 1
+    for chunk, full_events, aliases in iter_chunks(store, sorted_event_chunks):
+        records = explained_event_records(chunk, full_events, aliases, first_rank=rank)
+        rank += len(chunk)
+        yield "".join(json.dumps(record) + "\n" for record in records).encode()
+
+
+def export_arrow(store, sorted_event_chunks):
+    """
+    Yield the ranked events as an Arrow IPC stream, with a record batch per chunk of events.
+
+    The columns are the same as the fields of the NDJSON export, with publication times as
+    UTC timestamps, keyword counts as maps and aliases as lists of (id, source) structs. Requires pyarrow (see arrow_available).
+
+    Args:
+        store (EventStore): The store the events are ranked by.
+        sorted_event_chunks (Iterable[list[dict]]): The chunks of ranked events (see iter_sorted_events).
+
+    Yields:
+        bytes: The next messages of the stream (the schema, a record batch, or the end of the stream).
+    """
+    import pyarrow as pa
+
+    keyword_counts = pa.map_(pa.string(), pa.int64())
+    schema = pa.schema([
+        ("rank", pa.int64()), ("id", pa.string()), ("source", pa.string()), ("title", pa.string()),
+        ("body", pa.string()), ("published_at", pa.timestamp("us", tz="UTC")),
+        *((field, pa.float64()) for field in SCORE_FIELDS),
+        ("kw_counts_in_title", keyword_counts), ("kw_counts_in_body", keyword_counts),
+        ("aliases", pa.list_(pa.struct([("id", pa.string()), ("source", pa.string())]))),
+    ])
+
+    sink = io.BytesIO()
+    def take_written_bytes() -> bytes:
+        written_bytes = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return written_bytes
+
+    rank = 0
+    with pa.ipc.new_stream(sink, schema) as writer:
+        yield take_written_bytes()
+        for chunk, full_events, aliases in iter_chunks(store, sorted_event_chunks):
+            columns = {
+                "rank": list(range(rank + 1, rank + len(chunk) + 1)),
+                "id": [event.id for event in full_events],
+                "source": [event.source for event in full_events],
+                "title": [event.title for event in full_events],
+                "body": [event.body for event in full_events],
+                # Naive publication times are in UTC
+                "published_at": [convert_dt_to_us(event.published_at) for event in full_events],
+                **{field: [event_with_score[field] for event_with_score in chunk] for field in SCORE_FIELDS},
+                "kw_counts_in_title": [list(e['kw_counts_in_title'].items()) for e in chunk],
+                "kw_counts_in_body": [list(e['kw_counts_in_body'].items()) for e in chunk],
+                "aliases": aliases,
+            }
+            rank += len(chunk)
+            writer.write_batch(pa.record_batch(
+                [pa.array(columns[field.name], type=field.type) for field in schema], schema=schema))
+            yield take_written_bytes()
+    yield take_written_bytes() # end of stream marker
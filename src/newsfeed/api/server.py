@@ -1,24 +1,105 @@
 # FastAPI server definition
 # /ingest endpoint (Ingest raw events)
 # /retrieve endpoint (Retrieve filtered events)
+# /stream endpoint (Push new events and ranking changes)
+# /stats endpoint (Store and lock contention stats)
+# /export endpoint (Stream the ranked events as NDJSON or Arrow)
 
-from fastapi import FastAPI, status
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Annotated, Literal
+from fastapi import FastAPI, HTTPException, Query, Request, status
+from fastapi.responses import JSONResponse, StreamingResponse
+from newsfeed.api.export import (ARROW_MEDIA_TYPE, DEFAULT_CHUNK_SIZE, NDJSON_MEDIA_TYPE, arrow_available,
+                                 explained_event_records, export_arrow, export_ndjson)
+from newsfeed.api.shared_ranking import create_ranking_publisher_from_settings
+from newsfeed.api.stream import broadcaster, stream_messages
 from newsfeed.ingestion.event import Event
+from newsfeed.ingestion.snapshot import create_snapshotter_from_settings
 from newsfeed.ingestion.store import store
-from newsfeed.config.loader import load_keywords_config
+from newsfeed.ingestion.wal import create_wal_from_settings
 from newsfeed.processing.filter import keyword_based_filter
+from newsfeed.utils.locks import current_operation
+from newsfeed.utils.profiling import create_profiler_from_settings, span
 from newsfeed.utils.logging_config import setup_logging
 import pprint
 import logging
 
-setup_logging()
 logger = logging.getLogger(__name__)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Application startup and shutdown hook.
+
+    Logging is configured when the server starts rather than when this module
+    is imported, so that importing the app stays cheap and side-effect free.
+
+    When snapshots are enabled, the store is restored from the last snapshot on 
+    startup, snapshotted periodically, and snapshotted once more on shutdown.
+    When the write-ahead log is enabled, the events ingested since the last 
+    snapshot are then replayed from the log.
+
+    When profiling is enabled, requests are traced (see newsfeed.utils.profiling).
+
+    When the shared ranking is enabled, the ranking is published on startup, and 
+    in the background after ingestions (see newsfeed.api.shared_ranking).
+    """
+    setup_logging()
+    app.state.profiler = create_profiler_from_settings()
+    wal = create_wal_from_settings(store)
+    snapshotter = create_snapshotter_from_settings(store, wal)
+    if snapshotter is not None:
+        snapshotter.restore()
+    if wal is not None:
+        replayed_count = wal.replay_into(store)
+        logger.info(f"Replayed {replayed_count} batches from the write-ahead log")
+    if snapshotter is not None:
+        snapshotter.start()
+    app.state.wal = wal
+    ranking_publisher = create_ranking_publisher_from_settings()
+    if ranking_publisher is not None:
+        ranking_publisher.publish(store)
+        ranking_publisher.start()
+    app.state.ranking_publisher = ranking_publisher
+    logger.info('API server started')
+    yield
+    if snapshotter is not None:
+        snapshotter.stop()
+    if wal is not None:
+        app.state.wal = None
+        wal.close()
+    if ranking_publisher is not None:
+        app.state.ranking_publisher = None
+        ranking_publisher.stop()
+    app.state.profiler = None
+
+
 app = FastAPI(
     title="Newsfeed API",
     description="Real-time newsfeed system for IT-related news aggregation",
+    lifespan=lifespan,
 )
 
+@app.middleware("http")
+async def track_operation(request: Request, call_next):
+    """
+    Record the endpoint being served, so the lock contention reported by /stats is 
+    broken down by endpoint (the context is copied to the threads of sync endpoints),
+    and trace the request when profiling is enabled.
+    """
+    token = current_operation.set(request.url.path)
+    try:
+        profiler = getattr(request.app.state, "profiler", None)
+        if profiler is not None:
+            return await profiler.handle(request, call_next)
+        return await call_next(request)
+    finally:
+        current_operation.reset(token)
+
+
 @app.get("/")
 async def root():
     """
@@ -32,7 +113,7 @@ async def root():
 
 
 @app.post("/ingest", status_code=status.HTTP_200_OK)
-async def ingest(raw_events: list[Event]) -> dict[str, str]:
+async def ingest(raw_events: list[Event], request: Request) -> dict[str, str]:
     """
     Ingest a batch of raw events, filter and sort them, and store the result in memory.
     
@@ -44,6 +125,9 @@ async def ingest(raw_events: list[Event]) -> dict[str, str]:
         - body (string, optional)
         - published_at (ISO-8601/RFC 3339 timestamp, UTC)
 
+    When the write-ahead log is enabled, the accepted events are durably logged
+    before they are stored (and the call acknowledged).
+
     Args:
         raw_events (list[Event]): A list of raw event objects to ingest.
 
@@ -52,42 +136,123 @@ async def ingest(raw_events: list[Event]) -> dict[str, str]:
     """
     logger.info('API /ingest endpoint called')
     logger.info(f"Number of raw events to ingest: {len(raw_events)}")
-    logger.debug(f"Event details:\n{pprint.pformat(raw_events, indent=2, width=80)}")
+    # Only format the (large) debug messages when they are logged
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Event details:\n{pprint.pformat(raw_events, indent=2, width=80)}")
     
     skipped_ids = []
     accepted_events = []
     batch_seen_ids_set = set()
-    for event in raw_events:
-        # check for duplicate ids in current batch
-        if event.id in batch_seen_ids_set:
-            logger.warning(f"Duplicate ID in batch: {event.id}. Skipping it.")
-            skipped_ids.append(event.id)
-            continue
-        # check for duplicate ids in store
-        if store.has_event(event.id):
-            logger.warning(f"Event with id {event.id} already exists in store. Skipping it.")
-            skipped_ids.append(event.id)
-            continue
-        accepted_events.append(event)
-        print(f"Accepted event id: {event.id}")
-        batch_seen_ids_set.add(event.id)
-
-    # Load keyword configuration from YAML file
-    keywords_config = load_keywords_config()
-    high_priority_keywords = keywords_config['high_priority_keywords']
-    medium_priority_keywords = keywords_config['medium_priority_keywords']
-    low_priority_keywords = keywords_config['low_priority_keywords']
-    all_keywords = high_priority_keywords + medium_priority_keywords + low_priority_keywords
-    
-    filtered_events_with_counts = keyword_based_filter(accepted_events, all_keywords)
+    with span("dedup"):
+        for event in raw_events:
+            # check for duplicate ids in current batch
+            if event.id in batch_seen_ids_set:
+                logger.warning(f"Duplicate ID in batch: {event.id}. Skipping it.")
+                skipped_ids.append(event.id)
+                continue
+            # check for duplicate ids in store
+            if store.has_event(event.id):
+                logger.warning(f"Event with id {event.id} already exists in store. Skipping it.")
+                skipped_ids.append(event.id)
+                continue
+            accepted_events.append(event)
+            print(f"Accepted event id: {event.id}")
+            batch_seen_ids_set.add(event.id)
+
+    # Filter by the keywords the store ranks events with (loaded with its ranking function),
+    # so every retained event gets the weight and tier of its keywords
+    with span("filter"):
+        filtered_events_with_counts = keyword_based_filter(accepted_events, store.ranking_function.keywords)
     print(f"Number of filtered events: {len(filtered_events_with_counts)}")
-    store.add_events(filtered_events_with_counts)
+
+    wal = getattr(request.app.state, "wal", None)
+    if wal is not None and filtered_events_with_counts:
+        # Log the events before adding them to the store, so they are only served once durable.
+        # Wait in a worker thread, so concurrent ingestions are logged with a single fsync (group commit)
+        with span("wal"):
+            await asyncio.to_thread(wal.append, filtered_events_with_counts, store.add_events)
+    else:
+        with span("store"):
+            store.add_events(filtered_events_with_counts)
+
+    # Push the accepted events to the streaming clients (the top k ranking changes follow in the background)
+    with span("broadcast"):
+        broadcaster.publish_ingested_events(filtered_events_with_counts, store)
+
+    ranking_publisher = getattr(request.app.state, "ranking_publisher", None)
+    if ranking_publisher is not None and filtered_events_with_counts:
+        # Ranked and written by the publisher thread, without waiting: the requests of
+        # concurrent ingestions are coalesced into a publication of the latest ranking
+        ranking_publisher.request_publish(store)
     
     return {"message": "ACK", "status": "successful exit"}
 
 
+@app.get("/stream")
+async def stream(request: Request) -> StreamingResponse:
+    """
+    Stream newly accepted events and ranking changes as server-sent events (SSE).
+
+    Instead of polling /retrieve, clients can keep this connection open to receive:
+        - `events` messages: the JSON array of events accepted by each /ingest call
+        - `ranking` messages: the new top k ranking (ids, ranks and scores) whenever it 
+          changes, with the ids which `entered` and `left` the top k
+        - a `dropped` message, right before the server closes the stream of a client 
+          which does not read its messages fast enough
+
+    Returns:
+        StreamingResponse: A `text/event-stream` response.
+    """
+    logger.info('API /stream endpoint called')
+    subscriber = broadcaster.subscribe()
+    return StreamingResponse(
+        stream_messages(subscriber, broadcaster, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+@app.get("/stats")
+def stats(reset: bool = False) -> dict:
+    """
+    Report the number of stored events, and the contention of the store lock per endpoint.
+
+    For each endpoint, the lock stats are: the number of acquisitions, the number of
+    acquisitions which had to wait for another thread, and the total and maximum wait
+    times and total hold time (in milliseconds).
+
+    Args:
+        reset (bool, optional): Reset the lock stats after reporting them (e.g. between load test runs).
+
+    Returns:
+        dict: The event count and the lock stats.
+    """
+    store_lock = getattr(store, "store_lock", None) # the sqlite store has no lock
+    lock_stats = {}
+    if store_lock is not None:
+        lock_stats["store"] = store_lock.get_stats()
+        if reset:
+            store_lock.reset_stats()
+    return {"event_count": store.get_event_count(), "locks": lock_stats}
+
+
+# Query parameters of the endpoints returning ranked events (see /retrieve)
+KeywordQuery = Annotated[list[str] | None, Query(description="Only return events containing all these keywords")]
+TierQuery = Annotated[Literal["high", "medium", "low"] | None, Query(description="Only return events containing a keyword of this priority tier")]
+SourceQuery = Annotated[list[str] | None, Query(description="Only return events from one of these sources")]
+SinceQuery = Annotated[datetime | None, Query(description="Only return events published at or after this time")]
+UntilQuery = Annotated[datetime | None, Query(description="Only return events published before this time")]
+
+
 @app.get("/retrieve")
-def retrieve() -> list[Event]:
+def retrieve(
+    keyword: KeywordQuery = None,
+    tier: TierQuery = None,
+    source: SourceQuery = None,
+    since: SinceQuery = None,
+    until: UntilQuery = None,
+    explain: Annotated[bool, Query(description="Also return the rank, scores, age and keyword counts of each event")] = False,
+) -> list[Event]:
     """
     Retrieve the current batch of filtered and ranked events.
 
@@ -96,20 +261,90 @@ def retrieve() -> list[Event]:
     This call must be deterministic for a given ingestion batch so our tests can assert exact
     membership and ordering.
 
+    The optional query parameters restrict the result to a topic, a source or a 
+    publication time range (e.g. `/retrieve?keyword=ransomware&tier=high` or
+    `/retrieve?source=reddit&since=2025-07-22T00:00:00Z`). They are answered from 
+    the indexes of the store, so only the matching events are ranked.
+
+    With `explain=true`, each event also has its `rank`, `total_score`, `importance_score`,
+    `recency_score`, `age_hours`, `kw_counts_in_title` and `kw_counts_in_body`, as computed
+    when the events were ranked (they are not scored again), to debug the ranking, and the
+    `aliases` (id and source) of the near-duplicates collapsed into it.
+
+    Args:
+        keyword (list[str], optional): Keywords that the events must all contain (title or body).
+        tier (str, optional): Priority tier ("high", "medium", "low") of a keyword the events must contain.
+        source (list[str], optional): Sources the events must come from (any of them).
+        since (datetime, optional): Minimum publication time (inclusive, naive times are UTC).
+        until (datetime, optional): Maximum publication time (exclusive, naive times are UTC).
+        explain (bool, optional): Add the ranking details to each event.
     
     Returns:
-        list[Event]: The call returns the stored events.
+        list[Event]: The call returns the stored events (with their ranking details if explain is true).
     """
     logger.info('API /retrieve endpoint called')
 
-    sorted_events_with_score = store.get_sorted_events()
+    with span("rank"):
+        sorted_events_with_score = store.get_sorted_events(keywords=keyword, tier=tier, sources=source,
+                                                           since=since, until=until)
 
-    logger.debug(f"Relevant events ranked by score:\n{pprint.pformat(sorted_events_with_score, indent=2, width=80)}")
+    # Only format the (large) debug messages when they are logged
+    debug = logger.isEnabledFor(logging.DEBUG)
+    if debug:
+        logger.debug(f"Relevant events ranked by score:\n{pprint.pformat(sorted_events_with_score, indent=2, width=80)}")
 
     sorted_filtered_events = [event_with_score["event"] for event_with_score in sorted_events_with_score]
-    logger.debug(f"Number of stored events: {store.get_event_count()}")
+    # Bodies may be kept compressed or on disk, load the full text for the response
+    with span("load_bodies"):
+        sorted_filtered_events = store.get_full_events(sorted_filtered_events)
     logger.info(f"Number of returned events: {len(sorted_filtered_events)}")
-    logger.debug(f"Returned sorted filtered events details:\n{pprint.pformat(sorted_filtered_events, indent=2, width=80)}")
+    if debug:
+        logger.debug(f"Number of stored events: {store.get_event_count()}")
+        logger.debug(f"Returned sorted filtered events details:\n{pprint.pformat(sorted_filtered_events, indent=2, width=80)}")
 
+    if explain:
+        # The ranking details are not Event fields, so they bypass the response model
+        with span("explain"):
+            aliases = [store.get_aliases(event.id) for event in sorted_filtered_events]
+            explained_events = explained_event_records(sorted_events_with_score, sorted_filtered_events, aliases)
+        return JSONResponse(explained_events)
     return sorted_filtered_events
 
+
+
+@app.get("/export")
+def export(
+    format: Annotated[Literal["ndjson", "arrow"], Query(description="Format of the exported events")] = "ndjson",
+    keyword: KeywordQuery = None,
+    tier: TierQuery = None,
+    source: SourceQuery = None,
+    since: SinceQuery = None,
+    until: UntilQuery = None,
+) -> StreamingResponse:
+    """
+    Stream the ranked events, with their scores, age and keyword counts, for downstream analytics.
+
+    Unlike /retrieve, the response is not built in memory: the events are ranked once, as
+    /retrieve would return them (with the same optional query parameters), keeping only
+    their ids and scores, then they are built (with their bodies) and serialized one
+    chunk at a time while the response is sent (see iter_sorted_events).
+        - `format=ndjson` (default): one JSON object per line, with the rank, the event fields,
+          `total_score`, `importance_score`, `recency_score`, `age_hours`, `kw_counts_in_title`,
+          `kw_counts_in_body` and `aliases`
+        - `format=arrow`: an Arrow IPC stream with the same columns, a record batch per chunk
+          (requires pyarrow on the server, otherwise HTTP 501)
+
+    Returns:
+        StreamingResponse: An `application/x-ndjson` or `application/vnd.apache.arrow.stream` response.
+    """
+    logger.info(f'API /export endpoint called (format: {format})')
+    if format == "arrow" and not arrow_available():
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED,
+                            detail="The Arrow export requires pyarrow, which is not installed on the server")
+
+    # Ranked when the response starts, then built and serialized one chunk at a time
+    sorted_event_chunks = store.iter_sorted_events(DEFAULT_CHUNK_SIZE, keywords=keyword, tier=tier, sources=source,
+                                                   since=since, until=until)
+    if format == "arrow":
+        return StreamingResponse(export_arrow(store, sorted_event_chunks), media_type=ARROW_MEDIA_TYPE)
+    return StreamingResponse(export_ndjson(store, sorted_event_chunks), media_type=NDJSON_MEDIA_TYPE)
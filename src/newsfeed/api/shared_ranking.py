@@ -0,0 +1,283 @@
+"""
+Read-only ranking shared with local sidecar processes through a memory-mapped file.
+
+Dashboards and alerting agents running on the same machine as the API server can
+read the current top N ranking from a file instead of polling /retrieve: the API
+server rewrites it in the background after ingestions, and readers map it in
+memory and read the ids and scores in place, without HTTP requests or JSON parsing.
+
+File layout (native byte order, as the readers run on the same machine):
+    - header: magic (8 bytes), event count n (uint32), padding (uint32), generation (uint64),
+      publication time (float64, POSIX timestamp), size of the id blob in bytes (uint64)
+    - total scores: n float64, in ranking order
+    - id offsets: n + 1 uint32, the id of the event at rank i + 1 is blob[offsets[i]:offsets[i + 1]]
+    - id blob: the UTF-8 encoded event ids, concatenated
+
+The file is written to a temporary file and renamed over the previous one, so
+readers always see a complete ranking: a reader keeps reading the ranking it
+mapped until it calls SharedRankingReader.refresh().
+
+Configured with:
+    - NEWSFEED_SHARED_RANKING: publish the ranking (default: false)
+    - NEWSFEED_SHARED_RANKING_PATH: the ranking file (default: data/ranking.bin)
+    - NEWSFEED_SHARED_RANKING_TOP_N: number of top ranked events published (default: 100)
+"""
+
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from array import array
+from pathlib import Path
+
+from newsfeed.config.settings import DATA_DIR, get_bool_setting, get_int_setting, get_path_setting
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"NFRANK1\0"
+HEADER = struct.Struct("=8sIIQdQ")
+DEFAULT_TOP_N = 100
+
+# Readable by the sidecars, which may run as other users than the API server
+FILE_MODE = 0o644
+
+
+def encode_ranking(event_ids: list[str], scores: list[float], generation: int, published_at: float) -> bytes:
+    """
+    Encode a ranking in the shared ranking file format (see the module docstring).
+
+    Args:
+        event_ids (list[str]): The ids of the ranked events, in ranking order.
+        scores (list[float]): Their total scores.
+        generation (int): The number of the ranking (incremented by each publication).
+        published_at (float): The time the ranking was computed (POSIX timestamp).
+
+    Returns:
+        bytes: The content of the file.
+    """
+    encoded_ids = [event_id.encode("utf-8") for event_id in event_ids]
+    offsets = array("I", [0])
+    for encoded_id in encoded_ids:
+        offsets.append(offsets[-1] + len(encoded_id))
+    blob = b"".join(encoded_ids)
+    header = HEADER.pack(MAGIC, len(event_ids), 0, generation, published_at, len(blob))
+    return b"".join((header, array("d", scores).tobytes(), offsets.tobytes(), blob))
+
+
+class RankingPublisher:
+    """
+    Publish the top N ranking of a store to the shared ranking file.
+
+    Publications can be requested from a background thread (see start and request_publish):
+    the requests made while a publication is pending or running are coalesced into a single
+    publication of the latest ranking, so bursts of ingestions do not queue up rankings.
+    """
+    def __init__(self, path: Path, top_n: int = DEFAULT_TOP_N):
+        """
+        Args:
+            path (Path): The shared ranking file.
+            top_n (int): The number of top ranked events published.
+        """
+        self.path = Path(path)
+        self.top_n = top_n
+        self.generation = 0
+        # Publications are serialized, so the file never goes back to an older ranking
+        self.lock = threading.Lock()
+        # Background publications: the store to publish next (None if no publication is pending)
+        self.condition = threading.Condition()
+        self.pending_store = None
+        self.publishing = False
+        self.stopping = False
+        self.thread = None
+
+    def publish(self, store) -> int:
+        """
+        Rank the events of the store, and atomically replace the shared ranking file.
+
+        Returns:
+            int: The generation of the published ranking.
+        """
+        with self.lock:
+            top_events_with_score = store.get_top_events(self.top_n)
+            self.generation += 1
+            content = encode_ranking([e['event'].id for e in top_events_with_score],
+                                     [e['total_score'] for e in top_events_with_score],
+                                     self.generation, time.time())
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            file_descriptor, temporary_path = tempfile.mkstemp(dir=self.path.parent, prefix=self.path.name + ".")
+            try:
+                with os.fdopen(file_descriptor, "wb") as file:
+                    os.fchmod(file.fileno(), FILE_MODE) # temporary files are only readable by their owner
+                    file.write(content)
+                os.replace(temporary_path, self.path)
+            except BaseException:
+                os.unlink(temporary_path)
+                raise
+            logger.debug(f"Published ranking {self.generation} ({len(top_events_with_score)} events) to {self.path}")
+            return self.generation
+
+    def start(self):
+        """Start the background thread publishing the requested rankings."""
+        if self.thread is None:
+            self.stopping = False
+            self.thread = threading.Thread(target=self._run, name="ranking-publisher", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        """Publish the pending ranking, if any, and stop the background thread."""
+        with self.condition:
+            self.stopping = True
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def request_publish(self, store):
+        """
+        Request the publication of the ranking of the store by the background thread (see start),
+        without waiting for it. If a publication is already pending, it is the only one made.
+        """
+        with self.condition:
+            self.pending_store = store
+            self.condition.notify_all()
+
+    def wait_published(self, timeout: float | None = None) -> bool:
+        """
+        Wait until the requested publications are made.
+
+        Returns:
+            bool: False if the timeout expired first.
+        """
+        with self.condition:
+            return self.condition.wait_for(lambda: self.pending_store is None and not self.publishing, timeout)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.pending_store is not None or self.stopping)
+                if self.pending_store is None:
+                    return
+                store, self.pending_store = self.pending_store, None
+                self.publishing = True
+            try:
+                self.publish(store)
+            except Exception:
+                logger.exception("Failed to publish the shared ranking")
+            finally:
+                with self.condition:
+                    self.publishing = False
+                    self.condition.notify_all()
+
+
+class SharedRankingReader:
+    """
+    Read the shared ranking file in place, from another process.
+
+    The scores and id offsets are memoryviews of the mapped file, so reading the
+    ranking copies nothing but the ids which are decoded.
+
+    Usage:
+        reader = SharedRankingReader("data/ranking.bin")
+        while True:
+            if reader.refresh():
+                print(reader.generation, reader.top(10))
+            time.sleep(1)
+    """
+    def __init__(self, path: Path):
+        """
+        Args:
+            path (Path): The shared ranking file (it does not have to exist yet).
+        """
+        self.path = Path(path)
+        self.file_id = None
+        self.mmap = None
+        self.view = None
+        self.generation = 0
+        self.published_at = None
+        self.scores = memoryview(b"").cast("d")
+        self.offsets = memoryview(b"").cast("I")
+        self.blob = memoryview(b"")
+
+    def refresh(self) -> bool:
+        """
+        Map the last published ranking, if the file was replaced since the last refresh.
+
+        Returns:
+            bool: True if a new ranking was mapped.
+
+        Raises:
+            ValueError: If the file is not a shared ranking file.
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        file_id = (stat.st_dev, stat.st_ino, stat.st_mtime_ns)
+        if file_id == self.file_id:
+            return False
+        # The publisher never leaves a partial file, so a shorter file is not a ranking (and an empty one cannot be mapped)
+        if stat.st_size < HEADER.size:
+            raise ValueError(f"{self.path} is not a shared ranking file ({stat.st_size} bytes, shorter than the header)")
+
+        with open(self.path, "rb") as file:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, _, generation, published_at, blob_size = HEADER.unpack_from(mapped)
+        if magic != MAGIC:
+            mapped.close()
+            raise ValueError(f"{self.path} is not a shared ranking file")
+        scores_end = HEADER.size + 8 * count
+        offsets_end = scores_end + 4 * (count + 1)
+        if len(mapped) < offsets_end + blob_size:
+            size = len(mapped)
+            mapped.close()
+            raise ValueError(f"{self.path} is truncated ({size} bytes, {offsets_end + blob_size} expected)")
+        self.close()
+        self.view = view = memoryview(mapped)
+        self.scores = view[HEADER.size:scores_end].cast("d")
+        self.offsets = view[scores_end:offsets_end].cast("I")
+        self.blob = view[offsets_end:offsets_end + blob_size]
+        self.mmap, self.file_id = mapped, file_id
+        self.generation, self.published_at = generation, published_at
+        return True
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def event_id(self, index: int) -> str:
+        """Return the id of the event ranked at position index (0 for the first)."""
+        return str(self.blob[self.offsets[index]:self.offsets[index + 1]], "utf-8")
+
+    def top(self, k: int | None = None) -> list[tuple[str, float]]:
+        """Return the (id, total score) of the k (default: all) best ranked events of the mapped ranking."""
+        return [(self.event_id(i), self.scores[i]) for i in range(min(k, len(self)) if k is not None else len(self))]
+
+    def close(self):
+        """Unmap the ranking (the reader can be refreshed again)."""
+        if self.mmap is not None:
+            for view in (self.scores, self.offsets, self.blob, self.view):
+                view.release()
+            try:
+                self.mmap.close()
+            except BufferError:
+                pass # the caller still holds views of the ranking: it is unmapped once they are released
+            self.mmap, self.view, self.file_id = None, None, None
+        self.scores = memoryview(b"").cast("d")
+        self.offsets = memoryview(b"").cast("I")
+        self.blob = memoryview(b"")
+
+
+def create_ranking_publisher_from_settings() -> RankingPublisher | None:
+    """
+    Create a RankingPublisher configured from the NEWSFEED_* settings (see the module docstring).
+
+    Returns None when the shared ranking is disabled.
+    """
+    if not get_bool_setting("SHARED_RANKING"):
+        return None
+    return RankingPublisher(
+        get_path_setting("SHARED_RANKING_PATH", DATA_DIR / "ranking.bin"),
+        get_int_setting("SHARED_RANKING_TOP_N", DEFAULT_TOP_N),
+    )
@@ -0,0 +1,173 @@
+# Server-sent events (SSE) push of newly accepted events and ranking changes
+
+import asyncio
+import json
+import logging
+from dataclasses import dataclass, field
+
+from pydantic import TypeAdapter
+
+from newsfeed.config.settings import get_int_setting
+from newsfeed.ingestion.event import Event
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of messages buffered per subscriber before it is considered too slow and dropped
+DEFAULT_BUFFER_SIZE = 100
+
+# Number of top ranked events whose changes are pushed to subscribers
+DEFAULT_TOP_K = 10
+
+# A comment line is sent when no message was pushed for this many seconds, to keep connections open
+KEEP_ALIVE_SECONDS = 15
+
+# Sentinel message telling a dropped subscriber's stream to close
+DROPPED = object()
+
+# Serializes events exactly like the /retrieve response
+EVENTS_ADAPTER = TypeAdapter(list[Event])
+
+
+@dataclass(eq=False)
+class Subscriber:
+    """A streaming client, with its own bounded buffer of pending messages."""
+    queue: asyncio.Queue
+    dropped: bool = False
+
+
+@dataclass
+class EventBroadcaster:
+    """
+    Fan out messages to all the streaming clients.
+
+    Each subscriber has a bounded buffer: a client that does not read its messages
+    fast enough fills its buffer and is dropped, so slow consumers never make the
+    server buffer an unbounded amount of messages (or slow down ingestion).
+    Publishing must happen on the event loop thread (e.g. from an async endpoint).
+    """
+    buffer_size: int = DEFAULT_BUFFER_SIZE
+    top_k: int = DEFAULT_TOP_K
+    subscribers: set = field(default_factory=set)
+    last_top_ids: list | None = None
+    # The background task computing the top k ranking (None when no ranking is pending)
+    ranking_task: asyncio.Task | None = None
+    ranking_outdated: bool = False
+
+    def subscribe(self) -> Subscriber:
+        subscriber = Subscriber(queue=asyncio.Queue(maxsize=self.buffer_size))
+        self.subscribers.add(subscriber)
+        logger.info(f"Stream subscriber added ({len(self.subscribers)} subscribers)")
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+        logger.info(f"Stream subscriber removed ({len(self.subscribers)} subscribers)")
+
+    def has_subscribers(self) -> bool:
+        return bool(self.subscribers)
+
+    def publish(self, event_type: str, data):
+        """Push a message to every subscriber, dropping the ones whose buffer is full."""
+        message = (event_type, data)
+        for subscriber in list(self.subscribers):
+            try:
+                subscriber.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                self.drop(subscriber)
+
+    def drop(self, subscriber: Subscriber):
+        """Disconnect a slow subscriber: discard its pending messages and tell its stream to close."""
+        logger.warning(f"Dropping slow stream subscriber ({self.buffer_size} messages pending)")
+        subscriber.dropped = True
+        self.subscribers.discard(subscriber)
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(DROPPED)
+
+    def publish_ingested_events(self, filtered_events_with_counts: list[dict], store):
+        """
+        Push the events accepted by an ingestion, and schedule the push of the new top k
+        ranking if it changed, without waiting for it.
+
+        The top k ranking is computed by a background task, in a worker thread, so the
+        ingestion is acknowledged right away and the event loop keeps serving other
+        requests meanwhile. Ingestions which happen while it is computed are coalesced:
+        the ranking is computed once more after it, for all of them.
+
+        Args:
+            filtered_events_with_counts (list[dict]): The events which were added to the store.
+            store (EventStore): The store, used to compute the new top k ranking.
+        """
+        if not self.has_subscribers():
+            # Nobody to notify, the next subscriber gets the ranking as it is when it connects
+            self.last_top_ids = None
+            return
+
+        if filtered_events_with_counts:
+            accepted_events = [e['event'] for e in filtered_events_with_counts]
+            self.publish("events", EVENTS_ADAPTER.dump_python(accepted_events, mode="json"))
+
+        self.ranking_outdated = True # a ranking in progress is computed again when it is done
+        if self.ranking_task is None:
+            self.ranking_task = asyncio.create_task(self.update_ranking(store))
+
+    async def update_ranking(self, store):
+        """Compute and push the top k ranking, until no ingestion happened while it was computed."""
+        try:
+            while self.ranking_outdated:
+                self.ranking_outdated = False
+                self.publish_ranking(await asyncio.to_thread(store.get_top_events, self.top_k))
+        except Exception:
+            logger.exception("Failed to compute the top k ranking pushed to the stream subscribers")
+        finally:
+            self.ranking_task = None
+
+    def publish_ranking(self, top_events_with_score: list[dict]):
+        """Push the top k ranking if it changed since the last one pushed."""
+        top_ids = [e['event'].id for e in top_events_with_score]
+        if top_ids != self.last_top_ids:
+            previous_ids = set(self.last_top_ids or [])
+            self.publish("ranking", {
+                "top": [{"id": e['event'].id, "rank": rank, "score": e['total_score']}
+                        for rank, e in enumerate(top_events_with_score, start=1)],
+                "entered": [event_id for event_id in top_ids if event_id not in previous_ids],
+                "left": [event_id for event_id in self.last_top_ids or [] if event_id not in top_ids],
+            })
+            self.last_top_ids = top_ids
+
+
+def format_sse(event_type: str, data) -> str:
+    """Format a message in the server-sent events wire format."""
+    return f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_messages(subscriber: Subscriber, broadcaster: EventBroadcaster, is_disconnected):
+    """
+    Yield the messages of a subscriber as server-sent events, until the client
+    disconnects or is dropped for being too slow.
+
+    Args:
+        subscriber (Subscriber): The subscriber to stream the messages of.
+        broadcaster (EventBroadcaster): The broadcaster the subscriber is registered with.
+        is_disconnected: Async callable returning True once the client has disconnected.
+    """
+    try:
+        while not await is_disconnected():
+            try:
+                message = await asyncio.wait_for(subscriber.queue.get(), timeout=KEEP_ALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if message is DROPPED:
+                yield format_sse("dropped", {"reason": "slow consumer"})
+                break
+            yield format_sse(*message)
+    finally:
+        broadcaster.unsubscribe(subscriber)
+
+
+# Singleton: shared broadcaster used by the API endpoints
+broadcaster = EventBroadcaster(
+    buffer_size=get_int_setting("STREAM_BUFFER_SIZE", DEFAULT_BUFFER_SIZE),
+    top_k=get_int_setting("STREAM_TOP_K", DEFAULT_TOP_K),
+)
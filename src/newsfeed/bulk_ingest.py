@@ -0,0 +1,254 @@
+"""
+Bulk ingestion of events from files, e.g. to backfill months of historical events.
+
+Usage:
+    PYTHONPATH=src python -m newsfeed.bulk_ingest events.jsonl [more files ...] [--snapshot data/store.snapshot]
+
+The input files hold events in the /ingest format (id, source, title, body, published_at):
+    - JSON Lines files (.jsonl or .ndjson, optionally gzip-compressed, e.g. .jsonl.gz): one event per line
+    - Parquet (.parquet) and Arrow IPC (.arrow, .feather) files, with one column per field
+      (these require pyarrow, which is not a dependency of the project)
+
+The files are read in chunks, which are validated and keyword-filtered in parallel by a
+pool of worker processes, while this process adds the filtered events to the store, in
+input order (so the first of several events with the same id is kept). Only a few chunks
+per worker are in flight at a time, so memory does not grow with the size of the input.
+
+The events are added to the store configured by NEWSFEED_STORE_BACKEND. The memory and
+columnar stores only live in this process, so their events are then written to a snapshot
+file (--snapshot, which defaults to NEWSFEED_SNAPSHOT_PATH when NEWSFEED_SNAPSHOTS is
+enabled), which the API server restores on startup. The events of an existing snapshot
+file are restored first, and kept. Run it while the API server is stopped, as the server
+overwrites the snapshot file.
+"""
+
+import argparse
+import gzip
+import logging
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from pydantic import TypeAdapter, ValidationError
+
+from newsfeed.config.settings import DATA_DIR, get_bool_setting, get_path_setting
+from newsfeed.ingestion.event import Event
+from newsfeed.ingestion.parse_pool import default_workers
+from newsfeed.ingestion.snapshot import gc_paused
+from newsfeed.processing.filter import keyword_based_filter
+from newsfeed.utils.logging_config import setup_logging
+
+logger = logging.getLogger("newsfeed.bulk_ingest")
+
+JSONL_SUFFIXES = {".jsonl", ".ndjson"}
+PARQUET_SUFFIXES = {".parquet"}
+ARROW_SUFFIXES = {".arrow", ".feather"}
+
+DEFAULT_CHUNK_SIZE = 10_000
+
+# Validate events exactly like the /ingest endpoint
+event_adapter = TypeAdapter(Event)
+events_adapter = TypeAdapter(list[Event])
+
+
+def read_chunks(path: Path, chunk_size: int):
+    """
+    Read the events of a file in chunks.
+
+    Yields:
+        list: The next chunk of events: raw JSON lines (bytes) for JSON Lines files,
+            and dicts for Parquet and Arrow files.
+
+    Raises:
+        ValueError: If the file format is not supported.
+    """
+    suffixes = path.suffixes
+    if suffixes and suffixes[-1] == ".gz":
+        suffixes = suffixes[:-1]
+    suffix = suffixes[-1].lower() if suffixes else ""
+    if suffix in JSONL_SUFFIXES:
+        yield from read_jsonl_chunks(path, chunk_size)
+    elif suffix in PARQUET_SUFFIXES | ARROW_SUFFIXES:
+        yield from read_arrow_chunks(path, chunk_size)
+    else:
+        raise ValueError(f"Unsupported file format: {path}. Supported: "
+                         f"{', '.join(sorted(JSONL_SUFFIXES | PARQUET_SUFFIXES | ARROW_SUFFIXES))} (and .jsonl.gz)")
+
+
+def read_jsonl_chunks(path: Path, chunk_size: int):
+    opener = gzip.open if path.suffix == ".gz" else open
+    with opener(path, "rb") as file:
+        chunk = []
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            chunk.append(line)
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def read_arrow_chunks(path: Path, chunk_size: int):
+    try:
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ValueError(f"pyarrow is required to read {path} (pip install pyarrow)") from e
+
+    if path.suffix.lower() in PARQUET_SUFFIXES:
+        batches = pyarrow.parquet.ParquetFile(path).iter_batches(batch_size=chunk_size)
+    else:
+        reader = pyarrow.ipc.open_file(path)
+        batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+    for batch in batches:
+        # Record batches of Arrow files can be larger than the chunk size
+        for offset in range(0, batch.num_rows, chunk_size):
+            yield batch.slice(offset, chunk_size).to_pylist()
+
+
+def validate_and_filter(rows: list, keywords: list[str]) -> tuple[list[dict], int]:
+    """
+    Validate a chunk of events and keep the ones containing keywords (run by the worker processes).
+
+    Args:
+        rows (list): Raw JSON lines (bytes) or dicts (see read_chunks).
+        keywords (list[str]): The keywords of the filter.
+
+    Returns:
+        tuple[list[dict], int]: The filtered events with their keyword counts (see keyword_based_filter),
+            and the number of valid events.
+    """
+    try:
+        # Fast path: validate the whole chunk at once
+        if rows and isinstance(rows[0], bytes):
+            events = events_adapter.validate_json(b"[" + b",".join(rows) + b"]")
+        else:
+            events = events_adapter.validate_python(rows)
+    except ValidationError:
+        events = []
+        for row in rows:
+            try:
+                events.append(event_adapter.validate_json(row) if isinstance(row, bytes) else event_adapter.validate_python(row))
+            except ValidationError as e:
+                logger.warning(f"Skipping invalid event: {e.errors()[0]['msg']} ({row[:200]!r})")
+    return keyword_based_filter(events, keywords), len(events)
+
+
+def bulk_ingest(paths: list[Path], store, keywords: list[str], chunk_size: int = DEFAULT_CHUNK_SIZE,
+                workers: int = 0, report_progress: bool = True) -> dict[str, int | float]:
+    """
+    Validate, filter and add the events of files to a store (see the module docstring).
+
+    Args:
+        paths (list[Path]): The input files.
+        store: The store the filtered events are added to.
+        keywords (list[str]): The keywords of the filter.
+        chunk_size (int): The number of events per chunk.
+        workers (int): The number of worker processes (0 to validate and filter the chunks in this process).
+        report_progress (bool): Print the progress after each chunk.
+
+    Returns:
+        dict[str, int | float]: The number of events read, invalid, filtered out, duplicated
+            (already stored, earlier in the input or near-duplicates) and stored, and the elapsed time in seconds.
+    """
+    stats = {"read": 0, "invalid": 0, "filtered_out": 0, "duplicates": 0, "stored": 0, "seconds": 0.0}
+    start_time = time.perf_counter()
+
+    def add_chunk(chunk_size: int, result: tuple[list[dict], int]):
+        filtered_events_with_counts, valid_count = result
+        unstored_ids = {event.id for event in store.get_unstored_events(
+            [record['event'] for record in filtered_events_with_counts])}
+        new_records = []
+        for record in filtered_events_with_counts:
+            if record['event'].id in unstored_ids:
+                unstored_ids.discard(record['event'].id) # keep the first of the duplicates of the chunk
+                new_records.append(record)
+        # Near-duplicates of stored events are stored as aliases (see add_events)
+        event_count = store.get_event_count()
+        store.add_events(new_records)
+        stored_count = store.get_event_count() - event_count
+
+        stats["read"] += chunk_size
+        stats["invalid"] += chunk_size - valid_count
+        stats["filtered_out"] += valid_count - len(filtered_events_with_counts)
+        stats["duplicates"] += len(filtered_events_with_counts) - stored_count
+        stats["stored"] += stored_count
+        stats["seconds"] = time.perf_counter() - start_time
+        if report_progress:
+            print(f"{stats['read']} events read, {stats['stored']} stored "
+                  f"({stats['read'] / stats['seconds']:.0f} events/s)", end="\r")
+
+    chunks = (chunk for path in paths for chunk in read_chunks(path, chunk_size))
+    with gc_paused():
+        if workers <= 0:
+            for chunk in chunks:
+                add_chunk(len(chunk), validate_and_filter(chunk, keywords))
+        else:
+            # Workers are spawned rather than forked, as this process may run threads (e.g. the tests)
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+                # Chunks are added in input order, with a bounded number of chunks in flight
+                pending = deque()
+                for chunk in chunks:
+                    pending.append((len(chunk), executor.submit(validate_and_filter, chunk, keywords)))
+                    if len(pending) >= 2 * workers:
+                        chunk_length, future = pending.popleft()
+                        add_chunk(chunk_length, future.result())
+                while pending:
+                    chunk_length, future = pending.popleft()
+                    add_chunk(chunk_length, future.result())
+    if report_progress:
+        print()
+    stats["seconds"] = time.perf_counter() - start_time
+    return stats
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(prog="python -m newsfeed.bulk_ingest", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="+", type=Path, help="JSON Lines, Parquet or Arrow files of events")
+    parser.add_argument("--snapshot", type=Path, default=None,
+                        help="Snapshot file the store is written to (default: NEWSFEED_SNAPSHOT_PATH if NEWSFEED_SNAPSHOTS is enabled)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Number of events per chunk")
+    parser.add_argument("--workers", type=int, default=default_workers(),
+                        help="Number of worker processes (default: the number of CPUs, 0 to use this process only, "
+                             "the default with a single CPU)")
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    from newsfeed.ingestion.store import store # created from the settings
+
+    snapshot_path = args.snapshot
+    if snapshot_path is None and get_bool_setting("SNAPSHOTS"):
+        snapshot_path = get_path_setting("SNAPSHOT_PATH", DATA_DIR / "store.snapshot")
+    persistent = not hasattr(store, "snapshot") # the sqlite store backend
+    if persistent and args.snapshot is not None:
+        parser.error("--snapshot is not supported by the sqlite store backend, which is already persistent")
+    if not persistent and snapshot_path is None:
+        parser.error("the events of the in-memory store would be lost: pass --snapshot, or use the sqlite store backend")
+
+    if not persistent and snapshot_path.exists():
+        print(f"Restored {store.restore(snapshot_path)} events from {snapshot_path}")
+
+    try:
+        stats = bulk_ingest(args.files, store, store.ranking_function.keywords, chunk_size=args.chunk_size, workers=args.workers)
+    except (OSError, ValueError) as e:
+        parser.exit(1, f"Error: {e}\n")
+
+    print(f"Read {stats['read']} events in {stats['seconds']:.1f} seconds ({stats['read'] / max(stats['seconds'], 1e-9):.0f} events/s)")
+    print(f"• stored:       {stats['stored']}")
+    print(f"• filtered out: {stats['filtered_out']}")
+    print(f"• duplicates:   {stats['duplicates']}")
+    print(f"• invalid:      {stats['invalid']}")
+    if not persistent:
+        start_time = time.perf_counter()
+        event_count = store.snapshot(snapshot_path)
+        print(f"Wrote {event_count} events to {snapshot_path} in {time.perf_counter() - start_time:.1f} seconds")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,17 @@
 # Command-Line Interface 
 import logging
+import math
 import time
 
-import html2text
-
-from newsfeed.config.loader import load_sources_config, load_keywords_config
+from newsfeed.config.loader import load_sources_config
+from newsfeed.ingestion.fetch_cache import create_fetch_cache_from_settings
 from newsfeed.ingestion.store import store
-from newsfeed.processing.aggregate import fetch_and_aggregate_events
 from newsfeed.processing.filter import keyword_based_filter
+from newsfeed.processing.scheduler import PollingScheduler
 from newsfeed.utils.logging_config import setup_logging
 
 
-
-
-setup_logging()
 logger = logging.getLogger("newsfeed.cli")
-html_converter = html2text.HTML2Text()
-html_converter.ignore_links = True
 
 
 def display_welcome():
@@ -39,38 +34,55 @@ def display_sources(sources_config):
     print()
 
 
-def fetch_events(sources_config):
+def fetch_events(scheduler, stage_timings):
+    due_sources = [state.name for state in scheduler.due_sources()]
+    print(f"Polling sources: {', '.join(due_sources)}")
     start_time = time.time()
-    all_events = fetch_and_aggregate_events(sources_config)
+    fetched_events = scheduler.poll_due_sources()
+    # Only keep the events which are not in the store yet, so they are filtered only once
+    new_events = store.get_unstored_events(fetched_events)
     end_time = time.time()
+    stage_timings["fetch"] = end_time - start_time
     print(f"Time taken to fetch and aggregate events: {end_time - start_time:.3f} seconds")
-    print(f"Number of events fetched: {len(all_events)}\n")
-    return all_events
+    if scheduler.fetch_cache is not None:
+        print(f"Fetch cache hits: {scheduler.fetch_cache.hits}, misses: {scheduler.fetch_cache.misses}")
+    print(f"Number of new events fetched: {len(new_events)}\n")
+    return new_events
 
 
-def filter_events(all_events, keywords_config):
-    all_keywords = (
-        keywords_config['high_priority_keywords'] +
-        keywords_config['medium_priority_keywords'] +
-        keywords_config['low_priority_keywords']
-    )
+def filter_events(new_events, stage_timings):
+    # The keywords the store ranks events with, so retained events all get a weight and a tier
+    all_keywords = store.ranking_function.keywords
     print("\nFiltering events...")
     start_time = time.time()
-    filtered_events_with_counts = keyword_based_filter(all_events, all_keywords)
+    filtered_events_with_counts = keyword_based_filter(new_events, all_keywords)
     end_time = time.time()
+    stage_timings["filter"] = end_time - start_time
     print(f"Time taken to filter events: {end_time - start_time:.3f} seconds")
-    print(f"Number of retained (filtered) events: ({len(filtered_events_with_counts)}/{len(all_events)})\n")
+    print(f"Number of retained (filtered) events: ({len(filtered_events_with_counts)}/{len(new_events)})\n")
     return filtered_events_with_counts
 
 
-def score_and_retrieve():
-    # Score filtered events
-    print("\nScoring and sorting items from the store and retrieving them...")
+def store_events(filtered_events_with_counts, stage_timings):
+    start_time = time.time()
+    store.add_events(filtered_events_with_counts)
+    end_time = time.time()
+    stage_timings["store"] = end_time - start_time
+
+
+def score_and_retrieve(stage_timings, k=10):
+    # Score filtered events, and only select and sort the top k
+    print(f"\nScoring items from the store and retrieving the top {k}...")
     start_time = time.time()
-    sorted_events_with_score = store.get_sorted_events()
+    top_events_with_score = store.get_top_events(k)
     end_time = time.time()            
-    print(f"Time taken to score and sort filtered events: {end_time - start_time:.3f} seconds\n")
-    return sorted_events_with_score
+    stage_timings["rank"] = end_time - start_time
+    print(f"Time taken to score and rank filtered events: {end_time - start_time:.3f} seconds\n")
+    return top_events_with_score
+
+
+def display_stage_timings(stage_timings):
+    print("Stage timings: " + " | ".join(f"{stage} {seconds:.3f}s" for stage, seconds in stage_timings.items()))
 
 
 def display_top_events(sorted_events_with_score):
@@ -85,12 +97,13 @@ def display_top_events(sorted_events_with_score):
         print(f"Rank {i+1}")
         print(f"• Title: {event.title}")
         print(f"• Source: {event.source}")
+        aliases = store.get_aliases(event.id)
+        if aliases:
+            print(f"• Also reported by: {', '.join(alias['source'] for alias in aliases)}")
         print(f"• Published at: {event.published_at} (hours since published: {event_with_score['age_hours']:.2f})")
-        if event.body:
-            # Display first 200 characters of body 
-            body_text = html_converter.handle(event.body).strip()
-            truncated_body = body_text[:200] + "..." if len(body_text) > 200 else body_text
-            print(f"• Body: {truncated_body}")
+        if event_with_score["body_preview"]:
+            # Display first 200 characters of body (plain text preview extracted at ingest time)
+            print(f"• Body: {event_with_score['body_preview']}")
         else:
             print("• Body: None")
 
@@ -109,7 +122,8 @@ def countdown(remaining_seconds: int):
     Args:
         remaining_seconds (int): Number of seconds to count down from.
     """
-    while remaining_seconds:
+    remaining_seconds = int(remaining_seconds)
+    while remaining_seconds > 0:
         print(f"Refreshing feed in {remaining_seconds} seconds...  (Use Ctrl+c to quit)", end="\r")
         time.sleep(1)
         remaining_seconds -= 1
@@ -117,27 +131,45 @@ def countdown(remaining_seconds: int):
 
 
 def main():
+    setup_logging()
     logger.info('CLI Started')
     display_welcome()
     
     sources_config = load_sources_config()
     display_sources(sources_config)
 
+    # Each source is polled on its own adaptive interval, instead of refetching
+    # every source at a fixed rate. The raw content of the sources can be cached,
+    # or replayed from a recorded session (see NEWSFEED_FETCH_CACHE)
+    fetch_cache = create_fetch_cache_from_settings()
+    if fetch_cache is not None:
+        print(f"Fetch cache: {fetch_cache.mode} ({fetch_cache.directory})\n")
+    scheduler = PollingScheduler(sources_config, fetch_cache=fetch_cache)
 
-
+    displayed_top_ids = None
     while(True):
-        all_events = fetch_events(sources_config)
+        stage_timings = {}
+        new_events = fetch_events(scheduler, stage_timings)
         
-        keywords_config = load_keywords_config()
-        filtered_events_with_counts = filter_events(all_events, keywords_config)
+        filtered_events_with_counts = filter_events(new_events, stage_timings)
         
-        store.add_events(filtered_events_with_counts)
+        store_events(filtered_events_with_counts, stage_timings)
+
+        top_events_with_score = score_and_retrieve(stage_timings)
 
-        sorted_events_with_score = score_and_retrieve()
+        # Only re-render the feed when the top 10 actually changed
+        top_ids = [event_with_score["event"].id for event_with_score in top_events_with_score]
+        start_time = time.time()
+        if top_ids != displayed_top_ids:
+            display_top_events(top_events_with_score)
+            displayed_top_ids = top_ids
+        else:
+            print("Top 10 events unchanged since the last refresh.\n")
+        stage_timings["render"] = time.time() - start_time
 
-        display_top_events(sorted_events_with_score)
+        display_stage_timings(stage_timings)
 
-        countdown(60)
+        countdown(math.ceil(scheduler.seconds_until_next_poll()))
 
 
 if __name__ == "__main__":
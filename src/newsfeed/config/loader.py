@@ -39,4 +39,18 @@ def load_keywords_config() -> dict:
     with config_path.open("r", encoding="utf-8") as f:
         # Parse YAML file content into Python data structures (list/dict)
         # safe_load() prevents execution of arbitrary Python code for security
-        return yaml.safe_load(f) 
\ No newline at end of file
+        return yaml.safe_load(f) 
+
+def load_ranking_config() -> dict:
+    """
+    Load the ranking function configuration from the YAML configuration file.
+
+    Returns:
+        dict: A dictionary containing:
+              - tier_weights: Weight of the keywords of each priority tier (high, medium, low)
+              - location_weights: Multiplier of the keywords found in the title and in the body
+              - decay: Name of the recency decay function and its parameters
+    """
+    config_path = importlib.resources.files("newsfeed.config").joinpath("ranking_config.yaml")
+    with config_path.open("r", encoding="utf-8") as f:
+        return yaml.safe_load(f)
@@ -0,0 +1,83 @@
+"""
+Runtime settings of the newsfeed application.
+
+Settings are read from environment variables prefixed with NEWSFEED_ (e.g.
+NEWSFEED_BODY_STORAGE=disk), which can also be defined in the .env file of
+the project root (loaded when the first setting is read; the variables of the
+environment take precedence).
+Unlike the YAML configuration files, these settings control how the
+application runs rather than what content it collects.
+"""
+
+import os
+from pathlib import Path
+
+# Assume this file lives in project-root/src/newsfeed/config/
+PROJECT_ROOT = Path(__file__).resolve().parents[3]
+
+# Default location of the files written by the application (blobs, snapshots, ...)
+DATA_DIR = PROJECT_ROOT / "data"
+
+ENV_PREFIX = "NEWSFEED_"
+
+DOTENV_PATH = PROJECT_ROOT / ".env"
+
+# Whether the .env file was loaded into the environment (once, by the first setting read)
+dotenv_loaded = False
+
+
+def load_dotenv_once():
+    """
+    Load the variables of the .env file into the environment, unless they are already set.
+    """
+    global dotenv_loaded
+    if not dotenv_loaded:
+        from dotenv import load_dotenv
+
+        load_dotenv(DOTENV_PATH)
+        dotenv_loaded = True
+
+
+def get_setting(name: str, default: str | None = None) -> str | None:
+    """
+    Return the value of the NEWSFEED_<name> environment variable (or .env entry), or default if it is not set.
+    """
+    load_dotenv_once()
+    return os.getenv(ENV_PREFIX + name, default)
+
+
+def get_bool_setting(name: str, default: bool = False) -> bool:
+    """
+    Return a boolean setting. "1", "true", "yes" and "on" (case-insensitive) are true.
+    """
+    value = get_setting(name)
+    if value is None:
+        return default
+    return value.strip().lower() in {"1", "true", "yes", "on"}
+
+
+def get_int_setting(name: str, default: int) -> int:
+    """
+    Return an integer setting.
+    """
+    value = get_setting(name)
+    return default if value is None else int(value)
+
+
+def get_float_setting(name: str, default: float) -> float:
+    """
+    Return a float setting.
+    """
+    value = get_setting(name)
+    return default if value is None else float(value)
+
+
+def get_path_setting(name: str, default: Path) -> Path:
+    """
+    Return a path setting (relative paths are resolved from the project root).
+    """
+    value = get_setting(name)
+    if value is None:
+        return default
+    path = Path(value)
+    return path if path.is_absolute() else PROJECT_ROOT / path
@@ -0,0 +1,101 @@
+"""
+Storage strategies for the full text of event bodies.
+
+Ranking only needs the keyword counts of an event, and the CLI only displays a
+short plain text preview, so the full body (often a whole HTML article) does not
+need to stay in memory as a Python string. Depending on the chosen strategy, the
+store keeps the body as is, keeps a zlib-compressed copy, or spills it to disk,
+and loads the full text back only when an API client asks for it.
+"""
+
+import hashlib
+import os
+import shutil
+import zlib
+from pathlib import Path
+
+BODY_STORAGE_MEMORY = "memory"
+BODY_STORAGE_COMPRESSED = "compressed"
+BODY_STORAGE_DISK = "disk"
+
+
+class InMemoryBodyStorage:
+    """Keep full bodies in memory, unchanged (the default)."""
+    name = BODY_STORAGE_MEMORY
+
+    def put(self, event_id: str, body: str) -> str:
+        return body
+
+    def get(self, handle: str) -> str:
+        return handle
+
+    def clear(self):
+        pass
+
+
+class CompressedBodyStorage:
+    """Keep full bodies in memory, compressed with zlib."""
+    name = BODY_STORAGE_COMPRESSED
+
+    def __init__(self, level: int = 6):
+        self.level = level
+
+    def put(self, event_id: str, body: str) -> bytes:
+        return zlib.compress(body.encode("utf-8"), self.level)
+
+    def get(self, handle: bytes) -> str:
+        return zlib.decompress(handle).decode("utf-8")
+
+    def clear(self):
+        pass
+
+
+class DiskBodyStorage:
+    """
+    Spill full bodies to a directory of compressed blob files, one per event.
+
+    Blobs are named after the SHA-256 of the event id (ids can contain any character)
+    and spread over 256 subdirectories to keep directories small.
+    """
+    name = BODY_STORAGE_DISK
+
+    def __init__(self, directory: Path, level: int = 6):
+        self.directory = Path(directory)
+        self.level = level
+
+    def put(self, event_id: str, body: str) -> str:
+        key = hashlib.sha256(event_id.encode("utf-8")).hexdigest()
+        blob_path = self._blob_path(key)
+        blob_path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first, so readers never see a partially written blob
+        tmp_path = blob_path.with_suffix(".tmp")
+        tmp_path.write_bytes(zlib.compress(body.encode("utf-8"), self.level))
+        os.replace(tmp_path, blob_path)
+        return key
+
+    def get(self, handle: str) -> str:
+        return zlib.decompress(self._blob_path(handle).read_bytes()).decode("utf-8")
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _blob_path(self, key: str) -> Path:
+        return self.directory / key[:2] / key
+
+
+def create_body_storage(name: str, blob_dir: Path | None = None):
+    """
+    Create a body storage strategy from its name ("memory", "compressed" or "disk").
+
+    Raises:
+        ValueError: If the name is unknown, or blob_dir is missing for disk storage.
+    """
+    if name == BODY_STORAGE_MEMORY:
+        return InMemoryBodyStorage()
+    if name == BODY_STORAGE_COMPRESSED:
+        return CompressedBodyStorage()
+    if name == BODY_STORAGE_DISK:
+        if blob_dir is None:
+            raise ValueError("A blob directory is required to store bodies on disk.")
+        return DiskBodyStorage(blob_dir)
+    raise ValueError(f"Unknown body storage: {name}")
@@ -0,0 +1,564 @@
+import array
+import bisect
+import heapq
+import logging
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from newsfeed.ingestion.event import Event
+from newsfeed.ingestion.snapshot import NAIVE_OFFSET, gc_paused, read_snapshot, write_snapshot
+from newsfeed.processing.keywords import EMPTY_KEYWORD_COUNTS, PAIR_TYPECODE, KeywordCounts, vocabulary
+from newsfeed.processing.ranking import RankingFunction
+from newsfeed.processing.score import KEYWORD_TIERS
+from newsfeed.utils.helpers import convert_dt_to_us
+from newsfeed.utils.locks import TimedLock
+from newsfeed.utils.profiling import span
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime(1970, 1, 1)
+EPOCH_UTC = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# Minimum number of recently added rows kept unsorted by the time index before they are merged
+MIN_TIME_INDEX_TAIL = 1024
+
+
+def decode_datetime(us: int, utc_offset: int) -> datetime:
+    """
+    Rebuild a datetime from its microseconds since the epoch and UTC offset in seconds
+    (NAIVE_OFFSET for naive datetimes), as encoded in snapshots.
+    """
+    if utc_offset == NAIVE_OFFSET:
+        return EPOCH + timedelta(microseconds=us)
+    if utc_offset == 0:
+        return EPOCH_UTC + timedelta(microseconds=us)
+    return (EPOCH + timedelta(microseconds=us, seconds=utc_offset)).replace(tzinfo=timezone(timedelta(seconds=utc_offset)))
+
+
+class StringArena:
+    """
+    Append-only column of strings: their UTF-8 bytes concatenated in a single buffer,
+    with the end offset of each string, instead of one Python object per string.
+    """
+    def __init__(self):
+        self.data = bytearray()
+        self.offsets = array.array("Q", [0])
+        self.null_mask = bytearray()
+
+    def __len__(self) -> int:
+        return len(self.null_mask)
+
+    def append(self, value: str | None):
+        if value is not None:
+            self.data += value.encode("utf-8")
+        self.offsets.append(len(self.data))
+        self.null_mask.append(value is None)
+
+    def __getitem__(self, index: int) -> str | None:
+        if self.null_mask[index]:
+            return None
+        return self.data[self.offsets[index]:self.offsets[index + 1]].decode("utf-8")
+
+    def take(self, indexes) -> list[str | None]:
+        """Return the strings at the given indexes (decoded in a single pass)."""
+        data, offsets, null_mask = self.data, self.offsets, self.null_mask
+        return [None if null_mask[i] else data[offsets[i]:offsets[i + 1]].decode("utf-8") for i in indexes]
+
+    def clear(self):
+        self.data.clear()
+        del self.offsets[1:]
+        self.null_mask.clear()
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.data) + self.offsets.itemsize * len(self.offsets) + len(self.null_mask)
+
+
+class SparseCounts:
+    """
+    Append-only column of keyword counts: the packed (keyword id, count) pairs of the
+    KeywordCounts of all the rows are concatenated, with the end offset of each row.
+    """
+    def __init__(self):
+        self.offsets = array.array("Q", [0])
+        self.data = bytearray()
+
+    def append(self, counts: KeywordCounts):
+        self.data += counts.data
+        self.offsets.append(len(self.data))
+
+    def row_has_keyword(self, row: int, keyword_id: int) -> bool:
+        """Return True if the keyword is counted in the row, scanning its pairs in place (without copying them)."""
+        # The temporary views are released right away, so the data can still grow
+        return keyword_id in memoryview(self.data)[self.offsets[row]:self.offsets[row + 1]].cast(PAIR_TYPECODE)[::2]
+
+    def __getitem__(self, row: int) -> KeywordCounts:
+        start, end = self.offsets[row], self.offsets[row + 1]
+        return KeywordCounts(bytes(self.data[start:end])) if end > start else EMPTY_KEYWORD_COUNTS
+
+    def clear(self):
+        del self.offsets[1:]
+        del self.data[:]
+
+    @property
+    def nbytes(self) -> int:
+        return self.offsets.itemsize * len(self.offsets) + len(self.data)
+
+
+class TimeIndex:
+    """
+    Rows sorted by publication time, for time range queries.
+
+    Rows are added to a small unsorted tail, which is merged into the sorted rows once it
+    grows past an eighth of them, so adding rows costs O(log n) amortized (and O(1) when
+    events arrive in publication order) rather than an O(n) insertion per row.
+    """
+    def __init__(self, published_us: array.array):
+        self.published_us = published_us
+        self.sorted_rows = array.array("I")
+        self.tail = array.array("I")
+
+    def add(self, row: int):
+        self.tail.append(row)
+        if len(self.tail) > max(MIN_TIME_INDEX_TAIL, len(self.sorted_rows) // 8):
+            self._merge_tail()
+
+    def _merge_tail(self):
+        key = self.published_us.__getitem__
+        tail = sorted(self.tail, key=key)
+        if not self.sorted_rows or key(tail[0]) >= key(self.sorted_rows[-1]):
+            self.sorted_rows.extend(tail)
+        else:
+            self.sorted_rows = array.array("I", heapq.merge(self.sorted_rows, tail, key=key))
+        del self.tail[:]
+
+    def range(self, since_us: int | None, until_us: int | None) -> list[int]:
+        """Return the rows published in [since_us, until_us) (None: unbounded)."""
+        key = self.published_us.__getitem__
+        start = 0 if since_us is None else bisect.bisect_left(self.sorted_rows, since_us, key=key)
+        end = len(self.sorted_rows) if until_us is None else bisect.bisect_left(self.sorted_rows, until_us, key=key)
+        rows = self.sorted_rows[start:end].tolist()
+        published_us = self.published_us
+        rows.extend(row for row in self.tail
+                    if (since_us is None or since_us <= published_us[row]) and (until_us is None or published_us[row] < until_us))
+        return rows
+
+    def count(self, since_us: int | None, until_us: int | None) -> int:
+        """Return an upper bound of the number of rows published in [since_us, until_us)."""
+        key = self.published_us.__getitem__
+        start = 0 if since_us is None else bisect.bisect_left(self.sorted_rows, since_us, key=key)
+        end = len(self.sorted_rows) if until_us is None else bisect.bisect_left(self.sorted_rows, until_us, key=key)
+        return end - start + len(self.tail)
+
+    def clear(self):
+        del self.sorted_rows[:]
+        del self.tail[:]
+
+
+class ColumnarEventStore:
+    """
+    In-memory event store keeping the events in columns, with the same interface as EventStore.
+
+    Each event is a row: ids, titles, bodies and body previews are kept in append-only
+    string arenas, and sources, publication times, importance scores and keyword counts
+    in typed arrays, instead of an Event object and two dicts per event. A hash index
+    maps event ids to rows, and the keyword, tier and source posting lists are arrays of
+    rows. Selecting, scoring and taking the top k then run over whole columns, and Event
+    objects are only built for the returned events, so memory stays predictable with
+    millions of events.
+
+    Near-duplicate detection and alternative body storage are not supported by this store.
+    """
+    def __init__(self, ranking_function: RankingFunction | None = None):
+        """
+        Args:
+            ranking_function (RankingFunction, optional): How events are ranked. Defaults to
+                the ranking function of the configuration files.
+        """
+        # Instrumented lock: its contention is reported by the /stats endpoint
+        self.store_lock = TimedLock("store")
+        self.ranking_function = ranking_function or RankingFunction.from_config()
+        # event id -> row
+        self.row_of = {}
+        self.ids = StringArena()
+        self.titles = StringArena()
+        self.bodies = StringArena()
+        self.body_previews = StringArena()
+        # Sources are interned: source id of each row, source -> source id, and source id -> source
+        self.source_ids = array.array("I")
+        self.source_id_of = {}
+        self.sources = []
+        # Publication time of each row, in microseconds since the epoch, and its UTC offset
+        # in seconds (NAIVE_OFFSET for naive datetimes), to rebuild the original datetime
+        self.published_us = array.array("q")
+        self.utc_offsets = array.array("i")
+        self.importance_scores = array.array("d")
+        # Keyword counts, by keyword id of the process vocabulary (see keywords.py)
+        self.title_counts = SparseCounts()
+        self.body_counts = SparseCounts()
+        # tier -> number of distinct keywords of this tier in the title or body of each row
+        self.tier_keyword_counts = {tier: array.array("H") for tier in KEYWORD_TIERS}
+        # Posting lists (rows in ascending order): keyword id -> rows with this keyword
+        # in their title or body, tier -> rows with a keyword of this tier, source id -> rows
+        self.keyword_rows = {}
+        self.tier_rows = {tier: array.array("I") for tier in KEYWORD_TIERS}
+        self.source_rows = []
+        self.time_index = TimeIndex(self.published_us)
+
+    def add_events(self, filtered_events_with_counts: list[dict]):
+        """
+        Add filtered events. Existing ones with same ID will be ingored.
+        """
+        with self.store_lock, span("index"):
+            for filtered_event_with_counts in filtered_events_with_counts:
+                if not self.is_valid_filtered_event_with_counts(filtered_event_with_counts):
+                    raise ValueError(
+                        f"Tried to add an invalid format to the store."
+                    )
+                if filtered_event_with_counts['event'].id in self.row_of:
+                    logger.warning(f"Duplicate event id detected. The duplicate item will be ignored. {filtered_event_with_counts['event'].id}")
+                    continue
+                self._append_row(filtered_event_with_counts)
+
+    def _append_row(self, filtered_event_with_counts: dict):
+        """
+        Append an event to the columns and indexes. The caller must hold the store lock.
+        """
+        event = filtered_event_with_counts['event']
+        row = len(self.ids)
+        self.row_of[event.id] = row
+        self.ids.append(event.id)
+        self.titles.append(event.title)
+        self.bodies.append(event.body)
+        self.body_previews.append(filtered_event_with_counts.get('body_preview'))
+
+        source_id = self.source_id_of.get(event.source)
+        if source_id is None:
+            source_id = self.source_id_of[event.source] = len(self.sources)
+            self.sources.append(event.source)
+            self.source_rows.append(array.array("I"))
+        self.source_ids.append(source_id)
+        self.source_rows[source_id].append(row)
+
+        offset = event.published_at.utcoffset()
+        self.published_us.append(convert_dt_to_us(event.published_at))
+        self.utc_offsets.append(NAIVE_OFFSET if offset is None else int(offset.total_seconds()))
+        self.time_index.add(row)
+        self.importance_scores.append(self.ranking_function.importance(filtered_event_with_counts))
+
+        title_counts = KeywordCounts.from_counts(filtered_event_with_counts['kw_counts_in_title'])
+        body_counts = KeywordCounts.from_counts(filtered_event_with_counts['kw_counts_in_body'])
+        self.title_counts.append(title_counts)
+        self.body_counts.append(body_counts)
+
+        keyword_tiers = self.ranking_function.keyword_tiers
+        keywords = vocabulary.keywords
+        tier_counts = dict.fromkeys(KEYWORD_TIERS, 0)
+        for keyword_id in set(title_counts.keyword_ids()).union(body_counts.keyword_ids()):
+            rows = self.keyword_rows.get(keyword_id)
+            if rows is None:
+                rows = self.keyword_rows[keyword_id] = array.array("I")
+            rows.append(row)
+            tier = keyword_tiers.get(keywords[keyword_id])
+            if tier is not None:
+                tier_counts[tier] += 1
+        for tier, count in tier_counts.items():
+            self.tier_keyword_counts[tier].append(count)
+            if count:
+                self.tier_rows[tier].append(row)
+
+    def get_sorted_events(self, keywords: list[str] | None = None, tier: str | None = None,
+                          sources: list[str] | None = None, since: datetime | None = None,
+                          until: datetime | None = None, now: datetime | None = None) -> list[dict]:
+        """
+        Retrieve all filtered events from the store, scored and sorted (see EventStore.get_sorted_events).
+        """
+        with self.store_lock:
+            with span("select"):
+                rows = self._select_rows(keywords, tier, sources, since, until)
+            with span("scoring"):
+                rows, importance_scores, recency_scores, ages_hours, total_scores = self._score_rows(rows, now)
+            with span("sort"):
+                ids = self.ids
+                row_ids = [ids[row] for row in rows]
+                positions = sorted(range(len(rows)), key=lambda i: (-total_scores[i], row_ids[i]))
+            return self._records(positions, rows, row_ids, total_scores, importance_scores, recency_scores, ages_hours)
+
+    def iter_sorted_events(self, chunk_size: int, keywords: list[str] | None = None, tier: str | None = None,
+                           sources: list[str] | None = None, since: datetime | None = None,
+                           until: datetime | None = None, now: datetime | None = None):
+        """
+        Yield the events of get_sorted_events(...) with the same criteria, in chunks
+        (see EventStore.iter_sorted_events).
+
+        The rows are sorted on the score columns, and the Events of a chunk (with their
+        bodies) are only rebuilt when the chunk is requested.
+        """
+        with self.store_lock:
+            with span("select"):
+                rows = self._select_rows(keywords, tier, sources, since, until)
+            with span("scoring"):
+                rows, importance_scores, recency_scores, ages_hours, total_scores = self._score_rows(rows, now)
+            with span("sort"):
+                ids = self.ids
+                row_ids = [ids[row] for row in rows]
+                positions = sorted(range(len(rows)), key=lambda i: (-total_scores[i], row_ids[i]))
+                row_count = len(ids)
+
+        for start in range(0, len(positions), chunk_size):
+            with self.store_lock:
+                if len(self.ids) < row_count:
+                    return # the store was cleared
+                events_with_score = self._records(positions[start:start + chunk_size], rows, row_ids, total_scores,
+                                                  importance_scores, recency_scores, ages_hours)
+            yield events_with_score
+
+    def get_top_events(self, k: int, keywords: list[str] | None = None, tier: str | None = None,
+                       sources: list[str] | None = None, since: datetime | None = None,
+                       until: datetime | None = None, now: datetime | None = None) -> list[dict]:
+        """
+        Retrieve the k best ranked events from the store, scored and sorted (see EventStore.get_top_events).
+
+        The top k rows are selected on the total score column alone, and the event ids are
+        only decoded to break the ties at the boundary of the top k.
+        """
+        with self.store_lock:
+            with span("select"):
+                rows = self._select_rows(keywords, tier, sources, since, until)
+            with span("scoring"):
+                rows, importance_scores, recency_scores, ages_hours, total_scores = self._score_rows(rows, now)
+            with span("sort"):
+                positions = heapq.nlargest(k, range(len(rows)), key=total_scores.__getitem__)
+                if positions and len(rows) > k:
+                    # Events with the same score as the last one are ranked by id: pick the right ones
+                    threshold = total_scores[positions[-1]]
+                    positions = [i for i in positions if total_scores[i] > threshold]
+                    positions += [i for i, total_score in enumerate(total_scores) if total_score == threshold]
+                ids = self.ids
+                row_ids = {i: ids[rows[i]] for i in positions}
+                positions = sorted(positions, key=lambda i: (-total_scores[i], row_ids[i]))[:k]
+            return self._records(positions, rows, row_ids, total_scores, importance_scores, recency_scores, ages_hours)
+
+    def _select_rows(self, keywords: list[str] | None, tier: str | None, sources: list[str] | None,
+                     since: datetime | None, until: datetime | None) -> list[int] | None:
+        """
+        Return the rows matching all the given criteria, or None if there are no criteria (all rows).
+
+        Like EventStore._select_records, the smallest candidate set (a posting list or the
+        time range) is scanned, and each candidate is checked against the other criteria,
+        here by looking up its values in the columns. The caller must hold the store lock.
+        """
+        keyword_ids = []
+        for keyword in keywords or []:
+            keyword_id = vocabulary.ids.get(keyword.lower())
+            if keyword_id not in self.keyword_rows:
+                return []
+            keyword_ids.append(keyword_id)
+        source_ids = {self.source_id_of[source] for source in sources or [] if source in self.source_id_of}
+        if sources and not source_ids:
+            return []
+        since_us = convert_dt_to_us(since) if since is not None else None
+        until_us = convert_dt_to_us(until) if until is not None else None
+        has_time_range = since is not None or until is not None
+        if not keyword_ids and tier is None and not sources and not has_time_range:
+            return None
+
+        # (number of candidate rows, function returning the candidate rows, check of a row)
+        criteria = []
+        for keyword_id in keyword_ids:
+            rows = self.keyword_rows[keyword_id]
+            criteria.append((len(rows), lambda rows=rows: rows, self._keyword_check(keyword_id)))
+        if tier is not None:
+            if tier not in self.tier_rows:
+                return []
+            rows = self.tier_rows[tier]
+            criteria.append((len(rows), lambda rows=rows: rows, self.tier_keyword_counts[tier].__getitem__))
+        if sources:
+            source_rows = [self.source_rows[source_id] for source_id in source_ids]
+            column = self.source_ids
+            criteria.append((sum(map(len, source_rows)), lambda: heapq.merge(*source_rows),
+                             lambda row: column[row] in source_ids))
+        if has_time_range:
+            published_us = self.published_us
+            criteria.append((self.time_index.count(since_us, until_us),
+                             lambda: self.time_index.range(since_us, until_us),
+                             lambda row: (since_us is None or since_us <= published_us[row])
+                                         and (until_us is None or published_us[row] < until_us)))
+
+        smallest = min(criteria, key=lambda criterion: criterion[0])
+        checks = [criterion[2] for criterion in criteria if criterion is not smallest]
+        return [row for row in smallest[1]() if all(check(row) for check in checks)]
+
+    def _keyword_check(self, keyword_id: int):
+        title_counts, body_counts = self.title_counts, self.body_counts
+        return lambda row: title_counts.row_has_keyword(row, keyword_id) or body_counts.row_has_keyword(row, keyword_id)
+
+    def _score_rows(self, rows: list[int] | None, now: datetime | None):
+        """
+        Score rows (all rows if None) from the importance score and publication time columns.
+        The caller must hold the store lock.
+
+        Returns:
+            tuple: The rows, and their importance scores, recency scores, ages and total scores.
+        """
+        if rows is None:
+            rows = range(len(self.ids))
+            importance_scores = self.importance_scores
+            published_us = self.published_us
+        else:
+            importance_scores = [self.importance_scores[row] for row in rows]
+            published_us = [self.published_us[row] for row in rows]
+        ages_hours, recency_scores = self.ranking_function.recency(published_us, now)
+        total_scores = [importance_score * recency_score
+                        for importance_score, recency_score in zip(importance_scores, recency_scores)]
+        return rows, importance_scores, recency_scores, ages_hours, total_scores
+
+    def _records(self, positions: list[int], rows, row_ids, total_scores, importance_scores,
+                 recency_scores, ages_hours) -> list[dict]:
+        """
+        Build the scored records (see score_events) of the scored rows at the given positions,
+        decoding each column in a single pass. The caller must hold the store lock.
+        """
+        selected_rows = [rows[i] for i in positions]
+        events = self._events(selected_rows, [row_ids[i] for i in positions])
+        title_counts, body_counts = self.title_counts, self.body_counts
+        return [
+            {
+                "event": event,
+                "total_score": total_scores[i],
+                "importance_score": importance_scores[i],
+                "recency_score": recency_scores[i],
+                "age_hours": ages_hours[i],
+                "kw_counts_in_title": title_counts[row],
+                "kw_counts_in_body": body_counts[row],
+                "body_preview": body_preview,
+            }
+            for i, row, event, body_preview in zip(positions, selected_rows, events, self.body_previews.take(selected_rows))
+        ]
+
+    def _events(self, rows, event_ids: list[str] | None = None) -> list[Event]:
+        """
+        Rebuild the Events of rows (their ids can be given when already decoded). The caller must hold the store lock.
+        """
+        if event_ids is None:
+            event_ids = self.ids.take(rows)
+        sources, source_ids, published_us, utc_offsets = self.sources, self.source_ids, self.published_us, self.utc_offsets
+        return list(map(Event, event_ids, [sources[source_ids[row]] for row in rows], self.titles.take(rows),
+                        [decode_datetime(published_us[row], utc_offsets[row]) for row in rows], self.bodies.take(rows)))
+
+    def _filtered_events_with_counts(self) -> list[dict]:
+        """
+        Rebuild the filtered records of all the rows, as added to the store. The caller must hold the store lock.
+        """
+        rows = range(len(self.ids))
+        title_counts, body_counts = self.title_counts, self.body_counts
+        return [
+            {
+                "event": event,
+                "kw_counts_in_title": title_counts[row],
+                "kw_counts_in_body": body_counts[row],
+                "body_preview": body_preview,
+            }
+            for row, event, body_preview in zip(rows, self._events(rows), self.body_previews.take(rows))
+        ]
+
+    def get_full_events(self, events: list[Event]) -> list[Event]:
+        """
+        Return the given stored events with their full body (bodies are always kept in this store).
+        """
+        return list(events)
+
+    def get_aliases(self, event_id: str) -> list[dict]:
+        """
+        Near-duplicates are not collapsed by this store, so events have no aliases.
+        """
+        return []
+
+    def snapshot(self, path: Path) -> int:
+        """
+        Write a point-in-time snapshot of the stored events to a file (see EventStore.snapshot).
+
+        Returns:
+            int: The number of events in the snapshot.
+        """
+        with self.store_lock:
+            filtered_events_with_counts = self._filtered_events_with_counts()
+        write_snapshot(path, filtered_events_with_counts, {})
+        return len(filtered_events_with_counts)
+
+    def restore(self, path: Path) -> int:
+        """
+        Add the events of a snapshot file to the store (see EventStore.restore). Aliases are ignored.
+
+        Returns:
+            int: The number of restored events.
+        """
+        restored_count = 0
+        with gc_paused():
+            filtered_events_with_counts, _ = read_snapshot(path)
+            with self.store_lock:
+                for filtered_event_with_counts in filtered_events_with_counts:
+                    if filtered_event_with_counts['event'].id not in self.row_of:
+                        self._append_row(filtered_event_with_counts)
+                        restored_count += 1
+        return restored_count
+
+    def clear(self):
+        """
+        Clear stored events (e.g., for testing or reset).
+        """
+        with self.store_lock:
+            self.row_of.clear()
+            for arena in (self.ids, self.titles, self.bodies, self.body_previews):
+                arena.clear()
+            for column in (self.source_ids, self.published_us, self.utc_offsets, self.importance_scores,
+                           *self.tier_keyword_counts.values(), *self.tier_rows.values()):
+                del column[:]
+            self.source_id_of.clear()
+            self.sources.clear()
+            self.source_rows.clear()
+            self.keyword_rows.clear()
+            self.title_counts.clear()
+            self.body_counts.clear()
+            self.time_index.clear()
+
+    def has_event(self, event_id: str) -> bool:
+        """
+        Check if there exists an event with this event it in the store.
+        """
+        with self.store_lock:
+            return event_id in self.row_of
+
+    def get_unstored_events(self, events: list[Event]) -> list[Event]:
+        """
+        Return the events whose id is not in the store yet (checked under a single lock acquisition).
+        """
+        with self.store_lock:
+            return [event for event in events if event.id not in self.row_of]
+
+    def get_event_count(self) -> int:
+        """
+        Return the number of stored events.
+        """
+        with self.store_lock:
+            return len(self.row_of)
+
+    def get_column_bytes(self) -> int:
+        """
+        Return the number of bytes used by the columns (arenas and arrays, not the id -> row index).
+        """
+        with self.store_lock:
+            arrays = [self.source_ids, self.published_us, self.utc_offsets, self.importance_scores,
+                      *self.tier_keyword_counts.values(), *self.tier_rows.values(), *self.keyword_rows.values(),
+                      *self.source_rows, self.time_index.sorted_rows, self.time_index.tail]
+            return (sum(arena.nbytes for arena in (self.ids, self.titles, self.bodies, self.body_previews))
+                    + self.title_counts.nbytes + self.body_counts.nbytes
+                    + sum(column.itemsize * len(column) for column in arrays))
+
+    def is_valid_filtered_event_with_counts(self, item: dict) -> bool:
+        """
+        Helper function to ensure we add the correct data type to the store
+        """
+        required_keys = {"event", "kw_counts_in_title", "kw_counts_in_body"}
+        optional_keys = {"body_preview"}
+        return required_keys <= set(item.keys()) <= required_keys | optional_keys
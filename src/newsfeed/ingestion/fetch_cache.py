@@ -0,0 +1,263 @@
+"""
+Cache of the raw content fetched from the sources.
+
+Fetching a source downloads its raw content (the XML of a RSS feed, the posts of
+a subreddit), which is then parsed into events. With a fetch cache, the content
+downloaded for a source is kept on disk, and fetching the same source again
+within the TTL reuses it instead of downloading it again.
+
+The cache is content-addressed: each distinct content is written once, to a blob
+file named after its SHA-256, and the entry of a source (named after the hash of
+its configuration) references the blob of its last download and its download
+time. When the blobs exceed the maximum size, the least recently used ones are
+evicted (their modification time is updated when they are read).
+
+The fetches can also be recorded in a session (the ordered list of the blobs
+returned for each source), and replayed offline: each fetch of a source then
+returns its next recorded content (and its last one once they are exhausted),
+without ever going to the network, so the whole pipeline can be benchmarked
+deterministically. The blobs of recorded sessions are never evicted.
+
+The cache is configured with NEWSFEED_FETCH_CACHE:
+    - off (default): always download
+    - on: reuse the content downloaded within the TTL
+    - record: like on, and record the content returned by each fetch in the session
+    - replay: only return the content recorded in the session
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import defaultdict, deque
+from pathlib import Path
+
+from newsfeed.config.settings import DATA_DIR, get_float_setting, get_int_setting, get_path_setting, get_setting
+
+logger = logging.getLogger(__name__)
+
+FETCH_CACHE_OFF = "off"
+FETCH_CACHE_ON = "on"
+FETCH_CACHE_RECORD = "record"
+FETCH_CACHE_REPLAY = "replay"
+
+DEFAULT_TTL = 300
+DEFAULT_MAX_MB = 100
+DEFAULT_SESSION = "default"
+
+
+class FetchCacheMiss(LookupError):
+    """Raised when replaying a session which did not record a fetch of the source."""
+
+
+def request_key(source_config: dict) -> str:
+    """Return the cache key of a source: its configuration, as canonical JSON."""
+    return json.dumps(source_config, sort_keys=True)
+
+
+class FetchCache:
+    """
+    On-disk cache of the raw content of source fetches (see the module docstring).
+    """
+    def __init__(self, directory: Path, ttl: float = DEFAULT_TTL, max_bytes: int = DEFAULT_MAX_MB * 10**6,
+                 mode: str = FETCH_CACHE_ON, session: str = DEFAULT_SESSION, clock=time.time):
+        """
+        Args:
+            directory (Path): The directory of the cache.
+            ttl (float): Seconds during which a downloaded content is reused.
+            max_bytes (int): Size of the blobs above which the least recently used ones are evicted.
+            mode (str): FETCH_CACHE_ON, FETCH_CACHE_RECORD or FETCH_CACHE_REPLAY.
+            session (str): The name of the session recorded or replayed.
+            clock (callable): Returns the current time, in seconds since the epoch.
+
+        Raises:
+            ValueError: If the mode is unknown.
+        """
+        if mode not in {FETCH_CACHE_ON, FETCH_CACHE_RECORD, FETCH_CACHE_REPLAY}:
+            raise ValueError(f"Unknown fetch cache mode: {mode}. "
+                             f"Available: {FETCH_CACHE_OFF}, {FETCH_CACHE_ON}, {FETCH_CACHE_RECORD}, {FETCH_CACHE_REPLAY}")
+        self.directory = Path(directory)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.mode = mode
+        self.session_path = self.directory / "sessions" / f"{session}.jsonl"
+        self.clock = clock
+        # Sources are fetched concurrently by the scheduler
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # Request key -> blobs left to replay, loaded from the session on first replay
+        self.replay_queues = None
+        if mode == FETCH_CACHE_RECORD:
+            # Record a new session
+            self.session_path.parent.mkdir(parents=True, exist_ok=True)
+            self.session_path.write_text("", encoding="utf-8")
+
+    def fetch(self, source_config: dict, download) -> bytes:
+        """
+        Return the raw content of a source, from the cache if possible.
+
+        Args:
+            source_config (dict): The configuration of the source.
+            download (callable): Downloads the raw content of the source (when it is not cached).
+
+        Returns:
+            bytes: The raw content of the source.
+
+        Raises:
+            FetchCacheMiss: In replay mode, if the session has no recorded fetch of the source.
+        """
+        key = request_key(source_config)
+        if self.mode == FETCH_CACHE_REPLAY:
+            return self.replay(key)
+        content = self.get(key)
+        if content is None:
+            content = download()
+            self.put(key, content)
+        if self.mode == FETCH_CACHE_RECORD:
+            self.record(key, content)
+        return content
+
+    def get(self, key: str) -> bytes | None:
+        """Return the content cached for a request key, or None if there is none within the TTL."""
+        with self.lock:
+            entry = self._read_entry(key)
+            content = None
+            if entry is not None and self.clock() - entry["fetched_at"] < self.ttl:
+                content = self._read_blob(entry["blob"])
+            if content is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return content
+
+    def put(self, key: str, content: bytes) -> str:
+        """
+        Cache the content downloaded for a request key, evicting the least recently used blobs if needed.
+
+        Returns:
+            str: The SHA-256 of the content, which names its blob.
+        """
+        digest = hashlib.sha256(content).hexdigest()
+        with self.lock:
+            blob_path = self._blob_path(digest)
+            if not blob_path.exists():
+                self._write_file(blob_path, content)
+            self._touch(blob_path)
+            entry = {"key": key, "blob": digest, "fetched_at": self.clock()}
+            self._write_file(self._entry_path(key), json.dumps(entry).encode("utf-8"))
+            self._evict()
+        return digest
+
+    def record(self, key: str, content: bytes):
+        """Append the content returned for a request key to the recorded session."""
+        digest = hashlib.sha256(content).hexdigest()
+        with self.lock:
+            with open(self.session_path, "a", encoding="utf-8") as session_file:
+                session_file.write(json.dumps({"key": key, "blob": digest}) + "\n")
+
+    def replay(self, key: str) -> bytes:
+        """Return the next content recorded for a request key (the last one once they are all replayed)."""
+        with self.lock:
+            if self.replay_queues is None:
+                self.replay_queues = self._read_session()
+            queue = self.replay_queues.get(key)
+            if not queue:
+                raise FetchCacheMiss(f"No fetch of {key} recorded in {self.session_path}")
+            digest = queue.popleft() if len(queue) > 1 else queue[0]
+            content = self._read_blob(digest)
+            if content is None:
+                raise FetchCacheMiss(f"Blob {digest} of the session {self.session_path} is missing")
+            self.hits += 1
+            return content
+
+    def clear(self):
+        """Remove the cache directory (blobs, entries and sessions)."""
+        with self.lock:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.replay_queues = None
+
+    def _read_session(self) -> dict[str, deque]:
+        queues = defaultdict(deque)
+        if self.session_path.exists():
+            for line in self.session_path.read_text(encoding="utf-8").splitlines():
+                fetch = json.loads(line)
+                queues[fetch["key"]].append(fetch["blob"])
+        return queues
+
+    def _evict(self):
+        """Remove the least recently used blobs until they fit in max_bytes. The caller must hold the lock."""
+        blobs = [(path.stat(), path) for path in self.directory.glob("blobs/*/*") if path.suffix != ".tmp"]
+        total_bytes = sum(stat.st_size for stat, _ in blobs)
+        if total_bytes <= self.max_bytes:
+            return
+        pinned = set()
+        for session_path in self.directory.glob("sessions/*.jsonl"):
+            pinned.update(json.loads(line)["blob"] for line in session_path.read_text(encoding="utf-8").splitlines())
+        for stat, path in sorted(blobs, key=lambda blob: blob[0].st_mtime):
+            if total_bytes <= self.max_bytes:
+                break
+            if path.name in pinned:
+                continue
+            path.unlink(missing_ok=True)
+            total_bytes -= stat.st_size
+            logger.info(f"Evicted fetch cache blob {path.name} ({stat.st_size} bytes)")
+
+    def _read_entry(self, key: str) -> dict | None:
+        try:
+            return json.loads(self._entry_path(key).read_bytes())
+        except FileNotFoundError:
+            return None
+
+    def _read_blob(self, digest: str) -> bytes | None:
+        blob_path = self._blob_path(digest)
+        try:
+            content = blob_path.read_bytes()
+        except FileNotFoundError: # evicted
+            return None
+        self._touch(blob_path)
+        return content
+
+    def _touch(self, blob_path: Path):
+        # The modification time of a blob is the last time it was used
+        now = self.clock()
+        os.utime(blob_path, (now, now))
+
+    def _write_file(self, path: Path, content: bytes):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first, so readers never see a partially written file
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_bytes(content)
+        os.replace(tmp_path, path)
+
+    def _blob_path(self, digest: str) -> Path:
+        return self.directory / "blobs" / digest[:2] / digest
+
+    def _entry_path(self, key: str) -> Path:
+        return self.directory / "entries" / f"{hashlib.sha256(key.encode('utf-8')).hexdigest()}.json"
+
+
+def create_fetch_cache_from_settings() -> FetchCache | None:
+    """
+    Create a FetchCache configured from the NEWSFEED_* settings:
+        - NEWSFEED_FETCH_CACHE: off, on, record or replay (default: off)
+        - NEWSFEED_FETCH_CACHE_DIR: directory of the cache (default: data/fetch_cache)
+        - NEWSFEED_FETCH_CACHE_TTL: seconds during which a downloaded content is reused (default: 300)
+        - NEWSFEED_FETCH_CACHE_MAX_MB: size of the cached content above which it is evicted (default: 100)
+        - NEWSFEED_FETCH_CACHE_SESSION: name of the recorded or replayed session (default: default)
+
+    Returns None when the cache is off.
+    """
+    mode = get_setting("FETCH_CACHE", FETCH_CACHE_OFF).strip().lower()
+    if mode == FETCH_CACHE_OFF:
+        return None
+    return FetchCache(
+        get_path_setting("FETCH_CACHE_DIR", DATA_DIR / "fetch_cache"),
+        ttl=get_float_setting("FETCH_CACHE_TTL", DEFAULT_TTL),
+        max_bytes=get_int_setting("FETCH_CACHE_MAX_MB", DEFAULT_MAX_MB) * 10**6,
+        mode=mode,
+        session=get_setting("FETCH_CACHE_SESSION", DEFAULT_SESSION),
+    )
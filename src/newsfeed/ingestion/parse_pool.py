@@ -0,0 +1,101 @@
+"""
+Process pool parsing the raw content of large feeds.
+
+Sources are downloaded concurrently by threads, but parsing a feed (e.g. with
+feedparser) is CPU-bound, so the feeds downloaded concurrently would still be
+parsed one at a time under the GIL. The raw content of large feeds is therefore
+parsed in a pool of worker processes, which send back compact results (tuples
+of the entry fields rather than Event objects). Small feeds are parsed inline,
+as sending them to another process would cost more than parsing them.
+
+The pool is configured with:
+    - NEWSFEED_PARSE_WORKERS: number of worker processes (default: the number of CPUs, 0 to always parse inline)
+      With a single CPU, the pool would only add overhead, so feeds are parsed inline by default.
+    - NEWSFEED_PARSE_POOL_MIN_KB: size of the raw content from which it is parsed in the pool (default: 32)
+"""
+
+import logging
+import os
+import threading
+
+from newsfeed.config.settings import get_int_setting
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIN_KB = 32
+
+
+def default_workers() -> int:
+    """Return the default number of worker processes: the number of CPUs, or 0 with a single CPU."""
+    cpus = os.cpu_count() or 1
+    return cpus if cpus > 1 else 0
+
+
+class ParsePool:
+    """
+    Parse raw content inline or in a pool of worker processes, depending on its size.
+    """
+    def __init__(self, workers: int | None = None, min_bytes: int = DEFAULT_MIN_KB * 1024):
+        """
+        Args:
+            workers (int, optional): The number of worker processes (defaults to default_workers(),
+                0 to always parse inline).
+            min_bytes (int): The size of the raw content from which it is parsed in the pool.
+        """
+        self.workers = default_workers() if workers is None else workers
+        self.min_bytes = min_bytes
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def parse(self, parse_function, content: bytes, *args):
+        """
+        Return parse_function(content, *args), called in a worker process if the content is large enough.
+        parse_function must be a module-level function, and return a picklable result.
+        """
+        if not self.workers or len(content) < self.min_bytes:
+            return parse_function(content, *args)
+        # multiprocessing is slow to import, and only needed once a feed is parsed in the pool
+        from concurrent.futures.process import BrokenProcessPool
+        try:
+            return self.get_executor().submit(parse_function, content, *args).result()
+        except BrokenProcessPool:
+            # e.g. a worker was killed: parse inline, and start a new pool next time
+            logger.warning("The parse pool is broken, parsing inline")
+            self.shutdown()
+            return parse_function(content, *args)
+
+    def get_executor(self) -> "ProcessPoolExecutor":
+        """Return the pool of worker processes, starting it on first use."""
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        with self.lock:
+            if self.executor is None:
+                # Workers are spawned rather than forked, as the sources are fetched by threads
+                self.executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                    mp_context=multiprocessing.get_context("spawn"))
+            return self.executor
+
+    def shutdown(self):
+        """Stop the worker processes (a new pool is started if needed)."""
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+# The parse pool is created on first use (see get_parse_pool)
+parse_pool = None
+parse_pool_lock = threading.Lock()
+
+
+def get_parse_pool() -> ParsePool:
+    """
+    Return the shared parse pool, creating it from the NEWSFEED_* settings on first use.
+    """
+    global parse_pool
+    with parse_pool_lock:
+        if parse_pool is None:
+            workers = get_int_setting("PARSE_WORKERS", default_workers())
+            parse_pool = ParsePool(workers, get_int_setting("PARSE_POOL_MIN_KB", DEFAULT_MIN_KB) * 1024)
+        return parse_pool
@@ -3,23 +3,48 @@
 # "Scraping Reddit Data using Python and PRAW – A Beginner’s Guide"
 # https://medium.com/@archanakkokate/scraping-reddit-data-using-python-and-praw-a-beginners-guide-7047962f5d29
 
+import json
 import os
-import praw
-from dotenv import load_dotenv
 from newsfeed.ingestion.event import Event
 from newsfeed.utils import helpers
 
-# load environment variables
-load_dotenv()
+# The Reddit client is created on first use (see get_reddit_client), so that
+# importing this module does not pull in praw or read the environment
+reddit = None
 
-reddit = praw.Reddit(client_id=os.getenv("REDDIT_CLIENT_ID"),
-                     client_secret=os.getenv("REDDIT_CLIENT_SECRET"),
-                     user_agent=os.getenv("REDDIT_USER_AGENT"))
+
+def get_reddit_client():
+    """
+    Return the shared Reddit client, creating it on first use.
+
+    praw and python-dotenv are only imported here, which keeps them off the
+    import path of modules that never fetch from Reddit.
+    """
+    global reddit
+    if reddit is None:
+        import praw
+        from dotenv import load_dotenv
+
+        # load environment variables
+        load_dotenv()
+
+        reddit = praw.Reddit(client_id=os.getenv("REDDIT_CLIENT_ID"),
+                             client_secret=os.getenv("REDDIT_CLIENT_SECRET"),
+                             user_agent=os.getenv("REDDIT_USER_AGENT"))
+    return reddit
 
 
 def fetch(source_config) -> list[Event]:
     """Fetches posts from a subreddit and returns a list of Event objects."""
-    subreddit = reddit.subreddit(source_config["subreddit_name"])
+    return parse(download(source_config), source_config)
+
+
+def download(source_config) -> bytes:
+    """
+    Downloads the posts of a subreddit, as the raw content parsed by parse: a JSON
+    array of the fields of each post used to build its event.
+    """
+    subreddit = get_reddit_client().subreddit(source_config["subreddit_name"])
     limit = source_config.get("limit", None)
     
     if limit:
@@ -27,15 +52,24 @@ def fetch(source_config) -> list[Event]:
     else: 
         print(f"Fetching all posts from {source_config['name']}...")
 
+    posts = [
+        {"id": post.id, "title": post.title, "selftext": post.selftext, "created_utc": post.created_utc}
+        for post in subreddit.new(limit=limit)
+    ]
+    return json.dumps(posts).encode("utf-8")
+
+
+def parse(content: bytes, source_config) -> list[Event]:
+    """Parses the posts downloaded by download into a list of Event objects."""
     events = []
-    for post in subreddit.new(limit=limit): 
+    for post in json.loads(content): 
         events.append(
             Event(
-                id=post.id,
+                id=post["id"],
                 source=source_config["name"],
-                title=post.title,
-                body=post.selftext,
-                published_at=helpers.convert_ts_to_dt(post.created_utc)
+                title=post["title"],
+                body=post["selftext"],
+                published_at=helpers.convert_ts_to_dt(post["created_utc"])
             )
         )
 
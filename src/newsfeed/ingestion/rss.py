@@ -1,24 +1,70 @@
 # RSS ingestion logic
 
-import requests
-import feedparser
+import logging
+
 from newsfeed.ingestion.event import Event
-from newsfeed.utils.helpers import convert_structtime_to_dt
+from newsfeed.ingestion.parse_pool import get_parse_pool
+from newsfeed.utils.helpers import convert_structtime_to_ts, convert_ts_to_dt, lazy_import, load_lazy_module
+
+# requests and feedparser are slow to import; load them on first use only
+requests = lazy_import("requests")
+feedparser = lazy_import("feedparser")
+
+logger = logging.getLogger(__name__)
 
 
 def fetch(source_config) -> list[Event]:
     """Fetches entries from a rss feed and returns a list of Event objects."""
-    response = requests.get(source_config['url'])
-    parsed_feed = feedparser.parse(response.content)
-    limit = source_config.get("limit", None)
+    return parse(download(source_config), source_config)
 
 
+def download(source_config) -> bytes:
+    """Downloads the raw content of a rss feed (see parse)."""
+    limit = source_config.get("limit", None)
     if limit:
         print(f"Fetching {limit} posts from {source_config['name']}...")
     else: 
         print(f"Fetching all posts from {source_config['name']}...")
 
-    events = []
+    response = load_lazy_module(requests).get(source_config['url'])
+    return response.content
+
+
+def parse(content: bytes, source_config) -> list[Event]:
+    """
+    Parses the raw content of a rss feed into a list of Event objects.
+
+    Large feeds are parsed in the parse pool (see parse_pool.py), so that feeds
+    fetched concurrently are also parsed in parallel. Publication times are only
+    converted to datetimes here, when the events are built: Event is also the format
+    of /ingest and /retrieve, so its publication time stays a datetime, which the
+    stores convert once, when the event is added, to the integer microseconds that
+    the ranking and the time indexes run on.
+    """
+    entries = get_parse_pool().parse(parse_entries, content, source_config.get("limit", None))
+    return [
+        Event(id=entry_id, source=source_config["name"], title=title, body=body,
+              published_at=convert_ts_to_dt(published_ts))
+        for entry_id, title, body, published_ts in entries
+    ]
+
+
+def parse_entries(raw_content: bytes, limit: int | None = None) -> list[tuple]:
+    """
+    Parses the raw content of a rss feed into (id, title, body, published_ts) tuples: a
+    compact result, cheap to send back from the parse pool. published_ts is the POSIX
+    timestamp of the publication time of the entry, or of its last update if it has
+    no publication time, or else of the last update of the feed.
+
+    Entries without any of these dates are skipped (with a warning): dating them with
+    the time the feed is parsed would give them the maximum recency, ranking them
+    above the dated events on every fetch.
+    """
+    parsed_feed = load_lazy_module(feedparser).parse(raw_content)
+    feed = parsed_feed.get('feed', {})
+    feed_published_parsed = feed.get("updated_parsed") or feed.get("published_parsed")
+
+    entries = []
     for entry in parsed_feed['entries'][:limit]:
         # Different RSS feeds use different keys for their article content (e.g. content, 
         # dc_content, description, ...), so try common content fields in order of preference
@@ -38,14 +84,17 @@ def fetch(source_config) -> list[Event]:
         if not content:
             content = entry.get('description')
 
-        events.append(
-            Event(
-                id=entry.get("id"),
-                source=source_config["name"],
-                title=entry.get("title"),
-                body=content,
-                published_at=convert_structtime_to_dt(entry.get("published_parsed"))
-            )
-        )
-
-    return events    
\ No newline at end of file
+        # feedparser dates are struct_times in UTC, missing when the feed has no (valid) date
+        published_parsed = entry.get("published_parsed") or entry.get("updated_parsed") or feed_published_parsed
+        if not published_parsed:
+            logger.warning(f"Skipping RSS entry without a publication time: {entry.get('id')}")
+            continue
+
+        entries.append((
+            entry.get("id"),
+            entry.get("title"),
+            content,
+            convert_structtime_to_ts(published_parsed)
+        ))
+
+    return entries    
\ No newline at end of file
@@ -0,0 +1,375 @@
+"""
+Point-in-time snapshots of the in-memory event store.
+
+A snapshot holds the stored events together with their precomputed keyword
+counts, so that a restarted server can restore its state without re-ingesting
+and re-filtering every event. The file is columnar: each field of the events
+is written as one contiguous column (arrays of fixed-size numbers, or
+concatenated UTF-8 strings with an array of offsets), and keywords are written
+once in a vocabulary and referenced by their index. The file is memory-mapped
+on load, and each column is decoded in a single pass.
+
+File layout (all numbers are little-endian):
+    header: magic (8 bytes), format version (uint16), 2 bytes of padding, number of events (uint32)
+    columns: for each column, its length in bytes (uint64) followed by its content
+"""
+
+import array
+import gc
+import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from newsfeed.config.settings import DATA_DIR, get_bool_setting, get_float_setting, get_path_setting
+from newsfeed.ingestion.event import Event
+from newsfeed.processing.keywords import EMPTY_KEYWORD_COUNTS, PAIR_SIZE, PAIR_TYPECODE, KeywordCounts, vocabulary
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"NFSNAPSH"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sHxxI")
+COLUMN_LENGTH = struct.Struct("<Q")
+# 9 string columns of 3 parts, 2 keyword count columns of 3 parts, and a datetime column of 2 parts
+NUM_COLUMNS = 9 * 3 + 2 * 3 + 2
+
+# UTC offset column value of the events with a naive published_at
+NAIVE_OFFSET = -(2 ** 31)
+
+EPOCH = datetime(1970, 1, 1)
+EPOCH_UTC = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# Default number of seconds between two periodic snapshots
+DEFAULT_SNAPSHOT_INTERVAL = 300
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot file is not a valid snapshot, or was written by an unsupported version."""
+
+
+@contextmanager
+def gc_paused():
+    """
+    Pause the cyclic garbage collector, e.g. while restoring a snapshot.
+
+    Creating millions of long-lived objects triggers many full collections, which
+    traverse all the objects created so far but can't free any of them.
+    """
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if was_enabled:
+            gc.enable()
+
+
+def _array_to_bytes(values: array.array) -> bytes:
+    if sys.byteorder == "big":
+        values = array.array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _array_from_bytes(typecode: str, data) -> array.array:
+    values = array.array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def _pack_strings(strings: list[str | None]) -> list[bytes]:
+    """
+    Encode a string column: a null mask (one byte per value), the end offset of each
+    value in the data, and the concatenated UTF-8 data.
+    """
+    encoded = [s.encode("utf-8") if s is not None else b"" for s in strings]
+    offsets = array.array("Q", [0])
+    total = 0
+    for value in encoded:
+        total += len(value)
+        offsets.append(total)
+    null_mask = bytes(1 if s is None else 0 for s in strings)
+    return [null_mask, _array_to_bytes(offsets), b"".join(encoded)]
+
+
+def _unpack_strings(null_mask, offsets_data, data) -> list[str | None]:
+    offsets = _array_from_bytes("Q", offsets_data).tolist()
+    text = data.decode("utf-8")
+    if len(text) == len(data):
+        # ASCII only: byte offsets are character offsets, slice the decoded text directly
+        values = [text[start:end] for start, end in zip(offsets, offsets[1:])]
+    else:
+        values = [data[start:end].decode("utf-8") for start, end in zip(offsets, offsets[1:])]
+    if any(null_mask):
+        values = [None if is_null else value for is_null, value in zip(null_mask, values)]
+    return values
+
+
+def _pack_keyword_counts(counts_list: list[dict[str, int]], snapshot_keywords: dict[str, int]) -> list[bytes]:
+    """
+    Encode a column of keyword counts as sparse (keyword index, count) pairs: the end
+    offset of the pairs of each event, the keyword indexes and the counts.
+    """
+    offsets = array.array("I", [0])
+    keyword_ids = array.array("I")
+    counts = array.array("I")
+    for kw_counts in counts_list:
+        for keyword, count in kw_counts.items():
+            keyword_ids.append(snapshot_keywords.setdefault(keyword, len(snapshot_keywords)))
+            counts.append(count)
+        offsets.append(len(keyword_ids))
+    return [_array_to_bytes(offsets), _array_to_bytes(keyword_ids), _array_to_bytes(counts)]
+
+
+def _unpack_keyword_counts(offsets_data, keyword_ids_data, counts_data, keywords: list[str]) -> list[KeywordCounts]:
+    offsets = _array_from_bytes("I", offsets_data).tolist()
+    # Snapshot keyword indexes -> keyword ids of this process
+    keyword_ids = [vocabulary.intern(keyword) for keyword in keywords]
+    pairs = array.array(PAIR_TYPECODE, [0]) * (2 * offsets[-1])
+    pairs[0::2] = array.array(PAIR_TYPECODE, [keyword_ids[i] for i in _array_from_bytes("I", keyword_ids_data)])
+    pairs[1::2] = _array_from_bytes("I", counts_data)
+    data = pairs.tobytes()
+    return [KeywordCounts(data[start * PAIR_SIZE:end * PAIR_SIZE]) if end > start else EMPTY_KEYWORD_COUNTS
+            for start, end in zip(offsets, offsets[1:])]
+
+
+def _pack_datetimes(datetimes: list[datetime]) -> list[bytes]:
+    """
+    Encode a datetime column exactly: microseconds since the epoch (of the UTC time
+    for aware datetimes) and the UTC offset in seconds (NAIVE_OFFSET for naive datetimes).
+    """
+    microseconds = array.array("q")
+    utc_offsets = array.array("i")
+    for dt in datetimes:
+        offset = dt.utcoffset()
+        if offset is None:
+            microseconds.append((dt - EPOCH) // timedelta(microseconds=1))
+            utc_offsets.append(NAIVE_OFFSET)
+        else:
+            microseconds.append((dt - EPOCH_UTC) // timedelta(microseconds=1))
+            utc_offsets.append(int(offset.total_seconds()))
+    return [_array_to_bytes(microseconds), _array_to_bytes(utc_offsets)]
+
+
+def _unpack_datetimes(microseconds_data, utc_offsets_data) -> list[datetime]:
+    timezones = {}
+    datetimes = []
+    for us, offset in zip(_array_from_bytes("q", microseconds_data).tolist(), _array_from_bytes("i", utc_offsets_data).tolist()):
+        if offset == NAIVE_OFFSET:
+            datetimes.append(EPOCH + timedelta(microseconds=us))
+        elif offset == 0:
+            datetimes.append(EPOCH_UTC + timedelta(microseconds=us))
+        else:
+            tz = timezones.get(offset)
+            if tz is None:
+                tz = timezones[offset] = timezone(timedelta(seconds=offset))
+            datetimes.append((EPOCH + timedelta(microseconds=us, seconds=offset)).replace(tzinfo=tz))
+    return datetimes
+
+
+def write_snapshot(path: Path, filtered_events_with_counts: list[dict], aliases: dict[str, list[dict]] | None = None):
+    """
+    Write the given store records (with their full event bodies) to a snapshot file.
+
+    The snapshot is written to a temporary file which then replaces the previous
+    snapshot, so a crash during the write never leaves a truncated snapshot behind.
+
+    Args:
+        path (Path): The snapshot file.
+        filtered_events_with_counts (list[dict]): The store records to write.
+        aliases (dict[str, list[dict]], optional): The near-duplicates of the stored events.
+    """
+    events = [record['event'] for record in filtered_events_with_counts]
+    alias_items = [(event_id, alias) for event_id, event_aliases in (aliases or {}).items() for alias in event_aliases]
+    snapshot_keywords = {}
+    columns = [
+        *_pack_strings([event.id for event in events]),
+        *_pack_strings([event.source for event in events]),
+        *_pack_strings([event.title for event in events]),
+        *_pack_strings([event.body for event in events]),
+        *_pack_datetimes([event.published_at for event in events]),
+        *_pack_strings([record.get('body_preview') for record in filtered_events_with_counts]),
+        *_pack_keyword_counts([record['kw_counts_in_title'] for record in filtered_events_with_counts], snapshot_keywords),
+        *_pack_keyword_counts([record['kw_counts_in_body'] for record in filtered_events_with_counts], snapshot_keywords),
+        *_pack_strings(list(snapshot_keywords)),
+        *_pack_strings([event_id for event_id, _ in alias_items]),
+        *_pack_strings([alias['id'] for _, alias in alias_items]),
+        *_pack_strings([alias['source'] for _, alias in alias_items]),
+    ]
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(events)))
+        for column in columns:
+            f.write(COLUMN_LENGTH.pack(len(column)))
+            f.write(column)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path: Path) -> tuple[list[dict], dict[str, list[dict]]]:
+    """
+    Read a snapshot file written by write_snapshot.
+
+    Args:
+        path (Path): The snapshot file.
+
+    Returns:
+        tuple[list[dict], dict[str, list[dict]]]: The store records, and the near-duplicates of the stored events.
+
+    Raises:
+        SnapshotError: If the file is not a snapshot, or was written by an unsupported format version.
+    """
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        if len(mapped) < HEADER.size or HEADER.unpack_from(mapped)[0] != MAGIC:
+            raise SnapshotError(f"{path} is not a newsfeed snapshot.")
+        _, version, count = HEADER.unpack_from(mapped)
+        if version != FORMAT_VERSION:
+            raise SnapshotError(f"Unsupported snapshot format version {version} (expected {FORMAT_VERSION}).")
+
+        # Slicing the mapping copies one column at a time out of the page cache
+        columns = []
+        position = HEADER.size
+        while position < len(mapped):
+            (length,) = COLUMN_LENGTH.unpack_from(mapped, position)
+            position += COLUMN_LENGTH.size
+            if position + length > len(mapped):
+                raise SnapshotError(f"{path} is truncated.")
+            columns.append(mapped[position:position + length])
+            position += length
+
+    if len(columns) != NUM_COLUMNS:
+        raise SnapshotError(f"{path} is truncated.")
+    columns = iter(columns)
+
+    def take(n: int) -> list[bytes]:
+        return [next(columns) for _ in range(n)]
+
+    ids = _unpack_strings(*take(3))
+    sources = _unpack_strings(*take(3))
+    titles = _unpack_strings(*take(3))
+    bodies = _unpack_strings(*take(3))
+    published_ats = _unpack_datetimes(*take(2))
+    body_previews = _unpack_strings(*take(3))
+    kw_counts_columns = take(3), take(3)
+    snapshot_keywords = _unpack_strings(*take(3))
+    kw_counts_in_title, kw_counts_in_body = (_unpack_keyword_counts(*c, snapshot_keywords) for c in kw_counts_columns)
+    alias_event_ids = _unpack_strings(*take(3))
+    alias_ids = _unpack_strings(*take(3))
+    alias_sources = _unpack_strings(*take(3))
+
+    if len(ids) != count:
+        raise SnapshotError(f"{path} is corrupted: expected {count} events, found {len(ids)}.")
+
+    filtered_events_with_counts = []
+    for event_id, source, title, published_at, body, title_counts, body_counts, body_preview in zip(
+            ids, sources, titles, published_ats, bodies, kw_counts_in_title, kw_counts_in_body, body_previews):
+        record = {
+            "event": Event(event_id, source, title, published_at, body),
+            "kw_counts_in_title": title_counts,
+            "kw_counts_in_body": body_counts,
+        }
+        if body_preview is not None:
+            record["body_preview"] = body_preview
+        filtered_events_with_counts.append(record)
+
+    aliases = {}
+    for event_id, alias_id, alias_source in zip(alias_event_ids, alias_ids, alias_sources):
+        aliases.setdefault(event_id, []).append({"id": alias_id, "source": alias_source})
+    return filtered_events_with_counts, aliases
+
+
+class PeriodicSnapshotter:
+    """
+    Snapshot a store every `interval` seconds from a background thread, and once
+    more when stopped (e.g. on server shutdown).
+    """
+    def __init__(self, store, path: Path, interval: float = DEFAULT_SNAPSHOT_INTERVAL, wal=None):
+        """
+        Args:
+            store (EventStore): The store to snapshot and restore.
+            path (Path): The snapshot file.
+            interval (float): Seconds between two snapshots (0 to only snapshot when stopped).
+            wal (WriteAheadLog, optional): The log of the ingested events, compacted by each
+                snapshot (the segments whose events are in the snapshot are deleted).
+        """
+        self.store = store
+        self.path = Path(path)
+        self.interval = interval
+        self.wal = wal
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def restore(self) -> int:
+        """
+        Restore the store from the snapshot file, if there is one.
+
+        Returns:
+            int: The number of restored events.
+        """
+        if not self.path.exists():
+            logger.info(f"No snapshot to restore at {self.path}")
+            return 0
+        restored_count = self.store.restore(self.path)
+        logger.info(f"Restored {restored_count} events from snapshot {self.path}")
+        return restored_count
+
+    def snapshot(self):
+        # The rotation waits until the batches logged in the segments it closes are added
+        # to the store, so all their events are in the snapshot
+        compacted_segments = self.wal.rotate() if self.wal is not None else []
+        event_count = self.store.snapshot(self.path)
+        logger.info(f"Wrote snapshot of {event_count} events to {self.path}")
+        if compacted_segments:
+            self.wal.remove_segments(compacted_segments)
+            logger.info(f"Removed {len(compacted_segments)} write-ahead log segments included in the snapshot")
+
+    def start(self):
+        if self.interval > 0:
+            self.thread = threading.Thread(target=self._run, name="store-snapshotter", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        """Stop the periodic snapshots, and write a last snapshot."""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.snapshot()
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.snapshot()
+            except Exception:
+                logger.exception(f"Failed to write snapshot to {self.path}")
+
+
+def create_snapshotter_from_settings(store, wal=None) -> PeriodicSnapshotter | None:
+    """
+    Create a PeriodicSnapshotter configured from the NEWSFEED_* settings:
+        - NEWSFEED_SNAPSHOTS: enable snapshots (default: false)
+        - NEWSFEED_SNAPSHOT_PATH: the snapshot file (default: data/store.snapshot)
+        - NEWSFEED_SNAPSHOT_INTERVAL: seconds between two periodic snapshots (default: 300)
+
+    Returns None when snapshots are disabled, or not supported by the store (the
+    sqlite store backend is already persistent).
+    """
+    if not get_bool_setting("SNAPSHOTS") or not hasattr(store, "snapshot"):
+        return None
+    return PeriodicSnapshotter(
+        store,
+        get_path_setting("SNAPSHOT_PATH", DATA_DIR / "store.snapshot"),
+        get_float_setting("SNAPSHOT_INTERVAL", DEFAULT_SNAPSHOT_INTERVAL),
+        wal=wal,
+    )
@@ -0,0 +1,249 @@
+import json
+import logging
+import sqlite3
+import heapq
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from newsfeed.ingestion.event import Event
+from newsfeed.ingestion.store import ranking_key
+from newsfeed.processing.keywords import KeywordCounts
+from newsfeed.processing.ranking import RankingFunction
+from newsfeed.utils.helpers import UTC, convert_dt_to_ts, convert_dt_to_us
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    title TEXT NOT NULL,
+    body TEXT,
+    published_at TEXT NOT NULL,
+    published_ts REAL NOT NULL,
+    kw_counts_in_title TEXT NOT NULL,
+    kw_counts_in_body TEXT NOT NULL,
+    body_preview TEXT
+);
+CREATE INDEX IF NOT EXISTS events_source ON events (source);
+CREATE INDEX IF NOT EXISTS events_published_ts ON events (published_ts);
+
+CREATE TABLE IF NOT EXISTS event_keywords (
+    keyword TEXT NOT NULL,
+    tier TEXT,
+    event_id TEXT NOT NULL REFERENCES events (id),
+    PRIMARY KEY (keyword, event_id)
+);
+CREATE INDEX IF NOT EXISTS event_keywords_tier ON event_keywords (tier, event_id);
+"""
+
+
+class SQLiteEventStore:
+    """
+    Event store backed by a SQLite database file, with the same interface as EventStore.
+
+    Several processes (e.g. uvicorn workers) can open the same database file, so they
+    all share the same view of the stored events, and /retrieve returns the same
+    result whichever worker handles the request. SQLite's write-ahead logging mode
+    lets readers proceed while a worker writes.
+
+    Events are ranked in Python (with the RankingFunction), from the rows matching the query.
+    Near-duplicate detection and alternative body storage are not supported by this store.
+    """
+    def __init__(self, path: Path, ranking_function: RankingFunction | None = None):
+        self.path = Path(path)
+        self.ranking_function = ranking_function or RankingFunction.from_config()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # SQLite connections can't be shared between threads, so each thread opens its own
+        self.local = threading.local()
+        with self._connection() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection = connection
+        return connection
+
+    def add_events(self, filtered_events_with_counts: list[dict]):
+        """
+        Add filtered events. Existing ones with same ID will be ingored.
+        """
+        keyword_tiers = self.ranking_function.keyword_tiers
+        for filtered_event_with_counts in filtered_events_with_counts:
+            if not self.is_valid_filtered_event_with_counts(filtered_event_with_counts):
+                raise ValueError(
+                    f"Tried to add an invalid format to the store."
+                )
+
+        connection = self._connection()
+        with connection: # one transaction per batch
+            for filtered_event_with_counts in filtered_events_with_counts:
+                event = filtered_event_with_counts['event']
+                cursor = connection.execute(
+                    "INSERT OR IGNORE INTO events VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (event.id, event.source, event.title, event.body, event.published_at.isoformat(),
+                     convert_dt_to_ts(event.published_at),
+                     json.dumps(dict(filtered_event_with_counts['kw_counts_in_title'])),
+                     json.dumps(dict(filtered_event_with_counts['kw_counts_in_body'])),
+                     filtered_event_with_counts.get('body_preview')),
+                )
+                if cursor.rowcount == 0:
+                    logger.warning(f"Duplicate event id detected. The duplicate item will be ignored. {event.id}")
+                    continue
+                keywords = filtered_event_with_counts['kw_counts_in_title'].keys() | filtered_event_with_counts['kw_counts_in_body'].keys()
+                connection.executemany(
+                    "INSERT OR IGNORE INTO event_keywords VALUES (?, ?, ?)",
+                    [(keyword, keyword_tiers.get(keyword), event.id) for keyword in keywords],
+                )
+
+    def get_sorted_events(self, keywords: list[str] | None = None, tier: str | None = None,
+                          sources: list[str] | None = None, since: datetime | None = None,
+                          until: datetime | None = None, now: datetime | None = None) -> list[dict]:
+        """
+        Retrieve the filtered events matching the criteria from the store, scored and sorted
+        (see EventStore.get_sorted_events).
+        """
+        events_with_score = self.ranking_function.score(self._select_records(keywords, tier, sources, since, until), now=now)
+        return sorted(events_with_score, key=ranking_key)
+
+    def get_top_events(self, k: int, keywords: list[str] | None = None, tier: str | None = None,
+                       sources: list[str] | None = None, since: datetime | None = None,
+                       until: datetime | None = None, now: datetime | None = None) -> list[dict]:
+        """
+        Retrieve the k best ranked events matching the criteria (see EventStore.get_top_events).
+        """
+        events_with_score = self.ranking_function.score(self._select_records(keywords, tier, sources, since, until), now=now)
+        return heapq.nsmallest(k, events_with_score, key=ranking_key)
+
+    def iter_sorted_events(self, chunk_size: int, keywords: list[str] | None = None, tier: str | None = None,
+                           sources: list[str] | None = None, since: datetime | None = None,
+                           until: datetime | None = None, now: datetime | None = None):
+        """
+        Yield the events of get_sorted_events(...) with the same criteria, in chunks
+        (see EventStore.iter_sorted_events).
+
+        The events are ranked from their ids, publication times and keyword counts only,
+        and the full rows of a chunk are only loaded when the chunk is requested.
+        """
+        if now is None:
+            now = datetime.now(UTC) # the chunks are scored at the time of the ranking
+        where, parameters = self._where_clause(keywords, tier, sources, since, until)
+        event_ids, importance_scores, published_us = [], [], []
+        for event_id, published_at, kw_counts_in_title, kw_counts_in_body in self._connection().execute(
+                "SELECT id, published_at, kw_counts_in_title, kw_counts_in_body FROM events" + where, parameters):
+            event_ids.append(event_id)
+            importance_scores.append(self.ranking_function.importance({
+                "kw_counts_in_title": KeywordCounts.from_counts(json.loads(kw_counts_in_title)),
+                "kw_counts_in_body": KeywordCounts.from_counts(json.loads(kw_counts_in_body)),
+            }))
+            published_us.append(convert_dt_to_us(datetime.fromisoformat(published_at)))
+        _, recency_scores = self.ranking_function.recency(published_us, now)
+        total_scores = [importance_score * recency_score
+                        for importance_score, recency_score in zip(importance_scores, recency_scores)]
+        ranked_ids = [event_ids[i] for i in sorted(range(len(event_ids)), key=lambda i: (-total_scores[i], event_ids[i]))]
+        del event_ids, importance_scores, published_us, recency_scores, total_scores
+
+        for start in range(0, len(ranked_ids), chunk_size):
+            chunk_ids = ranked_ids[start:start + chunk_size]
+            records = {record['event'].id: record for record in self._load_records(
+                f" WHERE id IN ({', '.join('?' * len(chunk_ids))})", chunk_ids)}
+            yield self.ranking_function.score([records[event_id] for event_id in chunk_ids if event_id in records], now=now)
+
+    def _where_clause(self, keywords, tier, sources, since, until) -> tuple[str, list]:
+        """
+        Return the WHERE clause (empty if there are no criteria) and parameters selecting
+        the events matching all the given criteria, using the table indexes.
+        """
+        conditions, parameters = [], []
+        for keyword in keywords or []:
+            conditions.append("id IN (SELECT event_id FROM event_keywords WHERE keyword = ?)")
+            parameters.append(keyword.lower())
+        if tier is not None:
+            conditions.append("id IN (SELECT event_id FROM event_keywords WHERE tier = ?)")
+            parameters.append(tier)
+        if sources:
+            conditions.append(f"source IN ({', '.join('?' * len(sources))})")
+            parameters.extend(sources)
+        if since is not None:
+            conditions.append("published_ts >= ?")
+            parameters.append(convert_dt_to_ts(since))
+        if until is not None:
+            conditions.append("published_ts < ?")
+            parameters.append(convert_dt_to_ts(until))
+        return (" WHERE " + " AND ".join(conditions) if conditions else ""), parameters
+
+    def _select_records(self, keywords, tier, sources, since, until) -> list[dict]:
+        """
+        Load the stored records matching all the given criteria, using the table indexes.
+        """
+        return self._load_records(*self._where_clause(keywords, tier, sources, since, until))
+
+    def _load_records(self, where: str, parameters: list) -> list[dict]:
+        """
+        Load the stored records of the rows selected by a WHERE clause.
+        """
+        query = ("SELECT id, source, title, body, published_at, kw_counts_in_title, kw_counts_in_body, body_preview "
+                 "FROM events" + where)
+        rows = self._connection().execute(query, parameters).fetchall()
+        return [
+            {
+                "event": Event(id=row[0], source=row[1], title=row[2], body=row[3],
+                               published_at=datetime.fromisoformat(row[4])),
+                "kw_counts_in_title": KeywordCounts.from_counts(json.loads(row[5])),
+                "kw_counts_in_body": KeywordCounts.from_counts(json.loads(row[6])),
+                "body_preview": row[7],
+            }
+            for row in rows
+        ]
+
+    def get_full_events(self, events: list[Event]) -> list[Event]:
+        """
+        Return the given stored events with their full body (always stored in the database).
+        """
+        return list(events)
+
+    def get_aliases(self, event_id: str) -> list[dict]:
+        """
+        Near-duplicate detection is not supported by this store, so events have no aliases.
+        """
+        return []
+
+    def clear(self):
+        """
+        Clear stored events (e.g., for testing or reset).
+        """
+        with self._connection() as connection:
+            connection.execute("DELETE FROM event_keywords")
+            connection.execute("DELETE FROM events")
+
+    def has_event(self, event_id: str) -> bool:
+        """
+        Check if there exists an event with this event it in the store.
+        """
+        row = self._connection().execute("SELECT 1 FROM events WHERE id = ?", (event_id,)).fetchone()
+        return row is not None
+
+    def get_unstored_events(self, events: list[Event]) -> list[Event]:
+        """
+        Return the events whose id is not in the store yet.
+        """
+        return [event for event in events if not self.has_event(event.id)]
+
+    def get_event_count(self) -> int:
+        """
+        Return the number of stored events.
+        """
+        return self._connection().execute("SELECT COUNT(*) FROM events").fetchone()[0]
+
+    def is_valid_filtered_event_with_counts(self, item: dict) -> bool:
+        """
+        Helper function to ensure we add the correct data type to the store
+        """
+        required_keys = {"event", "kw_counts_in_title", "kw_counts_in_body"}
+        optional_keys = {"body_preview"}
+        return required_keys <= set(item.keys()) <= required_keys | optional_keys
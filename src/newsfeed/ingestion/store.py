@@ -1,79 +1,431 @@
-import threading
+import bisect
+import dataclasses
+import heapq
 import logging
-from newsfeed.config.loader import load_keywords_config
-from newsfeed.processing.score import score_events
+import threading
+from newsfeed.config.settings import DATA_DIR, get_bool_setting, get_float_setting, get_setting, get_path_setting
+from newsfeed.processing.ranking import RankingFunction
+from newsfeed.ingestion.body_storage import BODY_STORAGE_MEMORY, create_body_storage
 from newsfeed.ingestion.event import Event
+from newsfeed.ingestion.snapshot import gc_paused, read_snapshot, write_snapshot
+from newsfeed.processing.dedup import DEFAULT_THRESHOLD, NearDuplicateIndex, event_signature
+from newsfeed.utils.helpers import UTC, convert_dt_to_ts, convert_dt_to_us
+from newsfeed.utils.locks import TimedLock
+from newsfeed.utils.profiling import span
+from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+STORE_BACKEND_MEMORY = "memory"
+STORE_BACKEND_SQLITE = "sqlite"
+STORE_BACKEND_COLUMNAR = "columnar"
+
+
+def ranking_key(event_with_score: dict) -> tuple:
+    """
+    Sort key of the default ranking: descending total_score, ties broken by ascending event ID.
+    """
+    return (-event_with_score['total_score'], event_with_score['event'].id)
+
 
 class EventStore:
-    def __init__(self):
-        self.store_lock = threading.Lock()
+    def __init__(self, body_storage=None, near_duplicate_index: NearDuplicateIndex | None = None,
+                 ranking_function: RankingFunction | None = None):
+        """
+        Args:
+            body_storage (optional): Where the full event bodies are kept (see body_storage.py).
+                Defaults to keeping them in memory, unchanged.
+            near_duplicate_index (NearDuplicateIndex, optional): When given, events which are 
+                near-duplicates of a stored event (e.g. the same story syndicated by another 
+                source) are not stored, but recorded as aliases of the stored event.
+            ranking_function (RankingFunction, optional): How events are ranked. Defaults to
+                the ranking function of the configuration files.
+        """
+        # Instrumented lock: its contention is reported by the /stats endpoint
+        self.store_lock = TimedLock("store")
         self.filtered_events_with_counts_dict = {}
+        self.body_storage = body_storage or create_body_storage(BODY_STORAGE_MEMORY)
+        # event id -> handle to the full body, for bodies not kept in the stored events
+        self.body_handles = {}
+        # Inverted indexes, used to only rank the events matching a query:
+        #   keyword -> ids of the events with this keyword in their title or body
+        #   tier ("high", "medium", "low") -> ids of the events with a keyword of this tier
+        self.keyword_index = {}
+        self.tier_index = {}
+        #   source -> ids of the events from this source
+        self.source_index = {}
+        # (published_at timestamp, event id) pairs kept sorted, for time range queries
+        self.published_index = []
+        # event id -> published_at timestamp
+        self.published_timestamps = {}
+        self.near_duplicate_index = near_duplicate_index
+        # stored event id -> [{"id": ..., "source": ...}] of its near-duplicates
+        self.aliases = {}
+        # near-duplicate event id -> id of the stored event it is an alias of
+        self.alias_of = {}
+        self.ranking_function = ranking_function or RankingFunction.from_config()
+        # event id -> importance score and publication time (in microseconds since the epoch), 
+        # computed at ingest time so that ranking only has to compute the recency scores
+        self.importance_scores = {}
+        self.published_us = {}
 
     def add_events(self, filtered_events_with_counts: list[dict]):
         """
         Add filtered events. Existing ones with same ID will be ingored.
         """
-        with self.store_lock:
+        keyword_tiers = self.ranking_function.keyword_tiers
+        with self.store_lock, span("index"):
             for filtered_event_with_counts in filtered_events_with_counts:
                 if not self.is_valid_filtered_event_with_counts(filtered_event_with_counts):
                     raise ValueError(
                         f"Tried to add an invalid format to the store."
                     )
                 event_id = filtered_event_with_counts['event'].id
-                if event_id in self.filtered_events_with_counts_dict.keys():
+                if event_id in self.filtered_events_with_counts_dict.keys() or event_id in self.alias_of:
                     logger.warning(f"Duplicate event id detected. The duplicate item will be ignored. {event_id}")
                     continue
+                if self.near_duplicate_index is not None and self._collapse_near_duplicate(filtered_event_with_counts):
+                    continue
+                filtered_event_with_counts = self._offload_body(filtered_event_with_counts)
                 # use the event id as the "primary key" in my internal store dict
                 self.filtered_events_with_counts_dict[event_id] = filtered_event_with_counts
+                self._index_keywords(filtered_event_with_counts, keyword_tiers)
+                self._cache_ranking_features(filtered_event_with_counts)
+                self._index_source_and_time(filtered_event_with_counts['event'])
+
+    def _collapse_near_duplicate(self, filtered_event_with_counts: dict) -> bool:
+        """
+        Record the event as an alias of a stored near-duplicate, if there is one. Otherwise, 
+        index its signature so later copies of the same story are collapsed into it.
+        The caller must hold the store lock.
+
+        Returns:
+            bool: True if the event is a near-duplicate (and must not be stored).
+        """
+        event = filtered_event_with_counts['event']
+        signature = event_signature(event.title, filtered_event_with_counts.get('body_preview'))
+        duplicate_of = self.near_duplicate_index.find_duplicate(signature)
+        if duplicate_of is None:
+            self.near_duplicate_index.add(event.id, signature)
+            return False
+
+        logger.info(f"Event {event.id} ({event.source}) is a near-duplicate of {duplicate_of}. Storing it as an alias.")
+        self.aliases.setdefault(duplicate_of, []).append({"id": event.id, "source": event.source})
+        self.alias_of[event.id] = duplicate_of
+        return True
+
+    def get_aliases(self, event_id: str) -> list[dict]:
+        """
+        Return the near-duplicates collapsed into a stored event, as {"id": ..., "source": ...} dicts.
+        """
+        with self.store_lock:
+            return list(self.aliases.get(event_id, []))
 
+    def _index_keywords(self, filtered_event_with_counts: dict, keyword_tiers: dict[str, str]):
+        """
+        Add an event to the keyword and tier posting lists. The caller must hold the store lock.
+        """
+        event_id = filtered_event_with_counts['event'].id
+        keywords = filtered_event_with_counts['kw_counts_in_title'].keys() | filtered_event_with_counts['kw_counts_in_body'].keys()
+        for keyword in keywords:
+            self.keyword_index.setdefault(keyword, set()).add(event_id)
+            tier = keyword_tiers.get(keyword)
+            if tier is not None:
+                self.tier_index.setdefault(tier, set()).add(event_id)
+
+    def _index_source_and_time(self, event: Event, keep_sorted: bool = True):
+        """
+        Add an event to the source and publication time indexes, after its ranking features are cached.
+        The caller must hold the store lock.
+        When adding many events at once, pass keep_sorted=False and sort the published_at index once at the end.
+        """
+        self.source_index.setdefault(event.source, set()).add(event.id)
+        # Same value as convert_dt_to_ts(event.published_at), without converting the datetime again
+        published_ts = self.published_us[event.id] / 10**6
+        self.published_timestamps[event.id] = published_ts
+        if keep_sorted:
+            bisect.insort(self.published_index, (published_ts, event.id))
+        else:
+            self.published_index.append((published_ts, event.id))
 
-    def get_sorted_events(self) -> list[dict]:
+    def _cache_ranking_features(self, filtered_event_with_counts: dict):
+        """
+        Compute the parts of the ranking which only depend on the event. The caller must hold the store lock.
+        """
+        event = filtered_event_with_counts['event']
+        self.importance_scores[event.id] = self.ranking_function.importance(filtered_event_with_counts)
+        self.published_us[event.id] = convert_dt_to_us(event.published_at)
+
+    def _offload_body(self, filtered_event_with_counts: dict) -> dict:
+        """
+        Hand the full body over to the body storage, and keep a copy of the event without
+        its body in the store (the record still has the plain text 'body_preview').
+        The caller must hold the store lock.
+        """
+        event = filtered_event_with_counts['event']
+        if self.body_storage.name == BODY_STORAGE_MEMORY or not event.body:
+            return filtered_event_with_counts
+        self.body_handles[event.id] = self.body_storage.put(event.id, event.body)
+        return {**filtered_event_with_counts, 'event': dataclasses.replace(event, body=None)}
+
+    def get_full_events(self, events: list[Event]) -> list[Event]:
+        """
+        Return the given stored events with their full body, loading it from the body
+        storage when it is not kept in memory.
+        """
+        with self.store_lock:
+            if not self.body_handles:
+                return list(events)
+            return [
+                dataclasses.replace(event, body=self.body_storage.get(self.body_handles[event.id]))
+                if event.id in self.body_handles else event
+                for event in events
+            ]
+
+
+    def snapshot(self, path) -> int:
+        """
+        Write a point-in-time snapshot of the stored events (with their full bodies and 
+        keyword counts) and of their aliases to a file (see snapshot.py).
+
+        The store is only locked while the records are collected, not while the file is written.
+
+        Returns:
+            int: The number of events in the snapshot.
+        """
+        with self.store_lock:
+            filtered_events_with_counts = [
+                {**record, 'event': dataclasses.replace(record['event'], body=self.body_storage.get(self.body_handles[event_id]))}
+                if event_id in self.body_handles else record
+                for event_id, record in self.filtered_events_with_counts_dict.items()
+            ]
+            aliases = {event_id: list(event_aliases) for event_id, event_aliases in self.aliases.items()}
+        write_snapshot(path, filtered_events_with_counts, aliases)
+        return len(filtered_events_with_counts)
+
+    def restore(self, path) -> int:
+        """
+        Add the events of a snapshot file to the store, with their precomputed keyword counts
+        (the events are not filtered again). Events already in the store are ignored.
+
+        Returns:
+            int: The number of restored events.
+        """
+        keyword_tiers = self.ranking_function.keyword_tiers
+        restored_count = 0
+        with gc_paused():
+            filtered_events_with_counts, aliases = read_snapshot(path)
+            with self.store_lock:
+                for filtered_event_with_counts in filtered_events_with_counts:
+                    event = filtered_event_with_counts['event']
+                    if event.id in self.filtered_events_with_counts_dict or event.id in self.alias_of:
+                        continue
+                    if self.near_duplicate_index is not None:
+                        self.near_duplicate_index.add(
+                            event.id, event_signature(event.title, filtered_event_with_counts.get('body_preview')))
+                    filtered_event_with_counts = self._offload_body(filtered_event_with_counts)
+                    self.filtered_events_with_counts_dict[event.id] = filtered_event_with_counts
+                    self._index_keywords(filtered_event_with_counts, keyword_tiers)
+                    self._cache_ranking_features(filtered_event_with_counts)
+                    self._index_source_and_time(event, keep_sorted=False)
+                    restored_count += 1
+                self.published_index.sort()
+
+                for event_id, event_aliases in aliases.items():
+                    for alias in event_aliases:
+                        if alias['id'] not in self.alias_of and alias['id'] not in self.filtered_events_with_counts_dict:
+                            self.aliases.setdefault(event_id, []).append(alias)
+                            self.alias_of[alias['id']] = event_id
+        return restored_count
+
+    def get_sorted_events(self, keywords: list[str] | None = None, tier: str | None = None,
+                          sources: list[str] | None = None, since: datetime | None = None,
+                          until: datetime | None = None, now: datetime | None = None) -> list[dict]:
         """
         Retrieve all filtered events from the store, scored and sorted.
 
         This method scores each event from the store and returns a sorted 
         event list in descending order of total score.
+
+        The optional criteria restrict the result to the matching events, 
+        which are selected from the store indexes before being scored.
+
+        Args:
+            keywords (list[str], optional): Only return the events containing all these keywords.
+            tier (str, optional): Only return the events containing a keyword of this
+                priority tier ("high", "medium" or "low").
+            sources (list[str], optional): Only return the events from one of these sources.
+            since (datetime, optional): Only return the events published at or after this time.
+            until (datetime, optional): Only return the events published before this time.
+            now (datetime, optional): The time the recency of the events is computed at
+                (defaults to the current time).
         """
         with self.store_lock:
-            keywords_config = load_keywords_config() # Load keyword configuration from YAML file
-            high_priority_keywords = keywords_config['high_priority_keywords']
-            medium_priority_keywords = keywords_config['medium_priority_keywords']
-            low_priority_keywords = keywords_config['low_priority_keywords']
-            
-            events_with_score = score_events(self.filtered_events_with_counts_dict.values(), 
-                                                high_priority_keywords,
-                                                medium_priority_keywords,
-                                                low_priority_keywords)
-            
-            for event_with_score in events_with_score:
-                logger.debug(event_with_score['event'].id)
-                logger.debug(event_with_score['total_score'])
-
+            with span("select"):
+                filtered_events_with_counts = self._select_records(keywords, tier, sources, since, until)
+            with span("scoring"):
+                events_with_score = self._score_stored_events(filtered_events_with_counts, now)
             
             # Sort events by descending total_score. 
             # Break ties using event ID in ascending order
-            sorted_events_with_score = sorted(
-                events_with_score,
-                key=lambda x: (-x['total_score'], x['event'].id)
-            )
+            with span("sort"):
+                sorted_events_with_score = sorted(events_with_score, key=ranking_key)
             return sorted_events_with_score
 
+    def iter_sorted_events(self, chunk_size: int, keywords: list[str] | None = None, tier: str | None = None,
+                           sources: list[str] | None = None, since: datetime | None = None,
+                           until: datetime | None = None, now: datetime | None = None):
+        """
+        Yield the events of get_sorted_events(...) with the same criteria, in chunks.
+
+        Only the ids and scores of the matching events are kept to sort them, and the scored
+        records are built one chunk at a time, so that exporting a large store does not hold
+        a record per event. The events are ranked when the first chunk is requested; events
+        removed from the store since then (by clear) are skipped.
+
+        Yields:
+            list[dict]: The next chunk_size (or fewer) scored events (see get_sorted_events).
+        """
+        if now is None:
+            now = datetime.now(UTC) # the chunks are scored at the time of the ranking
+        with self.store_lock:
+            with span("select"):
+                event_ids = [e['event'].id for e in self._select_records(keywords, tier, sources, since, until)]
+            with span("scoring"):
+                _, recency_scores = self.ranking_function.recency([self.published_us[i] for i in event_ids], now)
+                total_scores = [self.importance_scores[event_id] * recency_score
+                                for event_id, recency_score in zip(event_ids, recency_scores)]
+            with span("sort"):
+                positions = sorted(range(len(event_ids)), key=lambda i: (-total_scores[i], event_ids[i]))
+                ranked_ids = [event_ids[i] for i in positions]
+            del event_ids, recency_scores, total_scores, positions
+
+        for start in range(0, len(ranked_ids), chunk_size):
+            with self.store_lock:
+                records = self.filtered_events_with_counts_dict
+                chunk = [records[event_id] for event_id in ranked_ids[start:start + chunk_size] if event_id in records]
+                events_with_score = self._score_stored_events(chunk, now)
+            yield events_with_score
+
+    def get_top_events(self, k: int, keywords: list[str] | None = None, tier: str | None = None,
+                       sources: list[str] | None = None, since: datetime | None = None,
+                       until: datetime | None = None, now: datetime | None = None) -> list[dict]:
+        """
+        Retrieve the k best ranked events from the store, scored and sorted.
+
+        Equivalent to get_sorted_events(...)[:k] with the same criteria, but only the 
+        top k events are selected and sorted (O(n log k) instead of O(n log n)).
+        """
+        with self.store_lock:
+            with span("select"):
+                filtered_events_with_counts = self._select_records(keywords, tier, sources, since, until)
+            with span("scoring"):
+                events_with_score = self._score_stored_events(filtered_events_with_counts, now)
+            with span("sort"):
+                return heapq.nsmallest(k, events_with_score, key=ranking_key)
+
+    def _select_records(self, keywords: list[str] | None, tier: str | None, sources: list[str] | None,
+                        since: datetime | None, until: datetime | None):
+        """
+        Return the stored records matching all the given criteria (all records if there are no criteria).
+
+        The smallest candidate set (a keyword/tier/source posting list, or the time range of the 
+        published_at index) is scanned, and each candidate is checked against the other criteria, 
+        so the work is proportional to the size of the smallest candidate set rather than the store.
+        The caller must hold the store lock.
+        """
+        posting_lists = [self.keyword_index.get(keyword.lower(), set()) for keyword in keywords or []]
+        if tier is not None:
+            posting_lists.append(self.tier_index.get(tier, set()))
+        if sources:
+            if len(sources) == 1:
+                posting_lists.append(self.source_index.get(sources[0], set()))
+            else:
+                posting_lists.append(set().union(*(self.source_index.get(source, set()) for source in sources)))
+
+        has_time_range = since is not None or until is not None
+        if not posting_lists and not has_time_range:
+            return self.filtered_events_with_counts_dict.values()
+
+        posting_lists.sort(key=len)
+        if has_time_range:
+            since_ts = convert_dt_to_ts(since) if since is not None else float("-inf")
+            until_ts = convert_dt_to_ts(until) if until is not None else float("inf")
+            # Binary search the boundaries of the time range in the sorted published_at index
+            start = bisect.bisect_left(self.published_index, (since_ts,))
+            end = bisect.bisect_left(self.published_index, (until_ts,))
+
+        if has_time_range and (not posting_lists or end - start <= len(posting_lists[0])):
+            candidate_ids = (event_id for _, event_id in self.published_index[start:end])
+            other_posting_lists = posting_lists
+            check_time_range = False
+        else:
+            candidate_ids = posting_lists[0]
+            other_posting_lists = posting_lists[1:]
+            check_time_range = has_time_range
+
+        matching_records = []
+        for event_id in candidate_ids:
+            if any(event_id not in posting_list for posting_list in other_posting_lists):
+                continue
+            if check_time_range and not since_ts <= self.published_timestamps[event_id] < until_ts:
+                continue
+            matching_records.append(self.filtered_events_with_counts_dict[event_id])
+        return matching_records
+
+    def _score_stored_events(self, filtered_events_with_counts, now: datetime | None = None) -> list[dict]:
+        """
+        Score the given stored events, from their cached importance scores. The caller must hold the store lock.
+        """
+        filtered_events_with_counts = list(filtered_events_with_counts)
+        event_ids = [e['event'].id for e in filtered_events_with_counts]
+        events_with_score = self.ranking_function.score(
+            filtered_events_with_counts,
+            importance_scores=[self.importance_scores[event_id] for event_id in event_ids],
+            published_us=[self.published_us[event_id] for event_id in event_ids],
+            now=now,
+        )
+        
+        if logger.isEnabledFor(logging.DEBUG):
+            for event_with_score in events_with_score:
+                logger.debug(event_with_score['event'].id)
+                logger.debug(event_with_score['total_score'])
+        return events_with_score
+
     def clear(self):
         """
         Clear stored events (e.g., for testing or reset).
         """
         with self.store_lock:
             self.filtered_events_with_counts_dict.clear()
+            self.body_handles.clear()
+            self.body_storage.clear()
+            self.keyword_index.clear()
+            self.tier_index.clear()
+            self.source_index.clear()
+            self.published_index.clear()
+            self.published_timestamps.clear()
+            self.importance_scores.clear()
+            self.published_us.clear()
+            self.aliases.clear()
+            self.alias_of.clear()
+            if self.near_duplicate_index is not None:
+                self.near_duplicate_index.clear()
 
     def has_event(self, event_id: str) -> bool:
         """
         Check if there exists an event with this event it in the store.
         """
         with self.store_lock:
-            return event_id in self.filtered_events_with_counts_dict
+            return event_id in self.filtered_events_with_counts_dict or event_id in self.alias_of
+
+    def get_unstored_events(self, events: list[Event]) -> list[Event]:
+        """
+        Return the events whose id is not in the store yet (checked under a single lock acquisition).
+        """
+        with self.store_lock:
+            return [event for event in events
+                    if event.id not in self.filtered_events_with_counts_dict and event.id not in self.alias_of]
 
     def get_event_count(self) -> int:
         """
@@ -87,10 +439,71 @@ class EventStore:
         """
         Helper function to ensure we add the correct data type to the store
         """
-        expected_keys = {"event", "kw_counts_in_title", "kw_counts_in_body"}
-        return set(item.keys()) == expected_keys
+        required_keys = {"event", "kw_counts_in_title", "kw_counts_in_body"}
+        optional_keys = {"body_preview"}
+        return required_keys <= set(item.keys()) <= required_keys | optional_keys
     
 
 
-# Singleton: shared, in-memory store instance accessible from any module
-store = EventStore()
\ No newline at end of file
+def create_store_from_settings():
+    """
+    Create the store configured from the NEWSFEED_* settings:
+        - NEWSFEED_STORE_BACKEND: "memory" (default, process-local EventStore), "sqlite"
+          (SQLiteEventStore, shared by all the processes using the same database file) or 
+          "columnar" (ColumnarEventStore, process-local, for millions of events)
+        - NEWSFEED_STORE_PATH: database file of the sqlite backend (default: data/newsfeed.db)
+        - NEWSFEED_BODY_STORAGE: "memory" (default), "compressed" or "disk"
+        - NEWSFEED_BLOB_DIR: directory of the body blobs for disk storage (default: data/blobs)
+        - NEWSFEED_NEAR_DUPLICATES: collapse near-duplicate events (default: false)
+        - NEWSFEED_NEAR_DUPLICATE_THRESHOLD: minimum similarity of near-duplicates (default: 0.7)
+    """
+    backend = get_setting("STORE_BACKEND", STORE_BACKEND_MEMORY)
+    if backend == STORE_BACKEND_SQLITE:
+        from newsfeed.ingestion.sqlite_store import SQLiteEventStore # imports this module
+        return SQLiteEventStore(get_path_setting("STORE_PATH", DATA_DIR / "newsfeed.db"))
+    if backend == STORE_BACKEND_COLUMNAR:
+        from newsfeed.ingestion.columnar_store import ColumnarEventStore # imports this module
+        return ColumnarEventStore()
+    if backend != STORE_BACKEND_MEMORY:
+        raise ValueError(f"Unknown store backend: {backend}")
+
+    body_storage = create_body_storage(
+        get_setting("BODY_STORAGE", BODY_STORAGE_MEMORY),
+        blob_dir=get_path_setting("BLOB_DIR", DATA_DIR / "blobs"),
+    )
+    near_duplicate_index = None
+    if get_bool_setting("NEAR_DUPLICATES"):
+        near_duplicate_index = NearDuplicateIndex(get_float_setting("NEAR_DUPLICATE_THRESHOLD", DEFAULT_THRESHOLD))
+    return EventStore(body_storage=body_storage, near_duplicate_index=near_duplicate_index)
+
+
+class LazyStore:
+    """
+    Proxy of a store which is only created when it is first used, so importing the modules
+    sharing it (e.g. the CLI) does not read the settings and the configuration files, nor
+    compile the ranking function. Attribute reads and writes go to the created store.
+    """
+    def __init__(self, create_store):
+        object.__setattr__(self, "_create_store", create_store)
+        object.__setattr__(self, "_store", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    def _get_store(self):
+        if self._store is None:
+            with self._lock:
+                if self._store is None:
+                    object.__setattr__(self, "_store", self._create_store())
+        return self._store
+
+    def __getattr__(self, name: str):
+        return getattr(self._get_store(), name)
+
+    def __setattr__(self, name: str, value):
+        setattr(self._get_store(), name, value)
+
+    def __delattr__(self, name: str):
+        delattr(self._get_store(), name)
+
+
+# Singleton: shared store instance accessible from any module (created on first use)
+store = LazyStore(create_store_from_settings)
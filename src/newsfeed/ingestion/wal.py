@@ -0,0 +1,332 @@
+"""
+Write-ahead log (WAL) of the events accepted by /ingest.
+
+The store lives in memory, so the events of every acknowledged /ingest call are
+appended to a log on disk before the call returns, and the log is replayed into
+the store on startup. Each appended batch is a record made of a header (payload
+length and CRC-32, little-endian uint32s) followed by the batch encoded as JSON.
+A record which is truncated or fails its checksum (e.g. after a crash in the
+middle of a write) ends the replay of its segment, which is truncated before
+it, and the replay continues with the next segment.
+
+Appending uses group commit: a single writer thread writes all the batches
+appended since its previous write and syncs them to disk with one fsync, then
+wakes up all their callers. Concurrent ingestions therefore share the cost of
+an fsync instead of paying for one each. A failed write is truncated from the
+segment and retried; if it keeps failing, only the batches of that write fail.
+
+The log is split into segment files. Taking a snapshot rotates the log to a new
+segment first, so that once the snapshot is written the older segments (whose
+events are all in the snapshot) can be deleted. Batches are logged before they
+are added to the store (see append), so the rotation waits until the batches
+logged in the older segments are in the store. Segments left by a previous run
+are only deleted once they have been replayed.
+"""
+
+import json
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime
+from pathlib import Path
+
+from newsfeed.config.settings import DATA_DIR, get_bool_setting, get_float_setting, get_path_setting
+from newsfeed.ingestion.event import Event
+from newsfeed.processing.keywords import KeywordCounts
+
+logger = logging.getLogger(__name__)
+
+RECORD_HEADER = struct.Struct("<II")
+SEGMENT_PATTERN = "wal-*.log"
+
+# A failed write is retried this many times (after RETRY_DELAY seconds) before its batches fail
+WRITE_RETRIES = 2
+RETRY_DELAY = 0.1
+
+
+class WALClosedError(Exception):
+    """Raised when appending to a closed write-ahead log."""
+
+
+def encode_batch(filtered_events_with_counts: list[dict]) -> bytes:
+    """Encode a batch of store records as a WAL record (header + JSON payload)."""
+    payload = json.dumps([
+        {
+            "id": record['event'].id,
+            "source": record['event'].source,
+            "title": record['event'].title,
+            "body": record['event'].body,
+            "published_at": record['event'].published_at.isoformat(),
+            "kw_counts_in_title": dict(record['kw_counts_in_title']),
+            "kw_counts_in_body": dict(record['kw_counts_in_body']),
+            **({"body_preview": record['body_preview']} if 'body_preview' in record else {}),
+        }
+        for record in filtered_events_with_counts
+    ], separators=(",", ":")).encode("utf-8")
+    return RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def decode_batch(payload: bytes) -> list[dict]:
+    """Decode the JSON payload of a WAL record into store records."""
+    filtered_events_with_counts = []
+    for item in json.loads(payload):
+        record = {
+            "event": Event(item["id"], item["source"], item["title"],
+                           datetime.fromisoformat(item["published_at"]), item["body"]),
+            "kw_counts_in_title": KeywordCounts.from_counts(item["kw_counts_in_title"]),
+            "kw_counts_in_body": KeywordCounts.from_counts(item["kw_counts_in_body"]),
+        }
+        if "body_preview" in item:
+            record["body_preview"] = item["body_preview"]
+        filtered_events_with_counts.append(record)
+    return filtered_events_with_counts
+
+
+class WriteAheadLog:
+    """
+    Append-only, segmented log of ingested batches, with group commit.
+
+    The writer thread is started when the log is created, and stopped by close().
+    """
+    def __init__(self, directory: Path, commit_delay: float = 0.0, fsync: bool = True):
+        """
+        Args:
+            directory (Path): The directory of the segment files.
+            commit_delay (float): Seconds the writer waits after the first pending batch
+                before writing, to gather more batches in the same fsync (0 to write
+                right away: batches appended during an fsync are grouped anyway).
+            fsync (bool): Sync the segment file to disk after each write (disabling it
+                only protects against process crashes, not OS crashes or power losses).
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.commit_delay = commit_delay
+        self.fsync = fsync
+        self.condition = threading.Condition()
+        self.pending = []
+        self.appended_count = 0  # number of batches appended
+        self.completed_count = 0 # number of batches written and synced, or failed
+        self.failed_batches = {} # batch number -> error, for the batches whose write failed
+        self.unapplied_batches = set() # numbers of the logged batches not yet added to the store
+        self.closed = False
+        # Held while writing to the current segment, and while switching to a new one
+        self.file_lock = threading.Lock()
+        existing_segments = self.segments()
+        # Segments of a previous run may only be deleted once replayed (see rotate)
+        self.previous_segments = existing_segments
+        self.replayed_segments = set()
+        self.segment_number = int(existing_segments[-1].stem.split("-")[1]) + 1 if existing_segments else 1
+        self._open_segment()
+        self.writer = threading.Thread(target=self._run, name="wal-writer", daemon=True)
+        self.writer.start()
+
+    def _segment_path(self, number: int) -> Path:
+        return self.directory / f"wal-{number:08d}.log"
+
+    def segments(self) -> list[Path]:
+        """Return the segment files, oldest first."""
+        return sorted(self.directory.glob(SEGMENT_PATTERN))
+
+    def _open_segment(self):
+        """Start writing to the segment self.segment_number. The caller must hold the file lock (or be __init__)."""
+        self.fd = os.open(self._segment_path(self.segment_number), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self.segment_size = os.fstat(self.fd).st_size # end of the last complete record
+
+    def append(self, filtered_events_with_counts: list[dict], apply=None):
+        """
+        Append a batch of store records, and wait until it is durably written.
+
+        The batch must be logged before it is added to the store (write-ahead), so that it is
+        never served before being durable: pass the function adding it to the store as apply,
+        it is called once the batch is durable, and snapshots wait for it (see rotate).
+
+        Args:
+            filtered_events_with_counts (list[dict]): The store records of the batch.
+            apply (callable, optional): Called with the batch once it is durable (e.g. store.add_events).
+
+        Raises:
+            WALClosedError: If the log is closed.
+            OSError: If the batch could not be written (it is not applied).
+        """
+        record = encode_batch(filtered_events_with_counts)
+        with self.condition:
+            if self.closed:
+                raise WALClosedError("The write-ahead log is closed.")
+            self.pending.append(record)
+            self.appended_count += 1
+            batch_number = self.appended_count
+            if apply is not None:
+                self.unapplied_batches.add(batch_number)
+            self.condition.notify_all()
+            while self.completed_count < batch_number:
+                self.condition.wait()
+            error = self.failed_batches.pop(batch_number, None)
+        try:
+            if error is not None:
+                raise error
+            if apply is not None:
+                apply(filtered_events_with_counts)
+        finally:
+            if apply is not None:
+                with self.condition:
+                    self.unapplied_batches.discard(batch_number)
+                    self.condition.notify_all()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.closed:
+                    self.condition.wait()
+                if not self.pending:
+                    return
+            if self.commit_delay:
+                time.sleep(self.commit_delay)
+            with self.condition:
+                records, self.pending = self.pending, []
+                first_batch_number = self.appended_count - len(records) + 1
+                last_batch_number = self.appended_count
+            data = b"".join(records)
+            error = None
+            for attempt in range(WRITE_RETRIES + 1):
+                if attempt:
+                    time.sleep(RETRY_DELAY)
+                try:
+                    with self.file_lock:
+                        self._write(data)
+                    error = None
+                    break
+                except OSError as e:
+                    logger.exception(f"Failed to write to the write-ahead log (attempt {attempt + 1})")
+                    error = e
+            with self.condition:
+                if error is not None:
+                    # Only the batches of this write fail, the next ones are written again
+                    for batch_number in range(first_batch_number, last_batch_number + 1):
+                        self.failed_batches[batch_number] = error
+                self.completed_count = last_batch_number
+                self.condition.notify_all()
+
+    def _write(self, data: bytes):
+        """
+        Write and sync records to the current segment. The caller must hold the file lock.
+
+        If the write fails, the partially written records are truncated from the segment
+        (or, if that fails too, the log continues in a new segment), so that the next
+        records are not appended after a torn record.
+        """
+        try:
+            written = 0
+            while written < len(data):
+                written += os.write(self.fd, data[written:])
+            if self.fsync:
+                os.fsync(self.fd)
+        except OSError:
+            try:
+                os.ftruncate(self.fd, self.segment_size)
+            except OSError:
+                logger.exception(f"Failed to truncate {self._segment_path(self.segment_number)}, continuing in a new segment")
+                os.close(self.fd)
+                self.segment_number += 1
+                self._open_segment()
+            raise
+        self.segment_size += len(data)
+
+    def replay(self):
+        """
+        Yield the batches of store records of the segments of the previous runs, oldest first.
+
+        A truncated or corrupted record ends the replay of its segment: the rest of the
+        segment is removed (so that the segment can be replayed again), and the replay
+        continues with the next segment, as its batches were acknowledged.
+        """
+        for segment in self.previous_segments:
+            if not segment.exists():
+                continue # compacted since startup
+            data = segment.read_bytes()
+            position = 0
+            while position < len(data):
+                if position + RECORD_HEADER.size > len(data):
+                    break
+                length, crc = RECORD_HEADER.unpack_from(data, position)
+                payload = data[position + RECORD_HEADER.size:position + RECORD_HEADER.size + length]
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    break
+                yield decode_batch(payload)
+                position += RECORD_HEADER.size + length
+            if position < len(data):
+                logger.warning(f"Truncated or corrupted record in {segment} at byte {position}. "
+                               f"Discarding the rest of the segment, and replaying the next segments.")
+                with open(segment, "r+b") as f:
+                    f.truncate(position)
+            self.replayed_segments.add(segment)
+
+    def replay_into(self, store) -> int:
+        """
+        Add the logged events to the store (events already in the store are ignored).
+
+        Returns:
+            int: The number of replayed batches.
+        """
+        batch_count = 0
+        for filtered_events_with_counts in self.replay():
+            store.add_events(filtered_events_with_counts)
+            batch_count += 1
+        return batch_count
+
+    def rotate(self) -> list[Path]:
+        """
+        Continue the log in a new segment file, once the batches logged so far are in the store.
+
+        Returns:
+            list[Path]: The previous segments, which can be deleted once the events
+                currently in the store are persisted (e.g. in a snapshot). The segments
+                of a previous run which were not replayed are never returned.
+        """
+        with self.file_lock:
+            os.close(self.fd)
+            self.segment_number += 1
+            self._open_segment()
+        with self.condition:
+            # The batches logged in the previous segments must be in the store before it is snapshotted
+            last_batch_number = self.appended_count
+            while any(batch_number <= last_batch_number for batch_number in self.unapplied_batches):
+                self.condition.wait()
+        current_segment = self._segment_path(self.segment_number)
+        unreplayed_segments = set(self.previous_segments) - self.replayed_segments
+        return [segment for segment in self.segments()
+                if segment != current_segment and segment not in unreplayed_segments]
+
+    @staticmethod
+    def remove_segments(segments: list[Path]):
+        for segment in segments:
+            segment.unlink(missing_ok=True)
+
+    def close(self):
+        """Write the pending batches, stop the writer thread and close the current segment."""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.writer.join()
+        with self.file_lock:
+            os.close(self.fd)
+
+
+def create_wal_from_settings(store) -> WriteAheadLog | None:
+    """
+    Create a WriteAheadLog configured from the NEWSFEED_* settings:
+        - NEWSFEED_WAL: log the ingested events (default: false)
+        - NEWSFEED_WAL_DIR: directory of the log segments (default: data/wal)
+        - NEWSFEED_WAL_COMMIT_DELAY: seconds to wait for more batches before a write (default: 0)
+
+    Returns None when the log is disabled, or not needed by the store (the sqlite
+    store backend is already persistent).
+    """
+    if not get_bool_setting("WAL") or not hasattr(store, "snapshot"):
+        return None
+    return WriteAheadLog(
+        get_path_setting("WAL_DIR", DATA_DIR / "wal"),
+        commit_delay=get_float_setting("WAL_COMMIT_DELAY", 0.0),
+    )
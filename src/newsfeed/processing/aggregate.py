@@ -2,25 +2,45 @@
 
 from newsfeed.ingestion import reddit, rss
 from newsfeed.ingestion.event import Event
+from newsfeed.ingestion.fetch_cache import FetchCache
 
 
-def fetch_and_aggregate_events(sources_config: list) -> list[Event]:
+def fetch_source(source_config: dict, fetch_cache: FetchCache | None = None) -> list[Event]:
+    """Fetch events from a single source, dispatching on the source type.
+
+    Args:
+        source_config (dict): The configuration of the source to fetch events from.
+        fetch_cache (FetchCache, optional): The cache of the raw content of the sources,
+            which is then only downloaded when it is not cached.
+
+    Returns:
+        list[Event]: The Event objects fetched from the source (empty for unknown source types).
+    """
+    if source_config["type"] == "reddit":
+        source = reddit
+    elif source_config["type"] == "rss":
+        source = rss
+    else:
+        return []
+    if fetch_cache is None:
+        return source.fetch(source_config)
+    content = fetch_cache.fetch(source_config, lambda: source.download(source_config))
+    return source.parse(content, source_config)
+
+
+def fetch_and_aggregate_events(sources_config: list, fetch_cache: FetchCache | None = None) -> list[Event]:
     """Fetch events from all sources in config and aggregate them.
 
     Args:
         sources_config (list): A list of dictionaries, each defining a source to fetch events from.
+        fetch_cache (FetchCache, optional): The cache of the raw content of the sources.
 
     Returns:
         list[Event]: A combined list of Event objects fetched from all specified sources.
     """
     all_events = []
     for source_config in sources_config:
-        if source_config["type"] == "reddit":
-            source_events = reddit.fetch(source_config)
-        elif source_config["type"] == "rss":
-            source_events = rss.fetch(source_config)
-        else:
-            source_events = []
+        source_events = fetch_source(source_config, fetch_cache)
         all_events.extend(source_events)
 
-    return all_events
\ No newline at end of file
+    return all_events
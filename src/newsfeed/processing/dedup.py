@@ -0,0 +1,130 @@
+# Near-duplicate detection logic (MinHash + locality-sensitive hashing)
+#
+# The same story is often syndicated across several sources (e.g. Ars Technica,
+# Tom's Hardware and multiple subreddits) with different ids and slightly
+# different wording. Exact id deduplication can't catch these, so each event's
+# text is turned into a set of word shingles, summarized by a MinHash signature
+# (whose values match with a probability equal to the Jaccard similarity of the
+# shingle sets), and indexed with LSH so that candidate duplicates are found
+# without comparing against every stored event.
+#
+# References:
+#   - https://en.wikipedia.org/wiki/MinHash
+#   - Leskovec, Rajaraman, Ullman, "Mining of Massive Datasets", chapter 3
+
+import hashlib
+import random
+
+from newsfeed.processing.filter import regex_word_extractor
+
+# Number of consecutive words in a shingle
+SHINGLE_SIZE = 3
+
+# The signature is split into BANDS bands of ROWS_PER_BAND values: two events are
+# candidate duplicates when all the values of at least one band are equal. With 16
+# bands of 4 rows, pairs with a Jaccard similarity of 0.7 are found with a
+# probability of ~99%, and pairs with a similarity of 0.3 with a probability of ~12%
+BANDS = 16
+ROWS_PER_BAND = 4
+NUM_PERMUTATIONS = BANDS * ROWS_PER_BAND
+
+# Default minimum estimated Jaccard similarity of two near-duplicates
+DEFAULT_THRESHOLD = 0.7
+
+# Universal hashing h(x) = (a * x + b) mod p, with p the Mersenne prime 2^61 - 1
+MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(2025) # fixed seed: signatures must be stable across runs
+PERMUTATIONS = [(_rng.randrange(1, MERSENNE_PRIME), _rng.randrange(0, MERSENNE_PRIME))
+                for _ in range(NUM_PERMUTATIONS)]
+
+
+def shingle(text: str, size: int = SHINGLE_SIZE) -> set[str]:
+    """
+    Split a text into the set of its lowercase word n-grams ("shingles").
+    Texts shorter than the shingle size give a single shingle.
+    """
+    words = regex_word_extractor(text.lower())
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def minhash_signature(shingles: set[str]) -> tuple[int, ...]:
+    """
+    Compute the MinHash signature of a set of shingles: for each of the hash
+    permutations, the minimum hash value over all the shingles.
+    """
+    if not shingles:
+        return ()
+    shingle_hashes = [
+        int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little")
+        for s in shingles
+    ]
+    return tuple(
+        min((a * h + b) % MERSENNE_PRIME for h in shingle_hashes)
+        for a, b in PERMUTATIONS
+    )
+
+
+def estimate_similarity(signature_1: tuple[int, ...], signature_2: tuple[int, ...]) -> float:
+    """
+    Estimate the Jaccard similarity of two shingle sets from their MinHash signatures.
+    """
+    if not signature_1 or not signature_2:
+        return 0.0
+    equal_values = sum(1 for v1, v2 in zip(signature_1, signature_2) if v1 == v2)
+    return equal_values / len(signature_1)
+
+
+def event_signature(title: str, body_text: str | None) -> tuple[int, ...]:
+    """
+    Compute the MinHash signature of an event from its title and plain text body.
+    """
+    return minhash_signature(shingle(f"{title} {body_text or ''}"))
+
+
+class NearDuplicateIndex:
+    """
+    LSH index of MinHash signatures, answering "is there a stored event similar
+    to this one?" by only comparing with the events sharing at least one band.
+    """
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD):
+        self.threshold = threshold
+        # one dict per band: band values -> ids of the events with these values
+        self.band_buckets = [{} for _ in range(BANDS)]
+        self.signatures = {}
+
+    def find_duplicate(self, signature: tuple[int, ...]) -> str | None:
+        """
+        Return the id of an indexed event whose estimated similarity with the given
+        signature reaches the threshold (the most similar one), or None.
+        """
+        if not signature:
+            return None
+        candidate_ids = set()
+        for band, buckets in enumerate(self.band_buckets):
+            candidate_ids.update(buckets.get(self._band_key(signature, band), ()))
+
+        best_id, best_similarity = None, 0.0
+        for candidate_id in sorted(candidate_ids): # sorted, for deterministic ties
+            similarity = estimate_similarity(signature, self.signatures[candidate_id])
+            if similarity >= self.threshold and similarity > best_similarity:
+                best_id, best_similarity = candidate_id, similarity
+        return best_id
+
+    def add(self, event_id: str, signature: tuple[int, ...]):
+        """Index the signature of an event."""
+        if not signature:
+            return
+        self.signatures[event_id] = signature
+        for band, buckets in enumerate(self.band_buckets):
+            buckets.setdefault(self._band_key(signature, band), []).append(event_id)
+
+    def clear(self):
+        self.signatures.clear()
+        for buckets in self.band_buckets:
+            buckets.clear()
+
+    @staticmethod
+    def _band_key(signature: tuple[int, ...], band: int) -> tuple[int, ...]:
+        return signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
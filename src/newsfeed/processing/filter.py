@@ -1,6 +1,8 @@
 # Filtering logic
 
 from newsfeed.ingestion.event import Event
+from newsfeed.processing.keywords import EMPTY_KEYWORD_COUNTS, KeywordCounts
+from newsfeed.processing.preprocess import html_to_text, make_body_preview
 from collections import Counter
 import re 
 
@@ -8,6 +10,10 @@ import re
 def keyword_based_filter(all_events : list[Event], keywords : list[str]) -> list[dict[str, object]]:
     """Filter events based on presence of specified keywords in title or body.
 
+    The body is converted from HTML to plain text once, so that keywords are only
+    matched against the text content (and not tag or attribute names). A short
+    preview of the plain text is kept for display.
+
     Args:
         all_events (list[Event]):  The list of Event instances to be filtered.
         keywords (list[str]):A list of target keywords used for filtering.
@@ -15,22 +21,27 @@ def keyword_based_filter(all_events : list[Event], keywords : list[str]) -> list
     Returns:
         list[Event]: A list of dictionaries for events whose title or body contains at least one keyword.
             - 'event' (Event): The matching Event object.
-            - 'kw_counts_in_title' (dict[str, int]): Keyword counts found in the title.
-            - 'kw_counts_in_body' (dict[str, int]): Keyword counts found in the body.
+            - 'kw_counts_in_title' (KeywordCounts): Keyword counts found in the title (a read-only dict).
+            - 'kw_counts_in_body' (KeywordCounts): Keyword counts found in the body (a read-only dict).
+            - 'body_preview' (str | None): The first characters of the plain text body.
     """
     keywords_lower = [keyword.lower() for keyword in keywords]
     keyword_set = set(keywords_lower) # store keywords in a set for fast O(1) lookup
     filtered_events_with_counts = []
     for event in all_events:
-        kw_counts_in_title, kw_counts_in_body = {}, {}
-        kw_counts_in_title = count_keywords_occurences_regex(event.title, keyword_set)
+        kw_counts_in_body = EMPTY_KEYWORD_COUNTS
+        body_text = None
+        # Keyword counts are stored compactly, with interned keyword ids (see keywords.py)
+        kw_counts_in_title = KeywordCounts.from_counts(count_keywords_occurences_regex(event.title, keyword_set))
         if event.body: # Check if body is not None before splitting
-            kw_counts_in_body = count_keywords_occurences_regex(event.body, keyword_set)
+            body_text = html_to_text(event.body)
+            kw_counts_in_body = KeywordCounts.from_counts(count_keywords_occurences_regex(body_text, keyword_set))
         if kw_counts_in_title or kw_counts_in_body:
             filtered_events_with_counts.append({
                 "event": event,
                 "kw_counts_in_title": kw_counts_in_title,
-                "kw_counts_in_body": kw_counts_in_body
+                "kw_counts_in_body": kw_counts_in_body,
+                "body_preview": make_body_preview(body_text) if body_text else None,
             })
     return filtered_events_with_counts
 
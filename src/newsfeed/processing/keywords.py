@@ -0,0 +1,120 @@
+# Keyword interning and compact keyword counts
+#
+# Every filtered event carries the counts of the keywords found in its title and in
+# its body. Instead of a dict per event repeating the keyword strings, the counts are
+# KeywordCounts: sparse (keyword id, count) pairs packed in a single bytes object,
+# where keyword ids index a process-wide vocabulary. KeywordCounts behave like
+# read-only dicts, and only decode the keyword ids back to keywords when they are
+# iterated or displayed. Ranking functions look up the weights of the keywords by id.
+
+import array
+import threading
+from collections.abc import Iterable, Mapping
+
+# Type of the packed keyword ids and counts (unsigned 32-bit integers)
+PAIR_TYPECODE = "I"
+PAIR_SIZE = 2 * array.array(PAIR_TYPECODE).itemsize
+
+
+class KeywordVocabulary:
+    """
+    Append-only mapping between keywords and integer ids (0, 1, 2, ...).
+    """
+    def __init__(self, keywords: Iterable[str] = ()):
+        self.keywords = []
+        self.ids = {}
+        self.lock = threading.Lock()
+        for keyword in keywords:
+            self.intern(keyword)
+
+    def __len__(self) -> int:
+        return len(self.keywords)
+
+    def intern(self, keyword: str) -> int:
+        """Return the id of a keyword, adding it to the vocabulary if needed."""
+        keyword_id = self.ids.get(keyword)
+        if keyword_id is None:
+            with self.lock:
+                keyword_id = self.ids.get(keyword)
+                if keyword_id is None:
+                    keyword_id = len(self.keywords)
+                    self.keywords.append(keyword)
+                    self.ids[keyword] = keyword_id
+        return keyword_id
+
+
+# Vocabulary of all the keyword counts of the process. Ids are process-local:
+# KeywordCounts are pickled with their keywords, not their ids.
+vocabulary = KeywordVocabulary()
+
+
+class KeywordCounts(Mapping):
+    """
+    Read-only mapping of keywords to their number of occurrences, stored as packed
+    (keyword id, count) pairs. Compares equal to a dict with the same counts.
+    """
+    __slots__ = ("data",)
+
+    def __init__(self, data: bytes = b""):
+        """
+        Args:
+            data (bytes): The packed (keyword id, count) pairs (see from_counts).
+        """
+        self.data = data
+
+    @classmethod
+    def from_counts(cls, counts: Mapping[str, int]) -> "KeywordCounts":
+        """Create the KeywordCounts of a keyword -> count mapping (returned as is if it already is one)."""
+        if isinstance(counts, KeywordCounts):
+            return counts
+        return cls.from_items(counts.items())
+
+    @classmethod
+    def from_items(cls, items: Iterable[tuple[str, int]]) -> "KeywordCounts":
+        """Create the KeywordCounts of (keyword, count) pairs."""
+        intern = vocabulary.intern
+        pairs = array.array(PAIR_TYPECODE)
+        for keyword, count in items:
+            pairs.append(intern(keyword))
+            pairs.append(count)
+        return cls(pairs.tobytes()) if pairs else EMPTY_KEYWORD_COUNTS
+
+    def keyword_ids(self) -> memoryview:
+        """Return the ids of the keywords (see vocabulary), without decoding them."""
+        return memoryview(self.data).cast(PAIR_TYPECODE)[::2]
+
+    def __len__(self) -> int:
+        return len(self.data) // PAIR_SIZE
+
+    def __iter__(self):
+        keywords = vocabulary.keywords
+        return (keywords[keyword_id] for keyword_id in self.keyword_ids())
+
+    def __getitem__(self, keyword: str) -> int:
+        keyword_id = vocabulary.ids.get(keyword)
+        pairs = memoryview(self.data).cast(PAIR_TYPECODE)
+        for i in range(0, len(pairs), 2):
+            if pairs[i] == keyword_id:
+                return pairs[i + 1]
+        raise KeyError(keyword)
+
+    def __contains__(self, keyword) -> bool:
+        keyword_id = vocabulary.ids.get(keyword)
+        return keyword_id is not None and keyword_id in self.keyword_ids()
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, KeywordCounts) and self.data == other.data:
+            return True
+        return Mapping.__eq__(self, other)
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return repr(dict(self.items()))
+
+    def __reduce__(self):
+        # Keyword ids are only valid in this process: pickle the keywords
+        return (KeywordCounts.from_items, (list(self.items()),))
+
+
+EMPTY_KEYWORD_COUNTS = KeywordCounts()
@@ -0,0 +1,69 @@
+# Body preprocessing logic (run once per event, at ingest time)
+
+from html.parser import HTMLParser
+import re
+
+# Number of characters of the body kept as a preview for display
+BODY_PREVIEW_LENGTH = 200
+
+# Content of these tags is never displayed, so it is not part of the text
+SKIPPED_TAGS = {"script", "style", "head", "title", "noscript"}
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+class HTMLTextExtractor(HTMLParser):
+    """
+    Collect the text content of an HTML document, ignoring tags, attributes,
+    comments and the content of script/style elements.
+    Character references (e.g. &amp;) are converted to the corresponding characters.
+    """
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.text_parts = []
+        self.skipped_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIPPED_TAGS:
+            self.skipped_depth += 1
+        # Tags separate words (e.g. "<p>one</p><p>two</p>" must not become "onetwo")
+        self.text_parts.append(" ")
+
+    def handle_endtag(self, tag):
+        if tag in SKIPPED_TAGS and self.skipped_depth:
+            self.skipped_depth -= 1
+        self.text_parts.append(" ")
+
+    def handle_data(self, data):
+        if not self.skipped_depth:
+            self.text_parts.append(data)
+
+    def get_text(self) -> str:
+        return "".join(self.text_parts)
+
+
+def html_to_text(html: str) -> str:
+    """
+    Extract the plain text from an HTML string, with whitespace runs collapsed into single spaces.
+
+    Args:
+        html (str): The (possibly HTML) text to convert, e.g. an RSS <content:encoded> body.
+
+    Returns:
+        str: The plain text content.
+    """
+    # Fast path: plain text bodies (e.g. Reddit posts) don't need to be parsed
+    if "<" not in html and "&" not in html:
+        return WHITESPACE_PATTERN.sub(" ", html).strip()
+
+    extractor = HTMLTextExtractor()
+    extractor.feed(html)
+    extractor.close()
+    return WHITESPACE_PATTERN.sub(" ", extractor.get_text()).strip()
+
+
+def make_body_preview(body_text: str, max_length: int = BODY_PREVIEW_LENGTH) -> str:
+    """
+    Truncate a plain text body to the first max_length characters, for display.
+    """
+    return body_text[:max_length] + "..." if len(body_text) > max_length else body_text
@@ -0,0 +1,176 @@
+# Configurable ranking functions
+#
+# score_events (score.py) is the reference implementation of the default ranking,
+# with hardcoded weights. A RankingFunction computes the same scores from the
+# weights of ranking_config.yaml, compiled once into a keyword -> weight mapping
+# for titles and for bodies, so the importance of an event is a sparse dot
+# product of these weights with its keyword presence vector. The weights are also
+# laid out as tables indexed by keyword id (see keywords.py), so the importance of
+# KeywordCounts is a table lookup per keyword. As it only depends on the event,
+# the store computes it once, at ingest time. The recency decay
+# curve is looked up in a registry, and evaluated over the ages of all the
+# ranked events in a single call.
+
+import math
+from datetime import datetime, timezone
+
+from newsfeed.config.loader import load_keywords_config, load_ranking_config
+from newsfeed.processing.keywords import KeywordCounts, vocabulary
+from newsfeed.processing.score import build_keyword_tiers
+from newsfeed.utils.helpers import convert_dt_to_us
+
+# Decay curves, by name: functions mapping a list of event ages (in hours) to their recency scores
+DECAY_FUNCTIONS = {}
+
+
+def register_decay(name: str):
+    """
+    Decorator registering a decay curve under the given name, so it can be selected
+    in the ranking configuration. The function receives the list of event ages
+    (in hours) followed by the parameters of the configuration as keyword arguments,
+    and returns the list of recency scores.
+    """
+    def decorator(decay_function):
+        DECAY_FUNCTIONS[name] = decay_function
+        return decay_function
+    return decorator
+
+
+@register_decay("hyperbolic")
+def hyperbolic_decay(ages_hours: list[float], coef: float = 0.1) -> list[float]:
+    """1 / (coef × age_hours + 1): the decay of score_events (a smaller coef decays slower)."""
+    return [1 / (coef * age_hours + 1) for age_hours in ages_hours]
+
+
+@register_decay("exponential")
+def exponential_decay(ages_hours: list[float], rate: float = 0.1) -> list[float]:
+    """exp(-rate × age_hours)"""
+    exp = math.exp
+    return [exp(-rate * age_hours) for age_hours in ages_hours]
+
+
+@register_decay("half_life")
+def half_life_decay(ages_hours: list[float], half_life_hours: float = 24) -> list[float]:
+    """0.5 ^ (age_hours / half_life_hours): the score halves every half_life_hours."""
+    return [0.5 ** (age_hours / half_life_hours) for age_hours in ages_hours]
+
+
+class RankingFunction:
+    """
+    Ranking by Importance Score × Recency Score, compiled from the keywords and ranking configurations.
+    """
+    def __init__(self, keywords_config: dict, ranking_config: dict):
+        """
+        Args:
+            keywords_config (dict): The keywords configuration (see load_keywords_config).
+            ranking_config (dict): The ranking configuration (see load_ranking_config).
+
+        Raises:
+            ValueError: If the decay function of the configuration is not registered.
+        """
+        self.keyword_tiers = build_keyword_tiers(keywords_config)
+        tier_weights = ranking_config['tier_weights']
+        location_weights = ranking_config['location_weights']
+        self.title_weights = {keyword: location_weights['title'] * tier_weights[tier]
+                              for keyword, tier in self.keyword_tiers.items()}
+        self.body_weights = {keyword: location_weights['body'] * tier_weights[tier]
+                             for keyword, tier in self.keyword_tiers.items()}
+        for keyword in self.keyword_tiers:
+            vocabulary.intern(keyword)
+        self.weight_tables = self.build_weight_tables()
+
+        decay_params = dict(ranking_config['decay'])
+        decay_name = decay_params.pop('function')
+        if decay_name not in DECAY_FUNCTIONS:
+            raise ValueError(f"Unknown decay function: {decay_name}. Available: {', '.join(DECAY_FUNCTIONS)}")
+        self.decay_function = DECAY_FUNCTIONS[decay_name]
+        self.decay_params = decay_params
+
+    @classmethod
+    def from_config(cls) -> "RankingFunction":
+        """Create the ranking function of the YAML configuration files."""
+        return cls(load_keywords_config(), load_ranking_config())
+
+    @property
+    def keywords(self) -> list[str]:
+        """The (lowercase) keywords of the ranking, which are the keywords events are filtered by."""
+        return list(self.keyword_tiers)
+
+    def build_weight_tables(self) -> tuple[list[float], list[float]]:
+        """Lay out the title and body weights as lists indexed by keyword id (0 for the other keywords)."""
+        keywords = vocabulary.keywords[:]
+        return ([self.title_weights.get(keyword, 0) for keyword in keywords],
+                [self.body_weights.get(keyword, 0) for keyword in keywords])
+
+    def importance(self, event_with_counts: dict) -> float:
+        """
+        Compute the importance score of an event: the sum of the weights of the
+        distinct keywords found in its title and in its body.
+        """
+        title_counts, body_counts = event_with_counts['kw_counts_in_title'], event_with_counts['kw_counts_in_body']
+        if isinstance(title_counts, KeywordCounts) and isinstance(body_counts, KeywordCounts):
+            title_table, body_table = self.weight_tables
+            if len(title_table) < len(vocabulary): # keywords interned since the tables were built
+                self.weight_tables = self.build_weight_tables()
+                title_table, body_table = self.weight_tables
+            # Same additions in the same order as below, so the scores are identical
+            return (sum(title_table[i] for i in title_counts.keyword_ids())
+                    + sum(body_table[i] for i in body_counts.keyword_ids()))
+        title_weights, body_weights = self.title_weights, self.body_weights
+        return (sum(title_weights.get(kw, 0) for kw in event_with_counts['kw_counts_in_title'])
+                + sum(body_weights.get(kw, 0) for kw in event_with_counts['kw_counts_in_body']))
+
+    def recency(self, published_us, now: datetime | None = None) -> tuple[list[float], list[float]]:
+        """
+        Compute the ages (in hours) and recency scores of events from their publication times.
+
+        Args:
+            published_us (Iterable[int]): The publication times of the events, in microseconds
+                since the epoch (see convert_dt_to_us).
+            now (datetime, optional): The time the ages are computed at (defaults to the current time).
+
+        Returns:
+            tuple[list[float], list[float]]: The ages in hours and the recency scores.
+        """
+        now_us = convert_dt_to_us(now if now is not None else datetime.now(timezone.utc))
+        # Same computation as timedelta.total_seconds() / 3600, from exact integer microseconds
+        ages_hours = [(now_us - us) / 10**6 / 3600 for us in published_us]
+        return ages_hours, self.decay_function(ages_hours, **self.decay_params)
+
+    def score(self, events_with_counts: list[dict], importance_scores: list[float] | None = None,
+              published_us: list[int] | None = None, now: datetime | None = None) -> list[dict]:
+        """
+        Score events by importance and recency, like score_events (same output records).
+
+        Args:
+            events_with_counts (list[dict]): The filtered events with their keyword counts.
+            importance_scores (list[float], optional): The importance score of each event,
+                if already computed (e.g. at ingest time).
+            published_us (list[int], optional): The publication time of each event in
+                microseconds since the epoch (see convert_dt_to_us), if already computed.
+            now (datetime, optional): The time the ages of the events are computed at
+                (defaults to the current time).
+
+        Returns:
+            list[dict]: The events with their scores (see score_events).
+        """
+        if importance_scores is None:
+            importance_scores = [self.importance(e) for e in events_with_counts]
+        if published_us is None:
+            published_us = [convert_dt_to_us(e['event'].published_at) for e in events_with_counts]
+        ages_hours, recency_scores = self.recency(published_us, now)
+
+        return [
+            {
+                "event": event_with_counts['event'],
+                "total_score": importance_score * recency_score,
+                "importance_score": importance_score,
+                "recency_score": recency_score,
+                "age_hours": age_hours,
+                "kw_counts_in_title": event_with_counts['kw_counts_in_title'],
+                "kw_counts_in_body": event_with_counts['kw_counts_in_body'],
+                "body_preview": event_with_counts.get('body_preview'),
+            }
+            for event_with_counts, importance_score, recency_score, age_hours
+            in zip(events_with_counts, importance_scores, recency_scores, ages_hours)
+        ]
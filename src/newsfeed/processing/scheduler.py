@@ -0,0 +1,178 @@
+# Adaptive per-source polling logic
+
+import logging
+import random
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from newsfeed.ingestion.event import Event
+from newsfeed.ingestion.fetch_cache import FetchCache
+from newsfeed.processing.aggregate import fetch_source
+from newsfeed.utils.helpers import convert_dt_to_ts
+
+logger = logging.getLogger(__name__)
+
+# Default polling bounds (in seconds), which can be overridden per source in
+# sources_config.yaml with the `min_interval`, `max_interval` and `interval` keys
+DEFAULT_MIN_INTERVAL = 30
+DEFAULT_MAX_INTERVAL = 900
+DEFAULT_INITIAL_INTERVAL = 60
+
+# Randomly spread each poll by +/- 10% so sources don't stay in lockstep
+DEFAULT_JITTER = 0.1
+
+# Number of recent publication timestamps used to estimate a source's publish rate
+PUBLISH_HISTORY_SIZE = 20
+
+
+@dataclass
+class SourceState:
+    """Polling state and statistics tracked for one source."""
+    source_config: dict
+    interval: float
+    min_interval: float
+    max_interval: float
+    next_poll_at: float = 0.0 # due immediately
+    seen_ids: set[str] = field(default_factory=set) # ids returned by the last successful poll
+    publish_timestamps: deque = field(default_factory=lambda: deque(maxlen=PUBLISH_HISTORY_SIZE))
+    polls: int = 0
+    changed_polls: int = 0 # polls which returned at least one new event
+    consecutive_errors: int = 0
+
+    @property
+    def name(self) -> str:
+        return self.source_config["name"]
+
+    @property
+    def change_frequency(self) -> float:
+        """Fraction of polls which returned new events."""
+        return self.changed_polls / self.polls if self.polls else 0.0
+
+    def mean_publish_gap(self) -> float | None:
+        """Average number of seconds between two publications, if it can be estimated."""
+        if len(self.publish_timestamps) < 2:
+            return None
+        timestamps = sorted(self.publish_timestamps)
+        gap = (timestamps[-1] - timestamps[0]) / (len(timestamps) - 1)
+        return gap if gap > 0 else None
+
+
+class PollingScheduler:
+    """
+    Poll each source on its own adaptive interval.
+
+    Sources that publish often are polled more frequently, and slow sources less
+    frequently, within the [min_interval, max_interval] bounds of each source.
+    Due sources are fetched concurrently, and only events not seen in the previous
+    poll of a source are returned, so downstream processing only handles new events.
+    The raw content of the sources can be cached (see fetch_cache.py).
+    """
+
+    def __init__(self, sources_config: list[dict], max_workers: int = 8, jitter: float = DEFAULT_JITTER,
+                 clock=time.monotonic, fetch_cache: FetchCache | None = None):
+        self.fetch_cache = fetch_cache
+        self.jitter = jitter
+        self.clock = clock
+        self.max_workers = max_workers
+        self.states = []
+        for source_config in sources_config:
+            min_interval = source_config.get("min_interval", DEFAULT_MIN_INTERVAL)
+            max_interval = source_config.get("max_interval", DEFAULT_MAX_INTERVAL)
+            interval = source_config.get("interval", DEFAULT_INITIAL_INTERVAL)
+            self.states.append(SourceState(
+                source_config=source_config,
+                interval=min(max(interval, min_interval), max_interval),
+                min_interval=min_interval,
+                max_interval=max_interval,
+            ))
+
+    def due_sources(self) -> list[SourceState]:
+        """Return the sources whose next poll time has been reached."""
+        now = self.clock()
+        return [state for state in self.states if state.next_poll_at <= now]
+
+    def seconds_until_next_poll(self) -> float:
+        """Return the number of seconds until the next source is due (0 if one is already due)."""
+        if not self.states:
+            return float(DEFAULT_MAX_INTERVAL)
+        next_poll_at = min(state.next_poll_at for state in self.states)
+        return max(0.0, next_poll_at - self.clock())
+
+    def poll_due_sources(self) -> list[Event]:
+        """
+        Fetch all due sources concurrently and reschedule them.
+
+        Returns:
+            list[Event]: The events which were not returned by the previous poll of their source.
+        """
+        due_states = self.due_sources()
+        if not due_states:
+            return []
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(due_states))) as executor:
+            futures = [(state, executor.submit(fetch_source, state.source_config, fetch_cache=self.fetch_cache)) for state in due_states]
+
+        new_events = []
+        for state, future in futures:
+            try:
+                source_events = future.result()
+            except Exception as e:
+                logger.error(f"Failed to fetch source {state.name}: {e}")
+                self.record_error(state)
+                continue
+            new_events.extend(self.record_success(state, source_events))
+        return new_events
+
+    def record_success(self, state: SourceState, source_events: list[Event]) -> list[Event]:
+        """
+        Update the statistics of a source after a successful poll, and schedule its next poll.
+
+        Returns:
+            list[Event]: The events which were not returned by the previous poll.
+        """
+        new_events = [event for event in source_events if event.id not in state.seen_ids]
+        # Only remember the ids of the latest poll, feeds only return their most recent entries
+        state.seen_ids = {event.id for event in source_events}
+
+        state.polls += 1
+        state.consecutive_errors = 0
+        if new_events:
+            state.changed_polls += 1
+            state.publish_timestamps.extend(convert_dt_to_ts(event.published_at) for event in new_events)
+
+        state.interval = self.compute_interval(state, found_new_events=bool(new_events))
+        self.schedule_next_poll(state, state.interval)
+        logger.info(f"Polled {state.name}: {len(new_events)} new events, next poll in {state.interval:.0f}s")
+        return new_events
+
+    def record_error(self, state: SourceState):
+        """Back off exponentially after consecutive failed polls of a source."""
+        state.consecutive_errors += 1
+        backoff = min(state.max_interval, state.interval * 2 ** state.consecutive_errors)
+        self.schedule_next_poll(state, backoff)
+
+    def compute_interval(self, state: SourceState, found_new_events: bool) -> float:
+        """
+        Compute the polling interval of a source from its observed publish rate.
+
+        When the average gap between publications is known, the source is polled
+        twice per expected publication. Otherwise the interval is halved when new
+        events were found, and increased by 50% when the poll returned nothing new.
+        """
+        mean_publish_gap = state.mean_publish_gap()
+        if mean_publish_gap is not None:
+            interval = mean_publish_gap / 2
+            # A source which rarely changes between polls can be polled less often
+            if state.polls >= 5 and state.change_frequency < 0.5:
+                interval = max(interval, state.interval * 1.5)
+        elif found_new_events:
+            interval = state.interval / 2
+        else:
+            interval = state.interval * 1.5
+        return min(max(interval, state.min_interval), state.max_interval)
+
+    def schedule_next_poll(self, state: SourceState, interval: float):
+        jittered_interval = interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+        state.next_poll_at = self.clock() + jittered_interval
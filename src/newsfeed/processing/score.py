@@ -3,13 +3,41 @@ from newsfeed.ingestion.event import Event
 from datetime import datetime
 from zoneinfo import ZoneInfo
 
+# Keyword priority tiers, from highest to lowest priority
+KEYWORD_TIERS = ("high", "medium", "low")
+
+
+def build_keyword_tiers(keywords_config: dict) -> dict[str, str]:
+    """
+    Map each (lowercase) keyword of the configuration to its priority tier.
+
+    A keyword listed in several tiers belongs to the highest one, consistently with score_events.
+
+    Args:
+        keywords_config (dict): The keywords configuration (see load_keywords_config).
+
+    Returns:
+        dict[str, str]: The tier ("high", "medium" or "low") of each keyword.
+    """
+    keyword_tiers = {}
+    for tier in reversed(KEYWORD_TIERS): # higher tiers overwrite lower ones
+        for keyword in keywords_config[f'{tier}_priority_keywords']:
+            keyword_tiers[keyword.lower()] = tier
+    return keyword_tiers
+
+
 def score_events(events_with_counts: list[dict[str, object]], 
                 high_priority_keywords: list[str], 
                 medium_priority_keywords: list[str], 
                 low_priority_keywords: list[str],
+                now: datetime | None = None,
                 ) -> list[dict[str, object]]:
     """
     Score events by importance and recency, returning them sorted by total score.
+
+    This is the reference implementation of the default ranking: the store ranks
+    events with a RankingFunction (ranking.py), configured by ranking_config.yaml,
+    which must give the same scores with the default configuration.
     
     Calculates a total score for each event using:
     Total Score = Importance Score × Recency Score
@@ -33,6 +61,8 @@ def score_events(events_with_counts: list[dict[str, object]],
         high_priority_keywords (list[str]): Keywords worth 3 points base score
         medium_priority_keywords (list[str]): Keywords worth 2 points base score  
         low_priority_keywords (list[str]): Keywords worth 1 point base score
+        now (datetime, optional): The time the ages of the events are computed at
+            (defaults to the current time, read for each event)
 
     Returns:
         list[dict[str, object]]: List of dictionaries with scores and metadata, containing:
@@ -43,6 +73,7 @@ def score_events(events_with_counts: list[dict[str, object]],
             - 'age_hours': Hours since publication
             - 'kw_counts_in_title': Original keyword counts in title
             - 'kw_counts_in_body': Original keyword counts in body
+            - 'body_preview': Plain text preview of the body (None if not available)
     """
 
     high_set = set(keyword.lower() for keyword in high_priority_keywords)
@@ -104,7 +135,7 @@ def score_events(events_with_counts: list[dict[str, object]],
         # print(f"low_priority_body_counts: {low_priority_body_counts}")
 
 
-        recency_score_dict = compute_recency_score(event_with_counts['event'].published_at)
+        recency_score_dict = compute_recency_score(event_with_counts['event'].published_at, now)
         recency_score = recency_score_dict["recency_score"]
         age_hours = recency_score_dict["age_hours"]
 
@@ -137,6 +168,7 @@ def score_events(events_with_counts: list[dict[str, object]],
             "age_hours": age_hours,
             "kw_counts_in_title": event_with_counts['kw_counts_in_title'],
             "kw_counts_in_body": event_with_counts['kw_counts_in_body'],                
+            "body_preview": event_with_counts.get('body_preview'),
             }
         )
     
@@ -144,15 +176,17 @@ def score_events(events_with_counts: list[dict[str, object]],
 
 
 
-def compute_recency_score(published_at: datetime) -> dict[str, float]:
+def compute_recency_score(published_at: datetime, now: datetime | None = None) -> dict[str, float]:
     """
     Compute recency score, making sure datetime is timezone-aware in UTC.
+    The age is computed at `now` (a timezone-aware datetime), defaulting to the current time.
     """
     # If datetime is naive, assume it's UTC (optional fallback)
     if published_at.tzinfo is None:
         published_at = published_at.replace(tzinfo=ZoneInfo("UTC"))
 
-    now = datetime.now(ZoneInfo("UTC"))
+    if now is None:
+        now = datetime.now(ZoneInfo("UTC"))
     age_hours = (now - published_at).total_seconds() / 3600
 
     # formula for calculating recency score with a slow decay.
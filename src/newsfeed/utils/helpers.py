@@ -1,9 +1,24 @@
 # Helper functions
 
-from datetime import datetime
+from datetime import datetime, timedelta
+from functools import lru_cache
 from zoneinfo import ZoneInfo
+import calendar
+import importlib.util
+import sys
+import threading
 import time
 
+UTC = ZoneInfo("UTC")
+UNIX_EPOCH = datetime(1970, 1, 1, tzinfo=UTC)
+
+
+@lru_cache(maxsize=None)
+def get_timezone(iana_timezone: str) -> ZoneInfo:
+    """Return the timezone object of an IANA timezone string, created once per timezone."""
+    return ZoneInfo(iana_timezone)
+
+
 def convert_ts_to_dt(timestamp, iana_timezone="UTC"):
     """
     Convert a POSIX timestamp to a timezone-aware datetime object.
@@ -20,7 +35,7 @@ def convert_ts_to_dt(timestamp, iana_timezone="UTC"):
         - https://docs.python.org/3/library/datetime.html#datetime.datetime.fromtimestamp
         - https://docs.python.org/3/library/zoneinfo.html#using-zoneinfo
     """
-    return datetime.fromtimestamp(timestamp, tz=ZoneInfo(iana_timezone))
+    return datetime.fromtimestamp(timestamp, tz=get_timezone(iana_timezone))
     
 
 def convert_structtime_to_dt(structtime: time.struct_time, iana_timezone="UTC"):
@@ -39,14 +54,109 @@ def convert_structtime_to_dt(structtime: time.struct_time, iana_timezone="UTC"):
         - https://docs.python.org/3/library/datetime.html#datetime-objects
         - https://docs.python.org/3/library/zoneinfo.html#using-zoneinfo
     """
-    # Extract (year, month, day, hour, minute, second) from struct_time (e.g. (2025, 7, 21, 16, 25, 47))
-    date_tuple = structtime[:6]
+    # Unpack (year, month, day, hour, minute, second) from struct_time into the datetime
+    # constructor, with the timezone info (e.g. 2025-07-21 16:25:47+00:00 for UTC)
+    return datetime(*structtime[:6], tzinfo=get_timezone(iana_timezone))
 
-    # Unpack date_tuple into datetime constructor (e.g. 2025-07-21 16:25:47)
-    dt_no_tz = datetime(*date_tuple)
 
-    # Attach timezone info (e.g. 2025-07-21 16:25:47+00:00 for UTC)
-    dt_with_tz = dt_no_tz.replace(tzinfo=ZoneInfo(iana_timezone))
-    
-    return dt_with_tz
-    
\ No newline at end of file
+def convert_structtime_to_ts(structtime: time.struct_time) -> int:
+    """Convert a time.struct_time in UTC (e.g. a feedparser *_parsed date) to a POSIX timestamp.
+
+    Args:
+        structtime (time.struct_time): The struct_time to convert, in UTC.
+
+    Returns:
+        int: The POSIX timestamp (seconds since Unix epoch).
+    """
+    return calendar.timegm(structtime)
+
+
+def convert_dt_to_ts(dt: datetime) -> float:
+    """Convert a datetime object to a POSIX timestamp.
+
+    Naive datetimes are assumed to be in UTC (consistent with the ranking logic),
+    rather than in the local time of the machine.
+
+    Args:
+        dt (datetime): The datetime to convert, naive or timezone-aware.
+
+    Returns:
+        float: The POSIX timestamp (seconds since Unix epoch).
+    """
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=UTC)
+    return dt.timestamp()
+
+
+def convert_dt_to_us(dt: datetime) -> int:
+    """Convert a datetime object to an integer number of microseconds since the Unix epoch.
+
+    Unlike float timestamps, the result is exact: the difference of two converted
+    datetimes is exactly the number of microseconds between them.
+
+    Args:
+        dt (datetime): The datetime to convert, naive (assumed to be in UTC) or timezone-aware.
+
+    Returns:
+        int: The number of microseconds since the Unix epoch.
+    """
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=UTC)
+    return (dt - UNIX_EPOCH) // timedelta(microseconds=1)
+
+
+def lazy_import(module_name: str):
+    """
+    Return a module object whose actual import is deferred until one of its
+    attributes is first accessed.
+
+    Heavy third-party libraries (praw, feedparser, requests, ...) are only needed
+    on the code paths that fetch news, so importing them lazily keeps the startup
+    time of the API server and the CLI low.
+
+    Args:
+        module_name (str): The fully qualified name of the module to import.
+
+    Returns:
+        module: The module (already imported, or a lazy proxy that loads on first use).
+
+    References:
+        - https://docs.python.org/3/library/importlib.html#implementing-lazy-imports
+    """
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+
+    spec = importlib.util.find_spec(module_name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{module_name}'", name=module_name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    loader.exec_module(module)
+    return module
+
+
+# Loading a lazy module is not thread-safe before Python 3.12.3: while a thread
+# executes the module, other threads already see it, without its attributes
+lazy_load_lock = threading.Lock()
+loaded_lazy_modules = set() # ids of the modules loaded by load_lazy_module
+
+def load_lazy_module(module):
+    """
+    Finish loading a module returned by lazy_import, if it is not loaded yet.
+
+    Code which may be the first to use a lazy module from several threads at once
+    (e.g. the sources fetched concurrently) calls this first.
+
+    Args:
+        module (module): A module returned by lazy_import.
+
+    Returns:
+        module: The loaded module.
+    """
+    if id(module) not in loaded_lazy_modules:
+        with lazy_load_lock:
+            getattr(module, "__name__") # any attribute access loads the module
+            loaded_lazy_modules.add(id(module))
+    return module
@@ -0,0 +1,76 @@
+"""
+Instrumented locks, to measure lock contention.
+
+A TimedLock behaves like a threading.Lock, and records how many times it was
+acquired, how long callers waited for it and how long they held it. The stats
+are broken down by operation (e.g. the API endpoint being served), which is
+read from a context variable set by the caller (see the /stats endpoint).
+"""
+
+import contextvars
+import threading
+import time
+
+from newsfeed.utils.profiling import record_span
+
+# Name of the operation the current thread/task is performing, e.g. "/retrieve"
+current_operation = contextvars.ContextVar("current_operation", default="other")
+
+
+class TimedLock:
+    """A threading.Lock recording its acquisition count, wait times and hold times per operation."""
+    def __init__(self, name: str):
+        self.name = name
+        self.lock = threading.Lock()
+        # operation -> [acquisitions, contended acquisitions, total wait (s), max wait (s), total hold (s)]
+        self.stats = {}
+        self.acquired_at = 0.0
+        self.holder_operation = None
+
+    def acquire(self):
+        start = time.perf_counter()
+        contended = not self.lock.acquire(blocking=False)
+        if contended:
+            self.lock.acquire()
+        self.acquired_at = time.perf_counter()
+        wait = self.acquired_at - start
+        record_span("lock_wait", start, wait)
+        # The stats are only updated while holding the lock, so they don't need a lock of their own
+        self.holder_operation = current_operation.get()
+        stats = self.stats.get(self.holder_operation)
+        if stats is None:
+            stats = self.stats[self.holder_operation] = [0, 0, 0.0, 0.0, 0.0]
+        stats[0] += 1
+        stats[1] += contended
+        stats[2] += wait
+        stats[3] = max(stats[3], wait)
+        return True
+
+    def release(self):
+        self.stats[self.holder_operation][4] += time.perf_counter() - self.acquired_at
+        self.lock.release()
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    def get_stats(self) -> dict[str, dict[str, float]]:
+        """Return the stats of each operation (times in milliseconds)."""
+        with self.lock:
+            return {
+                operation: {
+                    "acquisitions": acquisitions,
+                    "contended": contended,
+                    "total_wait_ms": total_wait * 1000,
+                    "max_wait_ms": max_wait * 1000,
+                    "total_hold_ms": total_hold * 1000,
+                }
+                for operation, (acquisitions, contended, total_wait, max_wait, total_hold) in self.stats.items()
+            }
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats.clear()
+
@@ -8,8 +8,6 @@ PROJECT_ROOT = Path(__file__).resolve().parents[3]
 # Logs will go in the root-level "logs" directory
 LOG_DIR = PROJECT_ROOT/ "logs"
 
-# Ensure the logs directory exists
-LOG_DIR.mkdir(parents=True, exist_ok=True)
 
 def setup_logging():
     """
@@ -19,6 +17,10 @@ def setup_logging():
       - logs/newsfeed.log (file)
       - Console (standard output)
     """
+    # Ensure the logs directory exists (done here rather than at import time,
+    # so that importing this module has no side effects)
+    LOG_DIR.mkdir(parents=True, exist_ok=True)
+
     formatter = logging.Formatter(
         fmt="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
         datefmt="%Y-%m-%d %H:%M:%S"
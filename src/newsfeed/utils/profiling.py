@@ -0,0 +1,200 @@
+"""
+Opt-in profiling of API requests.
+
+A traced request records a tree of timed spans: the code of the endpoints and of
+the store marks its steps with `with span("scoring"): ...`, and the store lock
+records the time spent waiting for it. Spans cost nothing when the current
+request is not traced. The trace of a request is returned in its Server-Timing
+header and logged. Some requests are also run under cProfile, and their profile
+is written to the profiles directory, both as a .prof file (for pstats or
+snakeviz) and as a text report with the span tree and the slowest functions.
+
+Profiling is configured with NEWSFEED_PROFILING:
+    - off (default): no profiling
+    - header: only the requests sent with the X-Newsfeed-Profile header are traced and profiled
+    - on: every request is traced, and a sample of them (NEWSFEED_PROFILING_SAMPLE_RATE),
+      as well as the requests sent with the header, are profiled
+"""
+
+import contextlib
+import contextvars
+import cProfile
+import io
+import logging
+import pstats
+import random
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+from newsfeed.config.settings import get_float_setting, get_path_setting, get_setting
+from newsfeed.utils.logging_config import LOG_DIR
+
+logger = logging.getLogger(__name__)
+
+PROFILING_OFF = "off"
+PROFILING_HEADER = "header"
+PROFILING_ON = "on"
+
+PROFILE_HEADER = "X-Newsfeed-Profile"
+
+# Span the code currently runs in, None when the current request is not traced
+current_span = contextvars.ContextVar("current_span", default=None)
+
+# Only one cProfile profiler can be active at a time in the interpreter
+cprofile_lock = threading.Lock()
+
+
+class Span:
+    """A timed step of a request, with the timed steps it is made of."""
+    __slots__ = ("name", "start", "duration", "children")
+
+    def __init__(self, name: str, start: float, duration: float = 0.0):
+        self.name = name
+        self.start = start
+        self.duration = duration
+        self.children = []
+
+    @property
+    def end(self) -> float:
+        return self.start + self.duration
+
+    def format(self, depth: int = 0) -> str:
+        """Format the span tree as indented "name: duration" lines."""
+        lines = [f"{'  ' * depth}{self.name}: {self.duration * 1000:.2f} ms"]
+        lines.extend(child.format(depth + 1) for child in self.children)
+        return "\n".join(lines)
+
+    def server_timing(self) -> str:
+        """Format the total duration and the top level spans as a Server-Timing header value."""
+        metrics = [f"total;dur={self.duration * 1000:.2f}"]
+        metrics.extend(f"{child.name};dur={child.duration * 1000:.2f}" for child in self.children)
+        return ", ".join(metrics)
+
+
+@contextlib.contextmanager
+def span(name: str):
+    """
+    Time the enclosed code as a child of the current span, if the current request is traced.
+    """
+    parent = current_span.get()
+    if parent is None:
+        yield
+        return
+    child = Span(name, time.perf_counter())
+    parent.children.append(child)
+    token = current_span.set(child)
+    try:
+        yield
+    finally:
+        child.duration = time.perf_counter() - child.start
+        current_span.reset(token)
+
+
+def record_span(name: str, start: float, duration: float):
+    """
+    Record an already timed step (e.g. a lock wait) as a child of the current span, if the current request is traced.
+    """
+    parent = current_span.get()
+    if parent is not None:
+        parent.children.append(Span(name, start, duration))
+
+
+class RequestProfiler:
+    """
+    Trace and profile the API requests, according to the profiling mode (see the module docstring).
+    """
+    def __init__(self, mode: str = PROFILING_ON, sample_rate: float = 0.0, profiles_dir: Path | None = None):
+        """
+        Args:
+            mode (str): PROFILING_HEADER or PROFILING_ON.
+            sample_rate (float): The fraction of the requests run under cProfile (in PROFILING_ON mode).
+            profiles_dir (Path, optional): The directory the profiles are written to (defaults to logs/profiles).
+
+        Raises:
+            ValueError: If the mode is unknown.
+        """
+        if mode not in {PROFILING_HEADER, PROFILING_ON}:
+            raise ValueError(f"Unknown profiling mode: {mode}. Available: {PROFILING_OFF}, {PROFILING_HEADER}, {PROFILING_ON}")
+        self.mode = mode
+        self.sample_rate = sample_rate
+        self.profiles_dir = profiles_dir or LOG_DIR / "profiles"
+
+    async def handle(self, request, call_next):
+        """
+        Serve a request (with the call_next function of an http middleware), tracing and profiling it if needed.
+        """
+        requested = PROFILE_HEADER in request.headers
+        if self.mode == PROFILING_HEADER and not requested:
+            return await call_next(request)
+
+        root = Span(request.url.path, time.perf_counter())
+        token = current_span.set(root)
+        profiler = None
+        if (requested or random.random() < self.sample_rate) and cprofile_lock.acquire(blocking=False):
+            profiler = cProfile.Profile()
+            profiler.enable()
+        try:
+            response = await call_next(request)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                cprofile_lock.release()
+            root.duration = time.perf_counter() - root.start
+            current_span.reset(token)
+
+        add_validation_and_serialization_spans(root)
+        response.headers["Server-Timing"] = root.server_timing()
+        logger.info(f"Trace of {request.method} {request.url.path}:\n{root.format()}")
+        if profiler is not None:
+            import asyncio # only needed by the server, keep it off the import path of the CLI
+            await asyncio.to_thread(self.write_profile, root, profiler)
+        return response
+
+    def write_profile(self, root: Span, profiler: cProfile.Profile) -> Path:
+        """
+        Write the cProfile stats of a request to <profiles dir>/<time>-<endpoint>.prof, and a text
+        report (span tree and slowest functions) to a .txt file next to it.
+
+        Returns:
+            Path: The path of the .prof file.
+        """
+        self.profiles_dir.mkdir(parents=True, exist_ok=True)
+        endpoint = root.name.strip("/").replace("/", "_") or "root"
+        path = self.profiles_dir / f"{datetime.now():%Y%m%d-%H%M%S-%f}-{endpoint}.prof"
+        profiler.dump_stats(path)
+
+        report = io.StringIO()
+        report.write(root.format() + "\n\n")
+        pstats.Stats(profiler, stream=report).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(40)
+        path.with_suffix(".txt").write_text(report.getvalue(), encoding="utf-8")
+        logger.info(f"Profile of {root.name} written to {path}")
+        return path
+
+
+def add_validation_and_serialization_spans(root: Span):
+    """
+    Add the time before the first span of the endpoint (routing, body parsing and validation)
+    and after its last span (response validation and serialization) to a request trace.
+    """
+    if not root.children:
+        return
+    first, last = root.children[0], root.children[-1]
+    root.children.insert(0, Span("validation", root.start, first.start - root.start))
+    root.children.append(Span("serialization", last.end, root.end - last.end))
+
+
+def create_profiler_from_settings() -> RequestProfiler | None:
+    """
+    Create the request profiler configured by NEWSFEED_PROFILING, NEWSFEED_PROFILING_SAMPLE_RATE
+    and NEWSFEED_PROFILING_DIR, or return None if profiling is off.
+    """
+    mode = get_setting("PROFILING", PROFILING_OFF).strip().lower()
+    if mode == PROFILING_OFF:
+        return None
+    return RequestProfiler(
+        mode=mode,
+        sample_rate=get_float_setting("PROFILING_SAMPLE_RATE", 0.01),
+        profiles_dir=get_path_setting("PROFILING_DIR", LOG_DIR / "profiles"),
+    )
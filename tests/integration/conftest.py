@@ -0,0 +1,10 @@
+from tests.integration.ranking_harness import TIMINGS
+
+
+def pytest_terminal_summary(terminalreporter):
+    """Report the time taken by each ranking engine on each corpus."""
+    if not TIMINGS:
+        return
+    terminalreporter.section("ranking engine timings")
+    for (engine_name, corpus_name), seconds in sorted(TIMINGS.items(), key=lambda item: (item[0][1], item[0][0])):
+        terminalreporter.write_line(f"{corpus_name:>15}  {engine_name:<18} {seconds * 1000:8.1f} ms")
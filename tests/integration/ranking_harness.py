@@ -0,0 +1,169 @@
+"""
+Differential testing harness for the filtering and ranking engines.
+
+/retrieve must be deterministic, so any alternative (faster) implementation of
+the filter -> score -> sort pipeline must return exactly the same events, in
+the same order and with the same scores, as the reference implementation
+(keyword_based_filter + score_events). The harness runs every engine on the
+same corpora at a frozen clock, compares their rankings with the reference
+one, and records the time taken by each engine.
+
+Corpora are either generated (randomized, from a seed) or recorded: JSON files
+of events in the /ingest format, in tests/data/corpora/.
+
+To check a new engine, add a function `engine(events, keywords_config, now)`
+returning the ranked events with their scores to ENGINES.
+"""
+
+import json
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+from pydantic import TypeAdapter
+
+from newsfeed.ingestion.columnar_store import ColumnarEventStore
+from newsfeed.ingestion.event import Event
+from newsfeed.ingestion.sqlite_store import SQLiteEventStore
+from newsfeed.ingestion.store import EventStore, ranking_key
+from newsfeed.processing.filter import keyword_based_filter
+from newsfeed.processing.ranking import RankingFunction
+from newsfeed.processing.score import score_events
+
+CORPORA_DIR = Path(__file__).resolve().parents[1] / "data" / "corpora"
+
+# All the engines rank at this time, so that recency scores don't depend on when the tests run
+FROZEN_NOW = datetime(2025, 7, 23, 12, 0, 0, tzinfo=timezone.utc)
+
+# (engine name, corpus name) -> seconds taken by the engine on the corpus
+TIMINGS = {}
+
+
+def all_keywords(keywords_config: dict) -> list[str]:
+    return (keywords_config['high_priority_keywords'] + keywords_config['medium_priority_keywords']
+            + keywords_config['low_priority_keywords'])
+
+
+def reference_engine(events: list[Event], keywords_config: dict, now: datetime) -> list[dict]:
+    """The reference pipeline: keyword_based_filter, score_events, sorted by the default ranking."""
+    filtered_events_with_counts = keyword_based_filter(events, all_keywords(keywords_config))
+    events_with_score = score_events(filtered_events_with_counts,
+                                     keywords_config['high_priority_keywords'],
+                                     keywords_config['medium_priority_keywords'],
+                                     keywords_config['low_priority_keywords'],
+                                     now=now)
+    return sorted(events_with_score, key=ranking_key)
+
+
+def ranking_function_engine(events: list[Event], keywords_config: dict, now: datetime) -> list[dict]:
+    """Scoring with the compiled RankingFunction of the default ranking configuration."""
+    filtered_events_with_counts = keyword_based_filter(events, all_keywords(keywords_config))
+    return sorted(RankingFunction.from_config().score(filtered_events_with_counts, now=now), key=ranking_key)
+
+
+def event_store_engine(events: list[Event], keywords_config: dict, now: datetime) -> list[dict]:
+    """Ingestion into an in-memory EventStore (importance computed at ingest time), then retrieval."""
+    store = EventStore()
+    store.add_events(keyword_based_filter(events, all_keywords(keywords_config)))
+    return store.get_sorted_events(now=now)
+
+
+def snapshot_restore_engine(events: list[Event], keywords_config: dict, now: datetime) -> list[dict]:
+    """Ingestion into an EventStore, snapshot, restore into another store, then retrieval."""
+    store = EventStore()
+    store.add_events(keyword_based_filter(events, all_keywords(keywords_config)))
+    restored_store = EventStore()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store.snapshot(Path(tmp_dir) / "store.snapshot")
+        restored_store.restore(Path(tmp_dir) / "store.snapshot")
+    return restored_store.get_sorted_events(now=now)
+
+
+def sqlite_store_engine(events: list[Event], keywords_config: dict, now: datetime) -> list[dict]:
+    """Ingestion into a SQLiteEventStore, then retrieval."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = SQLiteEventStore(Path(tmp_dir) / "newsfeed.db")
+        store.add_events(keyword_based_filter(events, all_keywords(keywords_config)))
+        return store.get_sorted_events(now=now)
+
+
+def columnar_store_engine(events: list[Event], keywords_config: dict, now: datetime) -> list[dict]:
+    """Ingestion into a ColumnarEventStore, then retrieval."""
+    store = ColumnarEventStore()
+    store.add_events(keyword_based_filter(events, all_keywords(keywords_config)))
+    return store.get_sorted_events(now=now)
+
+
+# Alternative engines, checked against the reference engine
+ENGINES = {
+    "ranking_function": ranking_function_engine,
+    "event_store": event_store_engine,
+    "snapshot_restore": snapshot_restore_engine,
+    "sqlite_store": sqlite_store_engine,
+    "columnar_store": columnar_store_engine,
+}
+
+
+def load_recorded_corpora() -> dict[str, list[Event]]:
+    """Load the recorded corpora (JSON arrays of events in the /ingest format), by file name."""
+    events_adapter = TypeAdapter(list[Event])
+    return {
+        path.stem: events_adapter.validate_python(json.loads(path.read_text(encoding="utf-8")))
+        for path in sorted(CORPORA_DIR.glob("*.json"))
+    }
+
+
+def generate_random_corpus(seed: int, size: int, keywords_config: dict) -> list[Event]:
+    """
+    Generate a corpus of random events, covering the cases where rankings are easy to get wrong:
+    keywords in any case, repeated or in HTML bodies, missing bodies, naive and non-UTC
+    timestamps, and events with exactly the same score (ranked by id).
+    """
+    rng = random.Random(seed)
+    keywords = all_keywords(keywords_config)
+    words = ["server", "users", "network", "today", "team", "cloud", "report", "the", "a", "new"]
+    timezones = [timezone.utc, ZoneInfo("Europe/Paris"), ZoneInfo("America/New_York"), None]
+    start = FROZEN_NOW - timedelta(days=10)
+
+    def text(word_count: int) -> str:
+        chosen = [rng.choice(keywords) if rng.random() < 0.15 else rng.choice(words) for _ in range(word_count)]
+        return " ".join(word.upper() if rng.random() < 0.1 else word for word in chosen)
+
+    events = []
+    for i in range(size):
+        if events and rng.random() < 0.05:
+            # Same title, body and publication time as a previous event: the scores are equal
+            copied = rng.choice(events)
+            events.append(Event(f"event-{seed}-{i:05d}", "copy", copied.title, copied.published_at, copied.body))
+            continue
+        body_kind = rng.choice(["none", "text", "html"])
+        body = None
+        if body_kind == "text":
+            body = text(rng.randrange(5, 40))
+        elif body_kind == "html":
+            body = f"<p>{text(10)}</p><script>var outage = 1;</script><p>{text(10)} &amp; more</p>"
+        published_at = start + timedelta(seconds=rng.randrange(10 * 24 * 3600), microseconds=rng.randrange(10**6))
+        tz = rng.choice(timezones)
+        published_at = published_at.replace(tzinfo=None) if tz is None else published_at.astimezone(tz)
+        events.append(Event(f"event-{seed}-{i:05d}", rng.choice(["reddit", "Ars Technica"]),
+                            text(rng.randrange(3, 12)), published_at, body))
+    rng.shuffle(events)
+    return events
+
+
+def run_engine(engine_name: str, engine, events: list[Event], corpus_name: str, keywords_config: dict) -> list[dict]:
+    """Run an engine at the frozen clock, and record the time it took."""
+    start = time.perf_counter()
+    ranked = engine(events, keywords_config, FROZEN_NOW)
+    TIMINGS[(engine_name, corpus_name)] = time.perf_counter() - start
+    return ranked
+
+
+def assert_same_ranking(expected: list[dict], actual: list[dict]):
+    """Assert that two rankings have the same events, in the same order, with the same scores."""
+    assert [e['event'].id for e in actual] == [e['event'].id for e in expected]
+    assert [e['event'] for e in actual] == [e['event'] for e in expected]
+    assert [e['total_score'] for e in actual] == [e['total_score'] for e in expected]
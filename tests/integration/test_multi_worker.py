@@ -0,0 +1,71 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+import requests
+
+SRC_DIR = Path(__file__).resolve().parents[2] / "src"
+NUM_WORKERS = 3
+
+
+def get_free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def multi_worker_server(tmp_path):
+    """Run the API with several uvicorn worker processes sharing a SQLite store, and yield its base URL."""
+    port = get_free_port()
+    env = {
+        **os.environ,
+        "PYTHONPATH": str(SRC_DIR),
+        "NEWSFEED_STORE_BACKEND": "sqlite",
+        "NEWSFEED_STORE_PATH": str(tmp_path / "newsfeed.db"),
+    }
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "newsfeed.api.server:app",
+         "--port", str(port), "--workers", str(NUM_WORKERS), "--log-level", "warning"],
+        env=env, cwd=tmp_path,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                requests.get(base_url, timeout=1)
+                break
+            except requests.ConnectionError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.2)
+        yield base_url
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def test_workers_share_store_and_return_consistent_results(multi_worker_server):
+    """Test that every worker returns the same ranking, whichever worker ingested the events."""
+    batches = [
+        [{"id": f"b{batch}e{i}", "source": "reddit", "title": f"Critical outage {batch} {i}",
+          "body": "Patch the vulnerability", "published_at": f"2025-07-{10 + batch}T0{i}:00:00Z"}
+         for i in range(3)]
+        for batch in range(4)
+    ]
+    # A new connection per request, so the requests are spread over the workers
+    for batch in batches:
+        response = requests.post(f"{multi_worker_server}/ingest", json=batch, headers={"Connection": "close"})
+        assert response.status_code == 200
+
+    responses = [
+        requests.get(f"{multi_worker_server}/retrieve", headers={"Connection": "close"}).json()
+        for _ in range(4 * NUM_WORKERS)
+    ]
+    assert len(responses[0]) == 12
+    assert all(response == responses[0] for response in responses)
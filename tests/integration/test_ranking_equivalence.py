@@ -0,0 +1,43 @@
+import pytest
+
+from newsfeed.config.loader import load_keywords_config
+from tests.integration.ranking_harness import (
+    ENGINES, assert_same_ranking, generate_random_corpus, load_recorded_corpora, reference_engine, run_engine,
+)
+
+RANDOM_SEEDS = [0, 1, 2]
+RANDOM_CORPUS_SIZE = 500
+
+
+@pytest.fixture(scope="module")
+def corpora():
+    keywords_config = load_keywords_config()
+    corpora = load_recorded_corpora()
+    for seed in RANDOM_SEEDS:
+        corpora[f"random-{seed}"] = generate_random_corpus(seed, RANDOM_CORPUS_SIZE, keywords_config)
+    return corpora
+
+
+@pytest.fixture(scope="module")
+def reference_rankings(corpora):
+    keywords_config = load_keywords_config()
+    return {name: run_engine("reference", reference_engine, events, name, keywords_config)
+            for name, events in corpora.items()}
+
+
+@pytest.mark.parametrize("engine_name", list(ENGINES))
+def test_engine_matches_reference_ranking(engine_name, corpora, reference_rankings):
+    """Test that an alternative engine ranks every corpus exactly like the reference implementation."""
+    keywords_config = load_keywords_config()
+    for corpus_name, events in corpora.items():
+        ranked = run_engine(engine_name, ENGINES[engine_name], events, corpus_name, keywords_config)
+        assert_same_ranking(reference_rankings[corpus_name], ranked)
+
+
+def test_random_corpora_cover_tricky_cases(corpora, reference_rankings):
+    """Test that the generated corpora contain ties and filtered out events, so the comparison is meaningful."""
+    for seed in RANDOM_SEEDS:
+        ranking = reference_rankings[f"random-{seed}"]
+        scores = [e['total_score'] for e in ranking]
+        assert len(set(scores)) < len(scores) # some events have the same score
+        assert 0 < len(ranking) < RANDOM_CORPUS_SIZE
@@ -1,7 +1,10 @@
 # Test the FastAPI app using TestClient 
 # Documentation: https://fastapi.tiangolo.com/tutorial/testing/
 
+import asyncio
+import json
 import pytest
+from datetime import datetime
 from fastapi.testclient import TestClient
 from newsfeed.api.server import app
 
@@ -357,4 +360,443 @@ def test_ingest_multiple_batches_with_duplicate_ids_accross_batches():
             "body": "A major vulneratibily has been detected in the system",
             "published_at": "2025-01-15T10:30:00Z"
         },
-    ]
\ No newline at end of file
+    ]
+
+def test_retrieve_endpoint_filtered_by_keyword_and_tier(sample_unranked_events_data):
+    """Test that the retrieve endpoint only returns the ranked events matching the keyword and tier filters."""
+    ingest_response = client.post("/ingest", json=sample_unranked_events_data)
+    assert ingest_response.status_code == 200
+
+    response = client.get("/retrieve", params={"keyword": "outage"})
+    assert response.status_code == 200
+    assert [event["id"] for event in response.json()] == ["test002", "test003"]
+
+    response = client.get("/retrieve", params={"keyword": ["vulnerability", "outage"]})
+    assert response.status_code == 200
+    assert response.json() == []
+
+    response = client.get("/retrieve", params={"tier": "high"})
+    assert response.status_code == 200
+    assert [event["id"] for event in response.json()] == ["test002", "test003", "test001"]
+
+    response = client.get("/retrieve", params={"keyword": "Vulnerability", "tier": "high"})
+    assert response.status_code == 200
+    assert [event["id"] for event in response.json()] == ["test001"]
+
+    response = client.get("/retrieve", params={"tier": "low"})
+    assert response.status_code == 200
+    assert response.json() == []
+
+
+def test_ingest_endpoint_filters_by_the_keywords_of_the_store_ranking(monkeypatch):
+    """Test that ingested events are filtered by the keywords the store ranks them with, not a reloaded configuration."""
+    from newsfeed.config.loader import load_keywords_config, load_ranking_config
+    from newsfeed.ingestion.store import store
+    from newsfeed.processing.ranking import RankingFunction
+    keywords_config = load_keywords_config()
+    keywords_config['high_priority_keywords'] = keywords_config['high_priority_keywords'] + ["heatwave"]
+    monkeypatch.setattr(store, "ranking_function", RankingFunction(keywords_config, load_ranking_config()))
+    events = [{"id": "heat1", "source": "reddit", "title": "Heatwave in the datacenter", "published_at": "2025-07-22T10:00:00Z"}]
+    assert client.post("/ingest", json=events).status_code == 200
+
+    response = client.get("/retrieve", params={"tier": "high"})
+    assert [event["id"] for event in response.json()] == ["heat1"]
+    assert store.get_top_events(1)[0]['importance_score'] > 0
+
+
+def test_retrieve_endpoint_with_invalid_tier():
+    """Test that the retrieve endpoint rejects unknown priority tiers."""
+    response = client.get("/retrieve", params={"tier": "urgent"})
+    assert response.status_code == 422
+
+
+def test_retrieve_endpoint_filtered_by_source_and_time_range(sample_unranked_events_data):
+    """Test that the retrieve endpoint only returns the ranked events matching the source and time range."""
+    ingest_response = client.post("/ingest", json=sample_unranked_events_data)
+    assert ingest_response.status_code == 200
+
+    response = client.get("/retrieve", params={"source": "reddit"})
+    assert response.status_code == 200
+    assert [event["id"] for event in response.json()] == ["test002"]
+
+    response = client.get("/retrieve", params={"source": ["Ars Technica", "Tom's Hardware"]})
+    assert [event["id"] for event in response.json()] == ["test003", "test001"]
+
+    # since is inclusive, and naive timestamps are treated as UTC
+    response = client.get("/retrieve", params={"since": "2025-07-22T03:00:00Z"})
+    assert [event["id"] for event in response.json()] == ["test002", "test003"]
+
+    # until is exclusive
+    response = client.get("/retrieve", params={"since": "2025-07-01T00:00:00", "until": "2025-07-22T11:00:00Z"})
+    assert [event["id"] for event in response.json()] == ["test003"]
+
+    response = client.get("/retrieve", params={"source": "reddit", "until": "2025-07-22T00:00:00Z"})
+    assert response.json() == []
+
+    response = client.get("/retrieve", params={"keyword": "outage", "since": "2025-07-22T05:00:00+02:00"})
+    assert [event["id"] for event in response.json()] == ["test002", "test003"]
+
+
+def test_stream_pushes_accepted_events_and_ranking_changes():
+    """Test that ingested events and top k ranking changes are pushed to stream subscribers."""
+    from newsfeed.api.stream import EventBroadcaster
+    from newsfeed.ingestion.event import Event
+    from newsfeed.ingestion.store import store
+    from newsfeed.processing.filter import keyword_based_filter
+
+    async def scenario():
+        broadcaster = EventBroadcaster(buffer_size=10, top_k=2)
+        subscriber = broadcaster.subscribe()
+
+        batch_1 = keyword_based_filter([Event("s1", "reddit", "Outage", datetime(2025, 7, 22, 11))], ["outage"])
+        store.add_events(batch_1)
+        broadcaster.publish_ingested_events(batch_1, store)
+        await broadcaster.ranking_task
+
+        batch_2 = keyword_based_filter([Event("s2", "reddit", "Patch", datetime(2025, 1, 1))], ["patch"])
+        store.add_events(batch_2)
+        broadcaster.publish_ingested_events(batch_2, store)
+        await broadcaster.ranking_task
+
+        return [subscriber.queue.get_nowait() for _ in range(subscriber.queue.qsize())]
+
+    messages = asyncio.run(scenario())
+
+    assert [event_type for event_type, _ in messages] == ["events", "ranking", "events", "ranking"]
+    assert messages[0][1][0]["id"] == "s1"
+    assert [entry["id"] for entry in messages[1][1]["top"]] == ["s1"]
+    assert messages[1][1]["entered"] == ["s1"]
+    assert messages[3][1]["entered"] == ["s2"] and messages[3][1]["left"] == []
+
+
+def test_stream_coalesces_ranking_updates_of_concurrent_ingestions():
+    """Test that the top k ranking is computed off the event loop, once more for the ingestions made meanwhile."""
+    import threading
+    from newsfeed.api.stream import EventBroadcaster
+    from newsfeed.ingestion.event import Event
+    from newsfeed.ingestion.store import store
+    from newsfeed.processing.filter import keyword_based_filter
+
+    class SlowStore:
+        def __init__(self):
+            self.calls, self.threads = 0, set()
+            self.started, self.release = threading.Event(), threading.Event()
+        def get_top_events(self, k):
+            self.calls += 1
+            self.threads.add(threading.get_ident())
+            self.started.set()
+            self.release.wait()
+            return store.get_top_events(k)
+
+    async def scenario():
+        broadcaster = EventBroadcaster(buffer_size=20, top_k=5)
+        subscriber = broadcaster.subscribe()
+        batches = [keyword_based_filter([Event(f"c{i}", "reddit", "Outage", datetime(2025, 7, 22, i))], ["outage"])
+                   for i in range(4)]
+        for batch in batches:
+            store.add_events(batch)
+        slow_store = SlowStore()
+        broadcaster.publish_ingested_events(batches[0], slow_store)
+        ranking_task = broadcaster.ranking_task
+        assert await asyncio.to_thread(slow_store.started.wait, 5)
+        for batch in batches[1:]: # while the first ranking is computed
+            broadcaster.publish_ingested_events(batch, slow_store)
+        assert broadcaster.ranking_task is ranking_task and not ranking_task.done()
+        slow_store.release.set()
+        await ranking_task
+        assert broadcaster.ranking_task is None
+        return slow_store, [subscriber.queue.get_nowait() for _ in range(subscriber.queue.qsize())]
+
+    slow_store, messages = asyncio.run(scenario())
+    assert slow_store.calls == 2 # the first ingestion's ranking, then one for the three others
+    assert threading.get_ident() not in slow_store.threads
+    assert [event_type for event_type, _ in messages].count("events") == 4
+    assert [entry["id"] for entry in messages[-1][1]["top"]] == ["c3", "c2", "c1", "c0"]
+
+
+def test_ingestion_is_acknowledged_before_the_stream_ranking_is_computed(monkeypatch):
+    """Test that /ingest returns while the top k ranking of the stream is pending, and survives its failure."""
+    import threading
+    import time
+    from newsfeed.api.stream import broadcaster
+    from newsfeed.ingestion.store import store
+    started, release = threading.Event(), threading.Event()
+    def failing_get_top_events(k, **filters):
+        started.set()
+        release.wait()
+        raise RuntimeError("ranking failed")
+    monkeypatch.setattr(store, "get_top_events", failing_get_top_events)
+    events = [{"id": "bg1", "source": "reddit", "title": "Critical outage", "published_at": "2025-07-22T10:00:00Z"}]
+
+    subscriber = broadcaster.subscribe()
+    try:
+        with TestClient(app) as running_client:
+            assert running_client.post("/ingest", json=events).status_code == 200
+            assert started.wait(timeout=5) and broadcaster.ranking_task is not None # still pending
+            release.set()
+            deadline = time.monotonic() + 5
+            while broadcaster.ranking_task is not None and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert broadcaster.ranking_task is None # the failure was logged
+            assert store.has_event("bg1")
+    finally:
+        release.set()
+        broadcaster.unsubscribe(subscriber)
+        broadcaster.last_top_ids = None
+
+
+def test_stream_drops_slow_subscribers():
+    """Test that a subscriber whose buffer is full is dropped, and its stream closed."""
+    from newsfeed.api.stream import EventBroadcaster, stream_messages
+
+    async def scenario():
+        broadcaster = EventBroadcaster(buffer_size=2)
+        slow_subscriber = broadcaster.subscribe()
+        for i in range(3):
+            broadcaster.publish("events", [{"id": f"e{i}"}])
+
+        async def is_disconnected():
+            return False
+        messages = [message async for message in stream_messages(slow_subscriber, broadcaster, is_disconnected)]
+        return broadcaster, slow_subscriber, messages
+
+    broadcaster, slow_subscriber, messages = asyncio.run(scenario())
+
+    assert slow_subscriber.dropped
+    assert not broadcaster.has_subscribers()
+    assert messages == ['event: dropped\ndata: {"reason": "slow consumer"}\n\n']
+
+
+def test_ingested_events_are_recovered_from_wal_after_restart(monkeypatch, tmp_path):
+    """Test that events acknowledged by /ingest are restored on startup when the write-ahead log is enabled."""
+    from newsfeed.ingestion.store import store
+    monkeypatch.setenv("NEWSFEED_WAL", "true")
+    monkeypatch.setenv("NEWSFEED_WAL_DIR", str(tmp_path / "wal"))
+    events = [
+        {"id": "wal1", "source": "reddit", "title": "Critical outage", "published_at": "2025-07-22T10:00:00Z"},
+        {"id": "wal2", "source": "reddit", "title": "Weather report", "published_at": "2025-07-22T11:00:00Z"},
+    ]
+    with TestClient(app) as running_client:
+        assert running_client.post("/ingest", json=events).status_code == 200
+        expected_response = running_client.get("/retrieve").json()
+
+    store.clear() # the process was restarted
+    with TestClient(app) as running_client:
+        assert running_client.get("/retrieve").json() == expected_response
+    assert [event["id"] for event in expected_response] == ["wal1"]
+
+
+def test_ingested_events_are_only_stored_once_logged(monkeypatch, tmp_path):
+    """Test that events whose write to the write-ahead log fails are not stored (a retry can then ingest them)."""
+    from newsfeed.ingestion import wal as wal_module
+    from newsfeed.ingestion.store import store
+    monkeypatch.setenv("NEWSFEED_WAL", "true")
+    monkeypatch.setenv("NEWSFEED_WAL_DIR", str(tmp_path / "wal"))
+    monkeypatch.setattr(wal_module, "RETRY_DELAY", 0)
+    events = [{"id": "wal1", "source": "reddit", "title": "Critical outage", "published_at": "2025-07-22T10:00:00Z"}]
+    def failing_write(self, data):
+        raise OSError("disk full")
+    with TestClient(app) as running_client:
+        with monkeypatch.context() as failing_disk:
+            failing_disk.setattr(wal_module.WriteAheadLog, "_write", failing_write)
+            with pytest.raises(OSError):
+                running_client.post("/ingest", json=events)
+        assert not store.has_event("wal1")
+        assert running_client.post("/ingest", json=events).status_code == 200
+        assert store.has_event("wal1")
+
+
+def test_stats_endpoint_reports_store_lock_usage_per_endpoint(sample_unranked_events_data):
+    """Test that /stats breaks down the store lock acquisitions by endpoint, and resets them."""
+    client.get("/stats", params={"reset": True})
+    client.post("/ingest", json=sample_unranked_events_data)
+    client.get("/retrieve")
+
+    stats = client.get("/stats").json()
+    assert stats["event_count"] > 0
+    lock_stats = stats["locks"]["store"]
+    assert lock_stats["/ingest"]["acquisitions"] > 0
+    assert lock_stats["/retrieve"]["acquisitions"] > 0
+    assert lock_stats["/retrieve"]["total_hold_ms"] >= 0
+
+    client.get("/stats", params={"reset": True})
+    assert "/ingest" not in client.get("/stats").json()["locks"]["store"]
+
+
+def test_profiled_requests_return_a_trace_and_write_a_profile(monkeypatch, tmp_path, sample_unranked_events_data):
+    """Test that in header profiling mode, only the requests with the profiling header are traced and profiled."""
+    monkeypatch.setenv("NEWSFEED_PROFILING", "header")
+    monkeypatch.setenv("NEWSFEED_PROFILING_DIR", str(tmp_path))
+    with TestClient(app) as running_client:
+        running_client.post("/ingest", json=sample_unranked_events_data)
+        assert "Server-Timing" not in running_client.get("/retrieve").headers
+
+        response = running_client.get("/retrieve", headers={"X-Newsfeed-Profile": "1"})
+
+    assert response.status_code == 200
+    metrics = [metric.split(";")[0] for metric in response.headers["Server-Timing"].split(", ")]
+    assert metrics == ["total", "validation", "rank", "load_bodies", "serialization"]
+    assert len(list(tmp_path.glob("*-retrieve.prof"))) == 1
+    report = next(tmp_path.glob("*-retrieve.txt")).read_text()
+    assert "lock_wait" in report and "scoring" in report and "function calls" in report
+
+
+def test_export_streams_ranked_events_as_ndjson(sample_unranked_events_data):
+    """Test that /export streams the events of /retrieve, in chunks, with their rank, scores and keyword counts."""
+    import json
+    from newsfeed.api.export import export_ndjson
+    from newsfeed.ingestion.store import store
+    client.post("/ingest", json=sample_unranked_events_data)
+    retrieved_events = client.get("/retrieve").json()
+
+    response = client.get("/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert [record["rank"] for record in records] == [1, 2, 3]
+    assert [{k: record[k] for k in retrieved_events[0]} for record in records] == retrieved_events
+    assert records[0]["kw_counts_in_title"] == {"outage": 1}
+    assert records[0]["total_score"] == pytest.approx(records[0]["importance_score"] * records[0]["recency_score"])
+    assert records[0]["age_hours"] < records[2]["age_hours"]
+
+    response = client.get("/export", params={"keyword": "vulnerability"})
+    assert [json.loads(line)["id"] for line in response.text.splitlines()] == ["test001"]
+
+    chunks = list(export_ndjson(store, store.iter_sorted_events(2)))
+    assert [chunk.count(b"\n") for chunk in chunks] == [2, 1]
+
+
+def test_export_streams_ranked_events_as_arrow(sample_unranked_events_data):
+    """Test that /export streams the ranked events as an Arrow IPC stream (with pyarrow only)."""
+    pa = pytest.importorskip("pyarrow")
+    client.post("/ingest", json=sample_unranked_events_data)
+    table = pa.ipc.open_stream(client.get("/export", params={"format": "arrow"}).content).read_all()
+    assert table.column("id").to_pylist() == [event["id"] for event in client.get("/retrieve").json()]
+    assert table.column("rank").to_pylist() == [1, 2, 3]
+
+
+def test_retrieve_endpoint_explains_the_ranking(sample_unranked_events_data):
+    """Test that /retrieve?explain=true adds the ranking details of each event, as computed by the ranking."""
+    from newsfeed.ingestion.store import store
+    client.post("/ingest", json=sample_unranked_events_data)
+    retrieved_events = client.get("/retrieve").json()
+    assert "total_score" not in retrieved_events[0]
+
+    explained_events = client.get("/retrieve", params={"explain": True, "source": ["reddit", "Ars Technica"]}).json()
+    assert [event["id"] for event in explained_events] == ["test002", "test001"]
+    assert [event["rank"] for event in explained_events] == [1, 2]
+    assert {k: explained_events[0][k] for k in retrieved_events[0]} == retrieved_events[0]
+    assert explained_events[1]["kw_counts_in_title"] == {"vulnerability": 1}
+    assert explained_events[1]["importance_score"] == store.get_sorted_events(sources=["Ars Technica"])[0]["importance_score"]
+    for event in explained_events:
+        assert event["total_score"] == pytest.approx(event["importance_score"] * event["recency_score"])
+        assert event["recency_score"] == pytest.approx(1 / (0.1 * event["age_hours"] + 1), rel=1e-4)
+
+
+def test_explained_and_exported_events_list_their_near_duplicate_aliases(monkeypatch):
+    """Test that /retrieve?explain=true and /export give the sources collapsed into each event when near-duplicates are on."""
+    from newsfeed.api import server
+    from newsfeed.ingestion.store import create_store_from_settings
+    monkeypatch.setenv("NEWSFEED_NEAR_DUPLICATES", "true")
+    monkeypatch.setattr(server, "store", create_store_from_settings())
+    body = ("Microsoft has released an emergency patch for a critical SharePoint vulnerability that is being "
+            "actively exploited in the wild. Administrators are urged to apply the update immediately.")
+    title = "Critical SharePoint vulnerability exploited in the wild"
+    events = [
+        {"id": "ars1", "source": "Ars Technica", "title": title, "body": body, "published_at": "2025-07-21T00:00:00Z"},
+        {"id": "toms1", "source": "Tom's Hardware", "title": title, "body": body, "published_at": "2025-07-21T02:00:00Z"},
+        {"id": "other1", "source": "reddit", "title": "Server outage", "body": None, "published_at": "2025-07-21T01:00:00Z"},
+    ]
+    assert client.post("/ingest", json=events).status_code == 200
+
+    explained_events = client.get("/retrieve", params={"explain": True}).json()
+    exported_events = [json.loads(line) for line in client.get("/export").text.splitlines()]
+    for records in (explained_events, exported_events):
+        aliases = {record["id"]: record["aliases"] for record in records}
+        assert aliases == {"ars1": [{"id": "toms1", "source": "Tom's Hardware"}], "other1": []}
+
+
+def test_shared_ranking_is_published_after_each_ingestion(monkeypatch, tmp_path, sample_unranked_events_data):
+    """Test that sidecars read the top n ranking from the shared file, and keep their mapped ranking until they refresh."""
+    from newsfeed.api.shared_ranking import SharedRankingReader
+    monkeypatch.setenv("NEWSFEED_SHARED_RANKING", "true")
+    monkeypatch.setenv("NEWSFEED_SHARED_RANKING_PATH", str(tmp_path / "ranking.bin"))
+    monkeypatch.setenv("NEWSFEED_SHARED_RANKING_TOP_N", "2")
+    reader = SharedRankingReader(tmp_path / "ranking.bin")
+    assert not reader.refresh() # not published yet
+    with TestClient(app) as running_client:
+        assert reader.refresh() and reader.top() == [] # published on startup
+        publisher = running_client.app.state.ranking_publisher
+        running_client.post("/ingest", json=sample_unranked_events_data[:1])
+        assert publisher.wait_published(timeout=5) # in the background
+        assert reader.top() == [] # until refreshed
+        assert reader.refresh() and not reader.refresh()
+        assert [event_id for event_id, _ in reader.top()] == ["test001"]
+
+        running_client.post("/ingest", json=sample_unranked_events_data[1:])
+        assert publisher.wait_published(timeout=5)
+        assert reader.refresh()
+        retrieved_events = running_client.get("/export").text.splitlines()
+
+    assert reader.generation == 3 and len(reader) == 2
+    expected_top = [json.loads(line) for line in retrieved_events[:2]]
+    # The recency of the events was computed a little earlier
+    assert reader.top() == [(event["id"], pytest.approx(event["total_score"])) for event in expected_top]
+    assert reader.top(1) == reader.top()[:1]
+    reader.close()
+
+
+def test_shared_ranking_file_is_readable_by_other_users_and_checked_before_mapping(tmp_path):
+    """Test that the ranking file can be read by sidecars of other users, and that empty or truncated files are rejected."""
+    import os
+    import stat
+    from newsfeed.api.shared_ranking import RankingPublisher, SharedRankingReader
+    from newsfeed.ingestion.store import store
+    RankingPublisher(tmp_path / "ranking.bin").publish(store)
+    assert stat.S_IMODE(os.stat(tmp_path / "ranking.bin").st_mode) == 0o644
+
+    reader = SharedRankingReader(tmp_path / "broken.bin")
+    (tmp_path / "broken.bin").write_bytes(b"")
+    with pytest.raises(ValueError, match="shorter than the header"):
+        reader.refresh()
+    (tmp_path / "broken.bin").write_bytes((tmp_path / "ranking.bin").read_bytes()[:-1])
+    with pytest.raises(ValueError, match="truncated"):
+        reader.refresh()
+
+
+def test_shared_ranking_publications_are_coalesced(tmp_path):
+    """Test that the rankings requested while a publication is running are published once, with the latest ranking."""
+    import threading
+    from newsfeed.api.shared_ranking import RankingPublisher, SharedRankingReader
+    from newsfeed.ingestion.event import Event
+
+    class SlowStore:
+        def __init__(self):
+            self.calls = 0
+            self.started = threading.Event()
+            self.release = threading.Event()
+            self.top_ids = ["old"]
+
+        def get_top_events(self, k):
+            self.calls += 1
+            self.started.set()
+            self.release.wait()
+            return [{"event": Event(id=event_id, source="reddit", title="", published_at=datetime(2025, 7, 22)),
+                     "total_score": 1.0} for event_id in self.top_ids]
+
+    store = SlowStore()
+    publisher = RankingPublisher(tmp_path / "ranking.bin")
+    publisher.start()
+    publisher.request_publish(store)
+    assert store.started.wait(timeout=5)
+    store.top_ids = ["new"]
+    for _ in range(3): # while the first ranking is being published
+        publisher.request_publish(store)
+    store.release.set()
+    assert publisher.wait_published(timeout=5)
+    publisher.stop()
+
+    reader = SharedRankingReader(tmp_path / "ranking.bin")
+    assert store.calls == 2 and publisher.generation == 2
+    assert reader.refresh() and [event_id for event_id, _ in reader.top()] == ["new"]
+    reader.close()
@@ -122,4 +122,264 @@ def test_fetch_rss(mocker):
     assert events[2].id == "rss789"
     assert events[2].body == "Content 3"
     assert events[2].published_at == datetime(2025, 7, 21, 10, 7, 25, 
-                            tzinfo=zoneinfo.ZoneInfo("UTC"))
\ No newline at end of file
+                            tzinfo=zoneinfo.ZoneInfo("UTC"))
+
+def test_wal_replays_appended_batches_and_stops_at_torn_record(tmp_path):
+    """Test that concurrently appended batches are replayed after a restart, up to a torn last record."""
+    from concurrent.futures import ThreadPoolExecutor
+    from newsfeed.ingestion.wal import WriteAheadLog
+    batches = [
+        [{"event": Event(f"id{i}", "reddit", f"Outage {i}", datetime(2025, 1, 1, i, tzinfo=zoneinfo.ZoneInfo("UTC")), "body"),
+          "kw_counts_in_title": {"outage": 1}, "kw_counts_in_body": {}, "body_preview": "body"}]
+        for i in range(20)
+    ]
+    wal = WriteAheadLog(tmp_path / "wal")
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(wal.append, batches))
+    wal.close()
+
+    # Simulate a crash in the middle of a write
+    segment = WriteAheadLog(tmp_path / "wal").segments()[0]
+    with open(segment, "ab") as f:
+        f.write(b"\x10\x00\x00\x00garbage")
+
+    restarted_wal = WriteAheadLog(tmp_path / "wal")
+    replayed_batches = list(restarted_wal.replay())
+    assert sorted(replayed_batches, key=lambda batch: batch[0]['event'].id) == \
+        sorted(batches, key=lambda batch: batch[0]['event'].id)
+    assert list(restarted_wal.replay()) == replayed_batches # the torn record was removed
+    restarted_wal.close()
+
+
+def test_wal_retries_failed_writes_and_only_fails_their_batches(tmp_path, monkeypatch):
+    """Test that a failed write is truncated and retried, and only fails its own batches if it keeps failing."""
+    import os
+    from newsfeed.ingestion import wal as wal_module
+    monkeypatch.setattr(wal_module, "RETRY_DELAY", 0)
+    batch = lambda i: [{"event": Event(f"id{i}", "reddit", f"Outage {i}", datetime(2025, 1, 1, i)),
+                        "kw_counts_in_title": {"outage": 1}, "kw_counts_in_body": {}}]
+    failures = {"left": 1}
+    real_fsync = os.fsync
+    def failing_fsync(fd):
+        if failures["left"]:
+            failures["left"] -= 1
+            raise OSError("disk full")
+        real_fsync(fd)
+    monkeypatch.setattr(os, "fsync", failing_fsync)
+
+    wal = wal_module.WriteAheadLog(tmp_path / "wal")
+    applied = []
+    wal.append(batch(0), applied.extend) # succeeds when retried
+    failures["left"] = wal_module.WRITE_RETRIES + 1
+    with pytest.raises(OSError, match="disk full"):
+        wal.append(batch(1), applied.extend)
+    wal.append(batch(2), applied.extend) # the disk recovered
+    wal.close()
+    assert [record['event'].id for record in applied] == ["id0", "id2"]
+
+    restarted_wal = wal_module.WriteAheadLog(tmp_path / "wal")
+    assert [b[0]['event'].id for b in restarted_wal.replay()] == ["id0", "id2"] # no torn or duplicate records
+    restarted_wal.close()
+
+
+def test_wal_replays_segments_after_a_corrupted_one_and_only_compacts_replayed_segments(tmp_path):
+    batch = lambda i: [{"event": Event(f"id{i}", "reddit", f"Outage {i}", datetime(2025, 1, 1, i)),
+                        "kw_counts_in_title": {"outage": 1}, "kw_counts_in_body": {}}]
+    from newsfeed.ingestion.wal import WriteAheadLog
+    wal = WriteAheadLog(tmp_path / "wal")
+    wal.append(batch(0))
+    wal.rotate()
+    wal.append(batch(1))
+    wal.close()
+    first_segment, second_segment = wal.segments()
+    with open(first_segment, "ab") as f:
+        f.write(b"\x10\x00\x00\x00garbage")
+
+    restarted_wal = WriteAheadLog(tmp_path / "wal")
+    # Not replayed yet: a snapshot must not delete them
+    assert first_segment not in restarted_wal.rotate() and second_segment not in restarted_wal.rotate()
+    assert [b[0]['event'].id for b in restarted_wal.replay()] == ["id0", "id1"]
+    assert {first_segment, second_segment} <= set(restarted_wal.rotate())
+    restarted_wal.close()
+
+
+def test_snapshot_compacts_wal(tmp_path):
+    """Test that a snapshot removes the log segments it includes, and that snapshot + log restore every event."""
+    from newsfeed.ingestion.store import EventStore
+    from newsfeed.ingestion.snapshot import PeriodicSnapshotter
+    from newsfeed.ingestion.wal import WriteAheadLog
+    from newsfeed.processing.filter import keyword_based_filter
+    events = [Event(f"id{i}", "reddit", f"Outage {i}", datetime(2025, 1, 1, i)) for i in range(4)]
+
+    source_store, wal = EventStore(), WriteAheadLog(tmp_path / "wal")
+    snapshotter = PeriodicSnapshotter(source_store, tmp_path / "store.snapshot", interval=0, wal=wal)
+    for event in events[:2]:
+        batch = keyword_based_filter([event], ["outage"])
+        source_store.add_events(batch)
+        wal.append(batch)
+    snapshotter.snapshot()
+    assert len(wal.segments()) == 1 # only the current segment is left
+    batch = keyword_based_filter(events[2:], ["outage"])
+    source_store.add_events(batch)
+    wal.append(batch)
+    wal.close() # crash: no final snapshot
+
+    restored_store, restarted_wal = EventStore(), WriteAheadLog(tmp_path / "wal")
+    assert PeriodicSnapshotter(restored_store, tmp_path / "store.snapshot", wal=restarted_wal).restore() == 2
+    assert restarted_wal.replay_into(restored_store) == 1
+    assert sorted(e['event'].id for e in restored_store.get_sorted_events()) == ["id0", "id1", "id2", "id3"]
+    restarted_wal.close()
+
+
+def test_fetch_cache_reuses_content_within_ttl_and_evicts_lru(tmp_path):
+    from newsfeed.ingestion.fetch_cache import FetchCache
+    clock = FakeClock(1000.0)
+    cache = FetchCache(tmp_path, ttl=60, max_bytes=25, clock=clock)
+    downloads = []
+    def download(content):
+        downloads.append(content)
+        return content
+
+    assert cache.fetch({"name": "a"}, lambda: download(b"a" * 10)) == b"a" * 10
+    clock.now += 30
+    assert cache.fetch({"name": "a"}, lambda: download(b"new")) == b"a" * 10  # within the TTL
+    clock.now += 31
+    assert cache.fetch({"name": "a"}, lambda: download(b"a" * 10)) == b"a" * 10  # expired, same blob
+    assert downloads == [b"a" * 10, b"a" * 10]
+    assert (cache.hits, cache.misses) == (1, 2)
+
+    # Identical content is stored once
+    clock.now += 1
+    cache.fetch({"name": "b"}, lambda: b"a" * 10)
+    assert len(list(tmp_path.glob("blobs/*/*"))) == 1
+
+    # "c" is the least recently used blob when "d" no longer fits
+    clock.now += 1
+    cache.fetch({"name": "c"}, lambda: b"c" * 10)
+    clock.now += 1
+    cache.fetch({"name": "a"}, lambda: download(b"unused"))
+    clock.now += 1
+    cache.fetch({"name": "d"}, lambda: b"d" * 10)
+    assert cache.get('{"name": "c"}') is None
+    assert cache.get('{"name": "a"}') == b"a" * 10
+
+
+def test_fetch_cache_replays_recorded_session_offline(tmp_path, mocker):
+    from newsfeed.ingestion.fetch_cache import FetchCache, FetchCacheMiss
+    from newsfeed.processing.aggregate import fetch_source
+    source_config = {"name": "Sysadmin", "type": "reddit", "subreddit_name": "sysadmin", "limit": 1}
+    posts = [{"id": "p1", "title": "Outage", "selftext": "", "created_utc": 1752832872.0},
+             {"id": "p2", "title": "Patch", "selftext": "", "created_utc": 1752832873.0}]
+    mocker.patch.object(reddit, "download", side_effect=[reddit_json([post]) for post in posts])
+
+    recorder = FetchCache(tmp_path, ttl=0, mode="record")
+    recorded = [fetch_source(source_config, recorder) for _ in posts]
+
+    # Replaying never downloads, returns the recorded fetches in order, then the last one
+    mocker.patch.object(reddit, "download", side_effect=AssertionError("downloaded while replaying"))
+    replayer = FetchCache(tmp_path, mode="replay")
+    replayed = [fetch_source(source_config, replayer) for _ in range(3)]
+    assert replayed == recorded + recorded[-1:]
+    assert [events[0].id for events in replayed] == ["p1", "p2", "p2"]
+    with pytest.raises(FetchCacheMiss):
+        fetch_source({**source_config, "limit": 2}, replayer)
+
+
+class FakeClock:
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def reddit_json(posts):
+    import json
+    return json.dumps(posts).encode("utf-8")
+
+
+def test_large_feeds_are_parsed_in_the_parse_pool():
+    from email.utils import format_datetime
+    from newsfeed.ingestion.parse_pool import ParsePool
+    items = "".join(
+        f"<item><guid>rss{i}</guid><title>Title {i}</title><description>Body {i}</description>"
+        f"<pubDate>{format_datetime(datetime(2025, 7, 18, 10, i, tzinfo=zoneinfo.ZoneInfo('UTC')))}</pubDate></item>"
+        for i in range(50)
+    )
+    feed = f'<?xml version="1.0"?><rss version="2.0"><channel><title>Feed</title>{items}</channel></rss>'.encode()
+
+    pool = ParsePool(workers=1, min_bytes=len(feed))
+    try:
+        pooled = pool.parse(rss.parse_entries, feed, 10)
+        assert pool.executor is not None
+        assert pooled == rss.parse_entries(feed, 10)
+        assert pooled[1] == ("rss1", "Title 1", "Body 1", datetime(2025, 7, 18, 10, 1, tzinfo=zoneinfo.ZoneInfo("UTC")).timestamp())
+    finally:
+        pool.shutdown()
+
+    # Smaller content is parsed inline (a lambda could not be sent to a worker process)
+    assert pool.parse(lambda content: len(content), feed[:-1]) == len(feed) - 1
+    assert pool.executor is None
+
+
+def test_rss_entries_without_publication_time_fall_back_to_update_or_feed_time(mocker, caplog):
+    mocker.patch("newsfeed.ingestion.rss.feedparser.parse", return_value={"entries": [
+        {"id": "updated", "title": "Title", "updated_parsed": time.struct_time((2025, 7, 18, 10, 0, 0, 4, 199, 0))},
+        {"id": "undated", "title": "Title", "published_parsed": None},
+    ], "feed": {"updated_parsed": time.struct_time((2025, 7, 17, 8, 0, 0, 3, 198, 0))}})
+    updated, undated = rss.parse(b"<fake xml>", {"name": "MockRSS"})
+
+    assert updated.published_at == datetime(2025, 7, 18, 10, tzinfo=zoneinfo.ZoneInfo("UTC"))
+    assert undated.published_at == datetime(2025, 7, 17, 8, tzinfo=zoneinfo.ZoneInfo("UTC"))
+    assert undated.published_at.tzinfo is updated.published_at.tzinfo
+
+    # Without a feed date, undated entries are skipped rather than dated with the parse time
+    mocker.patch("newsfeed.ingestion.rss.feedparser.parse", return_value={"entries": [
+        {"id": "updated", "title": "Title", "updated_parsed": time.struct_time((2025, 7, 18, 10, 0, 0, 4, 199, 0))},
+        {"id": "undated", "title": "Title", "published_parsed": None},
+    ]})
+    assert [event.id for event in rss.parse(b"<fake xml>", {"name": "MockRSS"})] == ["updated"]
+    assert "undated" in caplog.text
+
+
+def test_bulk_ingest_filters_dedupes_and_counts_events(tmp_path):
+    """Test that bulk ingestion gives the same store and statistics inline and with worker processes."""
+    import json
+    from newsfeed.bulk_ingest import bulk_ingest
+    from newsfeed.ingestion.store import EventStore
+    lines = [json.dumps({"id": f"id{i}", "source": "archive", "title": f"Server outage {i}" if i % 3 else f"Weather {i}",
+                         "body": "", "published_at": f"2025-01-{1 + i % 28:02d}T10:00:00Z"}) for i in range(30)]
+    lines += ['{"id": "broken", "title": "Outage"}', "", lines[1]] # invalid, blank and duplicate lines
+    path = tmp_path / "events.jsonl"
+    path.write_text("\n".join(lines) + "\n")
+
+    results = []
+    for workers in (0, 2):
+        store = EventStore()
+        stats = bulk_ingest([path], store, ["outage"], chunk_size=4, workers=workers, report_progress=False)
+        results.append(([e['event'].id for e in store.get_sorted_events()], {k: v for k, v in stats.items() if k != "seconds"}))
+    assert results[0] == results[1]
+    event_ids, stats = results[0]
+    assert stats == {"read": 32, "invalid": 1, "filtered_out": 10, "duplicates": 1, "stored": 20}
+    assert sorted(event_ids) == sorted(f"id{i}" for i in range(30) if i % 3)
+
+    with pytest.raises(ValueError, match="Unsupported file format"):
+        bulk_ingest([tmp_path / "events.csv"], EventStore(), ["outage"])
+
+
+def test_bulk_ingest_command_adds_events_to_snapshot(tmp_path, monkeypatch):
+    import gzip
+    import json
+    from newsfeed import bulk_ingest
+    from newsfeed.ingestion.store import EventStore
+    monkeypatch.setattr("newsfeed.ingestion.store.store", EventStore())
+    existing_store = EventStore()
+    existing_store.add_events(bulk_ingest.validate_and_filter(
+        [b'{"id": "old", "source": "s", "title": "Old outage", "published_at": "2025-01-01T00:00:00Z"}'], ["outage"])[0])
+    existing_store.snapshot(tmp_path / "store.snapshot")
+    with gzip.open(tmp_path / "events.jsonl.gz", "wt") as f:
+        f.write(json.dumps({"id": "new", "source": "s", "title": "New outage", "published_at": "2025-02-01T00:00:00Z"}))
+
+    bulk_ingest.main([str(tmp_path / "events.jsonl.gz"), "--snapshot", str(tmp_path / "store.snapshot"), "--workers", "0"])
+    restored_store = EventStore()
+    assert restored_store.restore(tmp_path / "store.snapshot") == 2
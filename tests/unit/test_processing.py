@@ -4,11 +4,13 @@ import pprint
 
 from datetime import datetime
 from newsfeed.ingestion.event import Event
-from newsfeed.ingestion.store import store
+from newsfeed.ingestion.store import store, EventStore
+from newsfeed.ingestion.body_storage import create_body_storage
 from newsfeed.processing.aggregate import fetch_and_aggregate_events
 from newsfeed.processing.filter import keyword_based_filter
 from newsfeed.config.loader import load_keywords_config
 from newsfeed.processing.score import score_events
+from newsfeed.processing.scheduler import PollingScheduler
 
 logger = logging.getLogger(__name__)
 
@@ -181,3 +183,388 @@ def test_rank_events_based_on_kw_presence_in_title_vs_body(sample_events_3):
     # the order of the events should be inverted from the original order
     assert sorted_events_with_score[0]['event'].id == "id2" # keyword in title
     assert sorted_events_with_score[1]['event'].id == "id1" # keyword in body 
+
+
+class FakeClock:
+    """Manually advanced clock, used to test the polling scheduler deterministically."""
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_scheduler_only_returns_new_events(mocker):
+    """Test that the scheduler only returns events not seen in the previous poll of a source."""
+    mock_fetch_source = mocker.patch("newsfeed.processing.scheduler.fetch_source")
+    mock_fetch_source.side_effect = [
+        [Event("e1", "rss", "Title 1", datetime(2025, 1, 1, 10)), Event("e2", "rss", "Title 2", datetime(2025, 1, 1, 11))],
+        [Event("e2", "rss", "Title 2", datetime(2025, 1, 1, 11)), Event("e3", "rss", "Title 3", datetime(2025, 1, 1, 12))],
+    ]
+    clock = FakeClock()
+    scheduler = PollingScheduler([{"name": "rss", "type": "rss"}], jitter=0, clock=clock)
+
+    assert [event.id for event in scheduler.poll_due_sources()] == ["e1", "e2"]
+    assert scheduler.poll_due_sources() == []  # not due yet
+
+    clock.now += scheduler.seconds_until_next_poll()
+    assert [event.id for event in scheduler.poll_due_sources()] == ["e3"]
+
+
+def test_scheduler_adapts_interval_to_publish_rate(mocker):
+    """Test that fast sources are polled more often than slow ones, within their bounds."""
+    fast_events = [Event(f"fast{i}", "fast", "Title", datetime(2025, 1, 1, 10, i)) for i in range(10)]  # 1 per minute
+    slow_events = [Event(f"slow{i}", "slow", "Title", datetime(2025, 1, 1 + i)) for i in range(10)]  # 1 per day
+    mocker.patch(
+        "newsfeed.processing.scheduler.fetch_source",
+        side_effect=lambda source_config, fetch_cache=None: fast_events if source_config["name"] == "fast" else slow_events,
+    )
+    sources_config = [
+        {"name": "fast", "type": "rss", "min_interval": 20, "max_interval": 600},
+        {"name": "slow", "type": "rss", "min_interval": 20, "max_interval": 600},
+    ]
+    scheduler = PollingScheduler(sources_config, jitter=0, clock=FakeClock())
+    scheduler.poll_due_sources()
+
+    fast_state, slow_state = scheduler.states
+    assert fast_state.interval == 30  # half of the one minute publish gap
+    assert slow_state.interval == 600  # capped at max_interval
+
+
+def test_scheduler_backs_off_on_errors(mocker):
+    """Test that a failing source is retried with an exponential backoff."""
+    mocker.patch("newsfeed.processing.scheduler.fetch_source", side_effect=ConnectionError("unreachable"))
+    clock = FakeClock()
+    scheduler = PollingScheduler([{"name": "down", "type": "rss", "interval": 60}], jitter=0, clock=clock)
+
+    assert scheduler.poll_due_sources() == []
+    assert scheduler.seconds_until_next_poll() == 120
+
+    clock.now = 120
+    scheduler.poll_due_sources()
+    assert scheduler.seconds_until_next_poll() == 240
+
+
+def test_get_top_events_matches_sorted_events(sample_events_1, sample_events_2):
+    """Test that selecting the top k events gives the same result as sorting the whole store."""
+    keywords_config = load_keywords_config()
+    all_keywords = (keywords_config['high_priority_keywords'] + keywords_config['medium_priority_keywords']
+                    + keywords_config['low_priority_keywords'])
+    # sample_events_2 reuses the ids of sample_events_1, so give them unique ids
+    events = sample_events_1 + [Event(f"b{event.id}", event.source, event.title, event.published_at, event.body)
+                                for event in sample_events_2]
+    store.add_events(keyword_based_filter(events, all_keywords))
+
+    sorted_ids = [event_with_score['event'].id for event_with_score in store.get_sorted_events()]
+    for k in range(len(sorted_ids) + 2):
+        assert [event_with_score['event'].id for event_with_score in store.get_top_events(k)] == sorted_ids[:k]
+
+
+def test_get_unstored_events(sample_events_1):
+    """Test that only events whose id is not in the store yet are returned."""
+    store.add_events(keyword_based_filter(sample_events_1, ["outage"]))  # only id3 is stored
+
+    unstored_events = store.get_unstored_events(sample_events_1)
+    assert [event.id for event in unstored_events] == ["id1", "id2", "id4"]
+
+
+def test_keyword_based_filter_ignores_html_markup():
+    """Test that keywords are matched against the text content of HTML bodies, not the markup."""
+    events = [
+        Event("html1", "rss", "Weekly digest", datetime(2025, 1, 1),
+              '<div class="security-alert"><img alt="outage" src="patch.png"></div><p>Nothing to see</p>'),
+        Event("html2", "rss", "Weekly digest", datetime(2025, 1, 1),
+              "<p>Critical&nbsp;<b>patch</b> released</p><script>var outage = 1;</script>"),
+    ]
+    filtered_events_with_counts = keyword_based_filter(events, ["security", "alert", "outage", "patch", "critical"])
+
+    assert len(filtered_events_with_counts) == 1
+    assert filtered_events_with_counts[0]['event'].id == "html2"
+    assert filtered_events_with_counts[0]['kw_counts_in_body'] == {"critical": 1, "patch": 1}
+    assert filtered_events_with_counts[0]['body_preview'] == "Critical patch released"
+
+
+def test_body_preview_is_truncated_and_kept_in_store():
+    """Test that a truncated plain text preview of the body is stored and returned with the ranking."""
+    long_body = "<p>" + "outage " * 100 + "</p>"
+    filtered_events_with_counts = keyword_based_filter([Event("long", "rss", "Title", datetime(2025, 1, 1), long_body)], ["outage"])
+    store.add_events(filtered_events_with_counts)
+
+    body_preview = store.get_sorted_events()[0]['body_preview']
+    assert body_preview == ("outage " * 100)[:200] + "..."
+
+
+@pytest.mark.parametrize("body_storage_name", ["memory", "compressed", "disk"])
+def test_store_body_storage_returns_full_body(body_storage_name, tmp_path):
+    """Test that full bodies are only kept in memory with the memory storage, and are loaded back on demand."""
+    body = "<p>" + "A critical outage is ongoing. " * 50 + "</p>"
+    events = [
+        Event("b1", "rss", "Outage report", datetime(2025, 1, 1), body),
+        Event("b2", "rss", "Outage report", datetime(2025, 1, 2), None),
+    ]
+    event_store = EventStore(body_storage=create_body_storage(body_storage_name, blob_dir=tmp_path / "blobs"))
+    event_store.add_events(keyword_based_filter(events, ["outage"]))
+
+    sorted_events_with_score = event_store.get_sorted_events()
+    stored_bodies = {e['event'].id: e['event'].body for e in sorted_events_with_score}
+    assert stored_bodies["b1"] == (body if body_storage_name == "memory" else None)
+    assert sorted_events_with_score[0]['body_preview'].startswith("A critical outage is ongoing.")
+
+    full_events = event_store.get_full_events([e['event'] for e in sorted_events_with_score])
+    assert full_events == events  # b1 ranks first, keyword in title and body
+
+    event_store.clear()
+    assert not (tmp_path / "blobs").exists()
+
+
+def test_store_index_queries_match_full_scan():
+    """Test that index based retrieval returns the same events as filtering the full ranking."""
+    import random
+    from zoneinfo import ZoneInfo
+    rng = random.Random(42)
+    keywords = ["outage", "breach", "patch", "update", "release"]
+    sources = ["reddit", "Ars Technica", "Tom's Hardware"]
+    events = [
+        Event(f"id{i}", rng.choice(sources), " ".join(rng.sample(keywords, 2)),
+              datetime(2025, 1, 1 + rng.randrange(28), rng.randrange(24), tzinfo=ZoneInfo("UTC")),
+              " ".join(rng.sample(keywords, rng.randrange(3))))
+        for i in range(200)
+    ]
+    store.add_events(keyword_based_filter(events, keywords))
+    all_events_with_score = store.get_sorted_events()
+
+    for _ in range(50):
+        query_keywords = rng.sample(keywords, rng.randrange(2)) or None
+        query_sources = rng.sample(sources, rng.randrange(3)) or None
+        since = datetime(2025, 1, 1 + rng.randrange(28), tzinfo=ZoneInfo("UTC")) if rng.random() < 0.5 else None
+        until = datetime(2025, 1, 1 + rng.randrange(28), tzinfo=ZoneInfo("UTC")) if rng.random() < 0.5 else None
+        expected_ids = [
+            e['event'].id for e in all_events_with_score
+            if all(kw in e['kw_counts_in_title'] or kw in e['kw_counts_in_body'] for kw in query_keywords or [])
+            and (query_sources is None or e['event'].source in query_sources)
+            and (since is None or e['event'].published_at >= since)
+            and (until is None or e['event'].published_at < until)
+        ]
+        sorted_events_with_score = store.get_sorted_events(keywords=query_keywords, sources=query_sources,
+                                                           since=since, until=until)
+        # compare membership only, the recency scores change slightly between the two calls
+        assert sorted(e['event'].id for e in sorted_events_with_score) == sorted(expected_ids)
+
+
+def test_near_duplicate_events_are_collapsed():
+    """Test that the same story syndicated by several sources is stored once, with the other sources as aliases."""
+    from newsfeed.processing.dedup import NearDuplicateIndex
+    body = ("Microsoft has released an emergency patch for a critical SharePoint vulnerability that is being "
+            "actively exploited in the wild. Administrators are urged to apply the update immediately, as attackers "
+            "have compromised dozens of on-premises servers over the weekend.")
+    events = [
+        Event("ars1", "Ars Technica", "Critical SharePoint vulnerability exploited in the wild", datetime(2025, 7, 21), body),
+        Event("toms1", "Tom's Hardware", "Critical SharePoint vulnerability exploited in the wild",
+              datetime(2025, 7, 21, 2), "<p>" + body.replace("urged", "advised") + "</p>"),
+        Event("reddit1", "Sysadmin", "Critical SharePoint vulnerability exploited in the wild", datetime(2025, 7, 21, 3), body),
+        Event("other1", "Sysadmin", "Critical Chrome vulnerability patched",
+              datetime(2025, 7, 21), "Google released a patch for a critical Chrome bug."),
+    ]
+    event_store = EventStore(near_duplicate_index=NearDuplicateIndex())
+    event_store.add_events(keyword_based_filter(events, ["critical", "vulnerability", "patch"]))
+
+    assert sorted(e['event'].id for e in event_store.get_sorted_events()) == ["ars1", "other1"]
+    assert event_store.get_aliases("ars1") == [{"id": "toms1", "source": "Tom's Hardware"},
+                                                {"id": "reddit1", "source": "Sysadmin"}]
+    assert event_store.has_event("toms1")
+    assert event_store.get_unstored_events(events) == []
+
+
+def test_near_duplicate_detection_is_disabled_by_default():
+    """Test that events with identical text are all kept when near-duplicate detection is off."""
+    events = [Event("d1", "reddit", "System outage", datetime(2025, 1, 1)),
+              Event("d2", "rss", "System outage", datetime(2025, 1, 1))]
+    event_store = EventStore()
+    event_store.add_events(keyword_based_filter(events, ["outage"]))
+    assert event_store.get_event_count() == 2
+
+
+def test_sqlite_store_matches_in_memory_store(sample_events_1, tmp_path):
+    """Test that the SQLite store ranks and filters events like the in-memory store, and persists them."""
+    from newsfeed.ingestion.sqlite_store import SQLiteEventStore
+    sqlite_store = SQLiteEventStore(tmp_path / "newsfeed.db")
+    events = sample_events_1 + [
+        Event("id5", "reddit", "Ransomware outage", datetime(2025, 1, 3, 12), "<p>Patch now</p>"),
+        Event("id6", "reddit", "Critical update", datetime(2025, 1, 2, 6), "outage"),
+    ]
+    filtered_events_with_counts = keyword_based_filter(events, load_keywords_config()['high_priority_keywords'])
+    store.add_events(filtered_events_with_counts)
+    sqlite_store.add_events(filtered_events_with_counts)
+    sqlite_store.add_events(filtered_events_with_counts[:1]) # duplicates are ignored
+
+    queries = [{}, {"keywords": ["outage"]}, {"tier": "high"}, {"sources": ["reddit"]},
+               {"since": datetime(2025, 1, 2), "until": datetime(2025, 1, 3, 12)}]
+    for query in queries:
+        expected = store.get_sorted_events(**query)
+        assert [e['event'] for e in sqlite_store.get_sorted_events(**query)] == [e['event'] for e in expected]
+        assert [e['event'] for e in sqlite_store.get_top_events(2, **query)] == [e['event'] for e in expected[:2]]
+        chunks = list(sqlite_store.iter_sorted_events(2, now=datetime(2025, 1, 4), **query))
+        assert [e for chunk in chunks for e in chunk] == store.get_sorted_events(now=datetime(2025, 1, 4), **query)
+        assert all(len(chunk) == 2 for chunk in chunks[:-1])
+
+    # A second store opening the same database file sees the same events
+    other_sqlite_store = SQLiteEventStore(tmp_path / "newsfeed.db")
+    assert other_sqlite_store.get_event_count() == store.get_event_count()
+    assert other_sqlite_store.get_unstored_events(events) == store.get_unstored_events(events)
+    other_sqlite_store.clear()
+    assert sqlite_store.get_event_count() == 0
+
+
+def test_columnar_store_matches_in_memory_store(sample_events_1, monkeypatch, tmp_path):
+    """Test that the columnar store ranks and filters events like the in-memory store, including ties and time ranges."""
+    from newsfeed.ingestion import columnar_store
+    monkeypatch.setattr(columnar_store, "MIN_TIME_INDEX_TAIL", 2) # merge the time index tail often
+    events = sample_events_1 + [
+        Event("id5", "reddit", "Ransomware outage", datetime(2025, 1, 3, 12), "<p>Patch now</p>"),
+        Event("id6", "reddit", "Critical update", datetime(2025, 1, 2, 6), "outage"),
+        Event("id0", "Ars Technica", "Critical update", datetime(2025, 1, 2, 6), "outage"), # same score as id6
+        Event("id7", "Tom's Hardware", "Outage é", datetime(2025, 1, 1, 6), None),
+    ]
+    filtered_events_with_counts = keyword_based_filter(events, load_keywords_config()['high_priority_keywords'])
+    column_store = columnar_store.ColumnarEventStore()
+    for filtered_event_with_counts in filtered_events_with_counts: # one batch per event, out of time order
+        store.add_events([filtered_event_with_counts])
+        column_store.add_events([filtered_event_with_counts])
+    column_store.add_events(filtered_events_with_counts[:1]) # duplicates are ignored
+
+    now = datetime(2025, 1, 4)
+    queries = [{}, {"keywords": ["outage"]}, {"keywords": ["Outage", "ransomware"]}, {"keywords": ["unknown"]},
+               {"tier": "high"}, {"tier": "low"}, {"sources": ["reddit", "Ars Technica"]}, {"sources": ["unknown"]},
+               {"since": datetime(2025, 1, 2), "until": datetime(2025, 1, 3, 12)},
+               {"keywords": ["outage"], "sources": ["reddit"], "since": datetime(2025, 1, 2, 6)}]
+    for query in queries:
+        expected = store.get_sorted_events(now=now, **query)
+        assert column_store.get_sorted_events(now=now, **query) == expected
+        for k in range(len(expected) + 1):
+            assert column_store.get_top_events(k, now=now, **query) == expected[:k]
+        for chunk_size in (1, 3):
+            assert [e for chunk in column_store.iter_sorted_events(chunk_size, now=now, **query) for e in chunk] == expected
+            assert [e for chunk in store.iter_sorted_events(chunk_size, now=now, **query) for e in chunk] == expected
+
+    assert column_store.get_event_count() == store.get_event_count()
+    assert column_store.get_unstored_events(events) == store.get_unstored_events(events)
+    assert column_store.snapshot(tmp_path / "store.snapshot") == store.get_event_count()
+    column_store.clear()
+    assert column_store.get_event_count() == 0 and not column_store.has_event("id5")
+    assert column_store.restore(tmp_path / "store.snapshot") == store.get_event_count()
+    assert column_store.get_sorted_events(now=now) == store.get_sorted_events(now=now)
+
+
+def test_store_snapshot_and_restore(tmp_path):
+    """Test that restoring a snapshot gives back the same events, keyword counts, indexes and aliases."""
+    from datetime import timedelta, timezone
+    from zoneinfo import ZoneInfo
+    events = [
+        Event("id1", "reddit", "Ransomware outage", datetime(2025, 1, 3, 12, 30, 15, 123456), "<p>Patch now</p>"),
+        Event("id2", "Ars Technica", "Critical update", datetime(2025, 1, 2, 6, tzinfo=ZoneInfo("UTC")), None),
+        Event("id3", "Tom's Hardware", "Zero-day exploit", datetime(2025, 1, 2, 8, tzinfo=timezone(timedelta(hours=-5))), "outage é"),
+    ]
+    source_store = EventStore(body_storage=create_body_storage("compressed"))
+    source_store.add_events(keyword_based_filter(events, ["outage", "patch", "ransomware", "critical", "zero-day"]))
+    source_store.aliases["id1"] = [{"id": "dup1", "source": "Sysadmin"}]
+    source_store.alias_of["dup1"] = "id1"
+    assert source_store.snapshot(tmp_path / "store.snapshot") == 3
+
+    store.add_events(keyword_based_filter(events[:1], ["outage"])) # already stored events are kept as is
+    assert store.restore(tmp_path / "store.snapshot") == 2
+    store.clear()
+    assert store.restore(tmp_path / "store.snapshot") == 3
+
+    assert [e['event'] for e in store.get_sorted_events()] == \
+        source_store.get_full_events([e['event'] for e in source_store.get_sorted_events()])
+    assert [(e['kw_counts_in_title'], e['kw_counts_in_body'], e['body_preview']) for e in store.get_sorted_events()] == \
+        [(e['kw_counts_in_title'], e['kw_counts_in_body'], e['body_preview']) for e in source_store.get_sorted_events()]
+    assert [e['event'].id for e in store.get_sorted_events(keywords=["outage"], since=datetime(2025, 1, 2, 12))] == ["id1", "id3"]
+    assert store.get_aliases("id1") == [{"id": "dup1", "source": "Sysadmin"}]
+    assert store.has_event("dup1")
+
+
+def test_restore_rejects_invalid_snapshots(tmp_path):
+    """Test that files which are not snapshots of a supported version are rejected."""
+    from newsfeed.ingestion.snapshot import HEADER, MAGIC, SnapshotError
+    (tmp_path / "not_a.snapshot").write_bytes(b"hello world")
+    with pytest.raises(SnapshotError):
+        store.restore(tmp_path / "not_a.snapshot")
+    (tmp_path / "future.snapshot").write_bytes(HEADER.pack(MAGIC, 99, 0))
+    with pytest.raises(SnapshotError, match="version 99"):
+        store.restore(tmp_path / "future.snapshot")
+
+
+def test_ranking_function_matches_score_events(sample_events_1, sample_events_3):
+    """Test that the configured ranking function gives exactly the scores of score_events at a fixed time."""
+    from zoneinfo import ZoneInfo
+    from newsfeed.processing.ranking import RankingFunction
+    keywords_config = load_keywords_config()
+    all_keywords = (keywords_config['high_priority_keywords'] + keywords_config['medium_priority_keywords']
+                    + keywords_config['low_priority_keywords'])
+    events = sample_events_1 + [
+        Event("id5", "test", "Ransomware warning", datetime(2025, 1, 3, 12, 30, 15, 123456, tzinfo=ZoneInfo("UTC")), "patch"),
+        Event("id6", "test", "Critical update", datetime(2025, 1, 2, 6, tzinfo=ZoneInfo("Europe/Paris")), "announcement"),
+    ]
+    filtered_events_with_counts = keyword_based_filter(events, all_keywords)
+    now = datetime(2025, 1, 5, 8, 17, 3, 42, tzinfo=ZoneInfo("UTC"))
+
+    expected = score_events(filtered_events_with_counts, keywords_config['high_priority_keywords'],
+                            keywords_config['medium_priority_keywords'], keywords_config['low_priority_keywords'],
+                            now=now)
+    assert RankingFunction.from_config().score(filtered_events_with_counts, now=now) == expected
+
+    store.add_events(filtered_events_with_counts)
+    assert store.get_sorted_events(now=now) == sorted(expected, key=lambda e: (-e['total_score'], e['event'].id))
+
+
+def test_ranking_function_weights_and_decay_come_from_config():
+    """Test that the ranking weights and decay curve are read from the ranking configuration."""
+    from zoneinfo import ZoneInfo
+    from newsfeed.processing.ranking import RankingFunction
+    keywords_config = {"high_priority_keywords": ["outage"], "medium_priority_keywords": ["patch"],
+                       "low_priority_keywords": []}
+    ranking_config = {"tier_weights": {"high": 10, "medium": 1, "low": 0},
+                      "location_weights": {"title": 1, "body": 1},
+                      "decay": {"function": "half_life", "half_life_hours": 12}}
+    ranking_function = RankingFunction(keywords_config, ranking_config)
+    record = {"event": Event("id1", "test", "outage", datetime(2025, 1, 1, tzinfo=ZoneInfo("UTC"))),
+              "kw_counts_in_title": {"outage": 2}, "kw_counts_in_body": {"outage": 1, "patch": 1}}
+    [scored] = ranking_function.score([record], now=datetime(2025, 1, 2, tzinfo=ZoneInfo("UTC")))
+    assert scored['importance_score'] == 21
+    assert scored['recency_score'] == 0.25
+    assert scored['total_score'] == 5.25
+
+    ranking_config["decay"] = {"function": "exponential", "rate": 0.5}
+    [scored] = RankingFunction(keywords_config, ranking_config).score([record], now=datetime(2025, 1, 1, 2, tzinfo=ZoneInfo("UTC")))
+    assert scored['recency_score'] == pytest.approx(0.36787944)
+
+    ranking_config["decay"] = {"function": "unknown"}
+    with pytest.raises(ValueError, match="Unknown decay function"):
+        RankingFunction(keywords_config, ranking_config)
+
+
+def test_keyword_counts_are_interned_and_behave_like_dicts(sample_events_1):
+    """Test that filtered keyword counts are compact KeywordCounts, equal to the dicts they replace."""
+    import pickle
+    from zoneinfo import ZoneInfo
+    from newsfeed.processing.keywords import KeywordCounts, vocabulary
+    from newsfeed.processing.ranking import RankingFunction
+    [filtered, _] = keyword_based_filter(sample_events_1, ["security", "breach", "outage", "vulnerability"])
+    counts = filtered['kw_counts_in_title']
+    assert isinstance(counts, KeywordCounts)
+    assert counts == {"security": 1, "breach": 1}
+    assert list(counts.keyword_ids()) == [vocabulary.ids["security"], vocabulary.ids["breach"]]
+    assert counts["breach"] == 1 and "outage" not in counts and counts.get("outage") is None
+    assert repr(counts) == "{'security': 1, 'breach': 1}"
+    assert pickle.loads(pickle.dumps(counts)) == counts
+    assert KeywordCounts.from_counts({}) == {} and not KeywordCounts.from_counts({})
+
+    # The importance looked up by keyword id is exactly the one of the keyword -> count dicts
+    ranking_function = RankingFunction.from_config()
+    record = {"event": Event("id1", "test", "x", datetime(2025, 1, 1, tzinfo=ZoneInfo("UTC"))),
+              "kw_counts_in_title": KeywordCounts.from_counts({"unknown": 3, "outage": 2, "patch": 1}),
+              "kw_counts_in_body": KeywordCounts.from_counts({"breach": 1, "ransomware": 1})}
+    as_dicts = {**record, "kw_counts_in_title": dict(record['kw_counts_in_title']),
+                "kw_counts_in_body": dict(record['kw_counts_in_body'])}
+    assert ranking_function.importance(record) == ranking_function.importance(as_dicts) > 0
@@ -1,4 +1,6 @@
 import pytest
+import subprocess
+import sys
 import time
 from newsfeed.utils.helpers import convert_ts_to_dt, convert_structtime_to_dt
 
@@ -81,3 +83,93 @@ def test_convert_structtime_to_dt_default_utc():
     )
     assert actual == expected
 
+
+
+@pytest.mark.parametrize("module_name", ["newsfeed.api.server", "newsfeed.cli"])
+def test_startup_does_not_import_fetch_dependencies(module_name):
+    """
+    Test that importing the API server or the CLI does not pull in the heavy
+    fetch dependencies (praw, feedparser, requests), which are only loaded on first use.
+    """
+    code = (
+        f"import sys, {module_name}\n"
+        "loaded = [name for name in ('praw', 'feedparser', 'requests', 'html2text') "
+        "if name in sys.modules and not isinstance(sys.modules[name], importlib.util._LazyModule)]\n"
+        "print(','.join(loaded))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", "import importlib.util\n" + code],
+        capture_output=True, text=True, check=True,
+    )
+    assert result.stdout.strip() == ""
+
+
+def test_cli_startup_does_not_create_the_store():
+    """
+    Test that importing the CLI neither creates the shared store (which reads the settings and
+    compiles the ranking function) nor imports asyncio and multiprocessing.
+    """
+    code = (
+        "import sys, newsfeed.cli\n"
+        "from newsfeed.ingestion.store import store\n"
+        "print(store._store, [name for name in ('asyncio', 'multiprocessing', 'dotenv') if name in sys.modules])"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "None []"
+
+
+def test_lazy_import_defers_loading_until_attribute_access():
+    """Test that lazy_import only executes the module on first attribute access."""
+    code = (
+        "import sys\n"
+        "from newsfeed.utils.helpers import lazy_import\n"
+        "module = lazy_import('colorsys')\n"
+        "print(type(module).__name__)\n"
+        "module.rgb_to_hsv(0, 0, 0)\n"
+        "print(type(module).__name__)"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True,
+    )
+    assert result.stdout.split() == ["_LazyModule", "module"]
+
+
+def test_spans_are_only_recorded_in_traced_requests():
+    """Test that spans nest under the current span, and are no-ops outside of a traced request."""
+    from newsfeed.utils.profiling import Span, current_span, span
+
+    with span("untraced"):
+        pass
+
+    root = Span("/retrieve", time.perf_counter())
+    token = current_span.set(root)
+    try:
+        with span("rank"):
+            with span("scoring"):
+                pass
+            with span("sort"):
+                pass
+        with span("load_bodies"):
+            pass
+    finally:
+        current_span.reset(token)
+
+    assert [child.name for child in root.children] == ["rank", "load_bodies"]
+    assert [child.name for child in root.children[0].children] == ["scoring", "sort"]
+    assert root.children[0].duration >= sum(child.duration for child in root.children[0].children)
+
+
+def test_settings_are_read_from_the_dotenv_file(monkeypatch, tmp_path):
+    """Test that NEWSFEED_* settings can be defined in the .env file, and that the environment takes precedence."""
+    from newsfeed.config import settings
+    dotenv_path = tmp_path / ".env"
+    dotenv_path.write_text("NEWSFEED_TEST_DOTENV_SETTING=42\nNEWSFEED_TEST_DOTENV_OVERRIDDEN=false\n")
+    monkeypatch.setattr(settings, "DOTENV_PATH", dotenv_path)
+    monkeypatch.setattr(settings, "dotenv_loaded", False)
+    # Set before deleting it, so the value loaded from the file is removed after the test
+    monkeypatch.setenv("NEWSFEED_TEST_DOTENV_SETTING", "")
+    monkeypatch.delenv("NEWSFEED_TEST_DOTENV_SETTING")
+    monkeypatch.setenv("NEWSFEED_TEST_DOTENV_OVERRIDDEN", "true")
+
+    assert settings.get_int_setting("TEST_DOTENV_SETTING", 0) == 42
+    assert settings.get_bool_setting("TEST_DOTENV_OVERRIDDEN")